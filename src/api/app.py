@@ -1,29 +1,15 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
-from langchain_classic.vectorstores import FAISS
-from langchain_classic.text_splitter import RecursiveCharacterTextSplitter
-
-from langchain_classic.docstore.document import Document
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from llm.generator import generate_llm_response, get_session_history
-
-import tempfile
-
-
-from PyPDF2 import PdfReader
+# project root, for the src.* imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from llm.generator import generate_llm_response, generate_llm_response_stream, get_session_history
 
-from langchain_classic.document_loaders import(
-    TextLoader, # for .txt files
-    PyPDFLoader, # for .pdf files
-    Docx2txtLoader, # for .docx file
-    UnstructuredMarkdownLoader # for .md
-)
-
-from pathlib import Path
-from sentence_transformers import SentenceTransformer
+from src.api.sse import SSE_HEADERS, sse_event
+from src.api.uploads import get_document_sets, get_upload_store, retrieve_documents
 
 
 
@@ -31,64 +17,45 @@ app = Flask(__name__)
 
 CORS(app)
 
-def process_files(file_path: str):
-    file_ext = Path(file_path).suffix.lower()
-
-    if file_ext == ".pdf":
-        loader = PyPDFLoader(file_path)
-    elif file_ext == ".txt":
-        loader = TextLoader(file_path, encoding="utf-8")
-    elif file_ext in [".doc", ".docx"]:
-        loader = Docx2txtLoader(file_path)
-    elif file_ext == ".md":
-        loader = UnstructuredMarkdownLoader(file_path)
-    else:
-        raise ValueError(f"Unsupported file type: {file_ext}")
+@app.route('/ask_AI', methods = ["POST"])
 
-    documents = loader.load()
-    documents = [doc for doc in documents if doc.page_content.strip() != ""] # filtering empyt
-    return documents
+def ask_AI():
+    """
+    Expects multipart/form-data
+    - files : uploads files (PDFs, wordc, text)
+    - query : question string
+    - session id : optional session id for memory
+    """
 
+    query = request.form.get("query")
 
-from langchain_core.embeddings import Embeddings
-from typing import List
+    session_id  = request.form.get("session_id", "default_session")
+    files = request.files.getlist("file")
 
-class SentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name: str = 'bert-base-uncased'):
-        self.model = SentenceTransformer(model_name)
+    if not query:
+        return jsonify({"eror": "query is required"})
     
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed a list of documents."""
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
+    if not files:
+        return jsonify({"error": "No files given, file required"})
     
-    def embed_query(self, text: str) -> List[float]:
-        """Embed a single query."""
-        embedding = self.model.encode([text], convert_to_numpy=True)
-        return embedding[0].tolist()
-
-
-embeddings = SentenceTransformerEmbeddings('bert-base-uncased')
-
+    stores = [get_upload_store(file.read(), file.filename) for file in files]
 
-def create_temp_vectorestore(texts):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size = 800, chunk_overlap= 100)
+    # One query embedding searched against every file's store
+    retrieved_docs = retrieve_documents(stores, query, k=4)
 
-    docs = [Document(page_content = t) for t in texts]
-    docs = text_splitter.split_documents(docs)
-    vector_store = FAISS.from_documents(docs, embedding=embeddings)
-    return vector_store
+    # Generate LLM response with memory
+    response = generate_llm_response(query, retrieved_docs, session_id=session_id)
 
+    return jsonify({"response": response})
 
 
-@app.route('/ask_AI', methods = ["POST"])
+@app.route('/ask_AI/stream', methods = ["POST"])
 
-def ask_AI():
+def ask_AI_stream():
     """
-    Expects multipart/form-data
-    - files : uploads files (PDFs, wordc, text)
-    - query : question string
-    - session id : optional session id for memory
+    Same form as /ask_AI; answers with Server-Sent Events:
+    - token : a piece of the answer, sent as soon as the LLM produces it
+    - done : the complete answer (saved to the session history)
     """
 
     query = request.form.get("query")
@@ -97,32 +64,75 @@ def ask_AI():
     files = request.files.getlist("file")
 
     if not query:
-        return jsonify({"eror": "query is required"})
-    
+        return jsonify({"error": "query is required"})
+
     if not files:
         return jsonify({"error": "No files given, file required"})
-    
-    texts = []
-
-    for file in files:
-        suffix = Path(file.filename).suffix
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            # temp_path = tmp.name
-            file.save(tmp.name)
-            tmp_path = tmp.name
-
-        
-        docs = process_files(tmp_path)
-        texts.extend([doc.page_content for doc in docs])
-        os.unlink(tmp_path)
-
-        
-    #creating the temporary vector store
-    temp_store = create_temp_vectorestore(texts)
-    # Retrieve top docs
-    retrieved_docs = temp_store.similarity_search(query, k=4)
 
-    # Generate LLM response with memory
+    stores = [get_upload_store(file.read(), file.filename) for file in files]
+    retrieved_docs = retrieve_documents(stores, query, k=4)
+
+    def events():
+        parts = []
+        for token in generate_llm_response_stream(query, retrieved_docs, session_id=session_id):
+            parts.append(token)
+            yield sse_event({"token": token}, event="token")
+        yield sse_event({"response": "".join(parts).strip()}, event="done")
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.route('/documents', methods = ["POST"])
+
+def create_document_set():
+    """
+    Upload files once; they are ingested in the background
+    Expects multipart/form-data with one or more `file` fields.
+    Returns the document set id and its job status (poll GET /documents/<id>).
+    """
+
+    files = request.files.getlist("file")
+    if not files:
+        return jsonify({"error": "No files given, file required"}), 400
+
+    job = get_document_sets().submit([(file.read(), file.filename) for file in files])
+    return jsonify(job), 202
+
+
+@app.route('/documents/<set_id>', methods = ["GET"])
+
+def document_set_status(set_id):
+    job = get_document_sets().status(set_id)
+    if job is None:
+        return jsonify({"error": "Unknown document set"}), 404
+    return jsonify(job)
+
+
+@app.route('/ask', methods = ["POST"])
+
+def ask():
+    """
+    Question about an ingested document set (JSON or form fields)
+    - document_set_id : id returned by POST /documents
+    - query : question string
+    - session_id : optional session id for memory
+    """
+
+    payload = request.get_json(silent=True) or request.form
+    query = payload.get("query")
+    set_id = payload.get("document_set_id", "")
+    session_id = payload.get("session_id", "default_session")
+
+    if not query:
+        return jsonify({"error": "query is required"}), 400
+
+    job = get_document_sets().status(set_id)
+    if job is None:
+        return jsonify({"error": "Unknown document set"}), 404
+    if job["status"] != "ready":
+        return jsonify(job), 409
+
+    retrieved_docs = retrieve_documents([get_document_sets().get_store(set_id)], query, k=4)
     response = generate_llm_response(query, retrieved_docs, session_id=session_id)
 
     return jsonify({"response": response})
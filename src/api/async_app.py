@@ -0,0 +1,191 @@
+"""
+ASGI version of the /ask_AI API
+Parsing and embedding (CPU-bound) run on a bounded thread pool and the LLM is
+awaited through an async client with a timeout, so one worker process keeps
+many conversations in flight while the LLM answers. /ask_AI/stream sends the
+answer as Server-Sent Events while it is generated.
+
+Run with:
+    uvicorn src.api.async_app:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from src.api.document_sets import READY
+from src.api.sse import SSE_HEADERS, sse_event
+from src.api.uploads import embed_query, get_document_sets, get_query_batcher, get_upload_store, search_documents
+from src.llm.async_generator import agenerate_llm_response, agenerate_llm_response_stream, get_llm
+from src.utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Parsing/embedding jobs beyond API_CPU_WORKERS wait in the pool's queue
+# instead of oversubscribing the cores the model already uses
+cpu_executor = ThreadPoolExecutor(max_workers=Config.API_CPU_WORKERS, thread_name_prefix="ask-ai-cpu")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail at start-up rather than on the first request when the LLM is misconfigured
+    get_llm()
+    yield
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+async def run_cpu(func, *args):
+    """Run a blocking function on the bounded CPU pool"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, func, *args)
+
+
+async def aembed_query(query: str):
+    """Query embedding; with batching the request waits on the batch without holding a pool thread"""
+    query_batcher = get_query_batcher()
+    if query_batcher is not None:
+        return await query_batcher.aembed_query(query)
+    return await run_cpu(embed_query, query)
+
+
+async def retrieve_for_uploads(
+    query: Optional[str],
+    files: Optional[List[UploadFile]]
+) -> Tuple[Optional[List[Dict]], Optional[Dict]]:
+    """
+    Chunks of the uploaded files closest to the query
+
+    Returns:
+        (retrieved documents, None), or (None, error payload) for an invalid request
+    """
+    if not query:
+        return None, {"error": "query is required"}
+
+    if not files:
+        return None, {"error": "No files given, file required"}
+
+    uploads = [(await upload.read(), upload.filename) for upload in files]
+    try:
+        stores = await asyncio.gather(*(run_cpu(get_upload_store, data, name) for data, name in uploads))
+    except ValueError as e:
+        return None, {"error": str(e)}
+
+    query_vector = await aembed_query(query)
+    return await run_cpu(search_documents, stores, query_vector, 4), None
+
+
+@app.post("/ask_AI")
+async def ask_AI(
+    query: Optional[str] = Form(None),
+    session_id: str = Form("default_session"),
+    file: Optional[List[UploadFile]] = File(None)
+):
+    """
+    Expects multipart/form-data
+    - file : uploaded files (PDF, Word, text, markdown), repeatable
+    - query : question string
+    - session_id : optional session id for memory
+    """
+    retrieved_docs, error = await retrieve_for_uploads(query, file)
+    if error:
+        return error
+
+    # The event loop serves other requests while the LLM answers
+    response = await agenerate_llm_response(query, retrieved_docs, session_id=session_id)
+
+    return {"response": response}
+
+
+@app.post("/ask_AI/stream")
+async def ask_AI_stream(
+    query: Optional[str] = Form(None),
+    session_id: str = Form("default_session"),
+    file: Optional[List[UploadFile]] = File(None)
+):
+    """
+    Same form as /ask_AI; answers with Server-Sent Events: `token` events with
+    pieces of the answer as the LLM produces them, then one `done` event
+    """
+    retrieved_docs, error = await retrieve_for_uploads(query, file)
+    if error:
+        return error
+
+    async def events():
+        parts = []
+        async for token in agenerate_llm_response_stream(query, retrieved_docs, session_id=session_id):
+            parts.append(token)
+            yield sse_event({"token": token}, event="token")
+        yield sse_event({"response": "".join(parts).strip()}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/documents")
+async def create_document_set(file: Optional[List[UploadFile]] = File(None)):
+    """
+    Upload files once; they are ingested in the background
+    Returns the document set id and its job status (poll GET /documents/{id}).
+    """
+    if not file:
+        return JSONResponse({"error": "No files given, file required"}, status_code=400)
+
+    uploads = [(await upload.read(), upload.filename) for upload in file]
+    job = await run_cpu(get_document_sets().submit, uploads)
+    return JSONResponse(job, status_code=202)
+
+
+@app.get("/documents/{set_id}")
+async def document_set_status(set_id: str):
+    job = get_document_sets().status(set_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown document set"}, status_code=404)
+    return job
+
+
+class AskRequest(BaseModel):
+    document_set_id: str
+    query: str
+    session_id: str = "default_session"
+
+
+async def retrieve_for_set(request: AskRequest) -> Tuple[Optional[List[Dict]], Optional[JSONResponse]]:
+    """
+    Chunks of an ingested document set closest to the query
+
+    Returns:
+        (retrieved documents, None), or (None, error response) when the set is unknown or not ready
+    """
+    if not request.query:
+        return None, JSONResponse({"error": "query is required"}, status_code=400)
+
+    job = get_document_sets().status(request.document_set_id)
+    if job is None:
+        return None, JSONResponse({"error": "Unknown document set"}, status_code=404)
+    if job["status"] != READY:
+        return None, JSONResponse(job, status_code=409)
+
+    store = await run_cpu(get_document_sets().get_store, request.document_set_id)
+    query_vector = await aembed_query(request.query)
+    return await run_cpu(search_documents, [store], query_vector, 4), None
+
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    """Question about an ingested document set: no file is sent or processed per question"""
+    retrieved_docs, error = await retrieve_for_set(request)
+    if error:
+        return error
+
+    response = await agenerate_llm_response(request.query, retrieved_docs, session_id=request.session_id)
+
+    return {"response": response}
@@ -0,0 +1,154 @@
+"""
+Document sets: files uploaded once, then queried by id
+Ingestion (parsing, splitting, embedding) runs on a background worker; each
+finished set is one merged vector store saved under its own directory and
+kept in a memory-bounded LRU, so a question costs a query embedding and one
+search whatever the size of the documents.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.api.upload_cache import UploadStore, UploadStoreCache
+
+logger = logging.getLogger(__name__)
+
+# Job states reported by DocumentSetRegistry.status
+QUEUED, PROCESSING, READY, FAILED = "queued", "processing", "ready", "failed"
+
+SET_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class DocumentSetRegistry:
+    """
+    Background ingestion of document sets and access to their stores
+
+    Set ids are derived from the file contents, so uploading the same files
+    again returns the existing set instead of ingesting them twice.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        build_store: Callable[[bytes, str], UploadStore],
+        max_bytes: int = 1024 * 1024 * 1024,
+        workers: int = 1
+    ):
+        """
+        Initialize registry
+
+        Args:
+            root_dir: Directory the finished sets are saved under (one subdirectory per set)
+            build_store: Parses, splits and embeds one file: (bytes, filename) -> UploadStore
+            max_bytes: Memory budget of the sets kept loaded
+            workers: Background ingestion threads
+        """
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.build_store = build_store
+        self.stores = UploadStoreCache(max_bytes=max_bytes)
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="document-sets")
+
+    @staticmethod
+    def set_id(uploads: List[Tuple[bytes, str]]) -> str:
+        """Content id of a set of files (order and names included)"""
+        digest = hashlib.sha256()
+        for data, filename in uploads:
+            digest.update(hashlib.sha256(data).digest())
+            digest.update(filename.encode('utf-8') + b'\0')
+        return digest.hexdigest()[:32]
+
+    def _set_path(self, set_id: str) -> Path:
+        return self.root_dir / set_id
+
+    def submit(self, uploads: List[Tuple[bytes, str]]) -> Dict:
+        """
+        Queue files for ingestion
+
+        Args:
+            uploads: (file bytes, filename) per file
+
+        Returns:
+            Job status of the set (already "ready" when these files were ingested before)
+        """
+        set_id = self.set_id(uploads)
+        with self._lock:
+            job = self._jobs.get(set_id)
+            if job is not None and job["status"] != FAILED:
+                return dict(job)
+            if job is None and self._set_path(set_id).exists():
+                return {"document_set_id": set_id, "status": READY}
+
+            job = {
+                "document_set_id": set_id,
+                "status": QUEUED,
+                "files": len(uploads),
+                "files_done": 0,
+                "chunks": 0,
+                "error": None,
+            }
+            self._jobs[set_id] = job
+
+        self._executor.submit(self._ingest, set_id, uploads)
+        return dict(job)
+
+    def _update(self, set_id: str, **fields):
+        with self._lock:
+            self._jobs[set_id].update(fields)
+
+    def _ingest(self, set_id: str, uploads: List[Tuple[bytes, str]]):
+        """Worker: build every file's store, merge them and save the set"""
+        start = time.perf_counter()
+        self._update(set_id, status=PROCESSING)
+        try:
+            stores = []
+            for number, (data, filename) in enumerate(uploads, 1):
+                stores.append(self.build_store(data, filename))
+                self._update(set_id, files_done=number)
+
+            store = UploadStore.merge(stores)
+            store.save(self._set_path(set_id))
+            self.stores.get_or_build(set_id, lambda: store)
+        except Exception as e:
+            logger.exception(f"Ingestion of document set {set_id} failed")
+            self._update(set_id, status=FAILED, error=str(e))
+            return
+
+        self._update(set_id, status=READY, chunks=len(store.chunks))
+        logger.info(
+            f"✓ Document set {set_id}: {len(uploads)} files, {len(store.chunks)} chunks "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def status(self, set_id: str) -> Optional[Dict]:
+        """Job status of a set (None = unknown id)"""
+        if not SET_ID_PATTERN.fullmatch(set_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(set_id)
+            if job is not None:
+                return dict(job)
+        # Ingested by an earlier process
+        if self._set_path(set_id).exists():
+            return {"document_set_id": set_id, "status": READY}
+        return None
+
+    def get_store(self, set_id: str) -> UploadStore:
+        """
+        Merged store of a ready set, loaded from disk if it is not in memory
+
+        Raises:
+            KeyError: if the set is unknown or not ready
+        """
+        job = self.status(set_id)
+        if job is None or job["status"] != READY:
+            raise KeyError(f"Document set {set_id} is not ready")
+        return self.stores.get_or_build(set_id, lambda: UploadStore.load(self._set_path(set_id)))
@@ -0,0 +1,29 @@
+"""
+Server-Sent Events formatting for the streaming /ask_AI endpoints
+A stream is a series of `token` events carrying pieces of the answer,
+closed by one `done` event with the complete answer.
+"""
+
+import json
+from typing import Dict, Optional
+
+# No caching, and no buffering by reverse proxies (nginx), so tokens reach the client as they are sent
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """
+    One SSE message
+
+    Args:
+        data: JSON payload (newlines in it are escaped, so it fits a single data line)
+        event: Event name (None = default "message" event)
+
+    Returns:
+        Wire-format message, terminated by a blank line
+    """
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
@@ -0,0 +1,268 @@
+"""
+Content-addressed cache of the vector stores built for uploaded files
+An upload is parsed, split and embedded once; follow-up questions on the same
+file (same bytes, same splitter and model settings) reuse its chunks and FAISS
+index and only embed the query. Entries live in an LRU bounded by memory and
+are optionally spilled to disk when evicted.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def upload_key(data: bytes, **settings) -> str:
+    """
+    Cache key of an uploaded file: hash of its bytes and of everything the store depends on
+
+    Args:
+        data: Raw file bytes
+        **settings: Parser / splitter / model settings (file suffix, chunk_size, model_name, ...)
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class UploadStore:
+    """Chunks of one uploaded file and their exact (L2) FAISS index"""
+
+    CHUNKS_FILE = "chunks.json"
+    INDEX_FILE = "index.faiss"
+
+    def __init__(self, chunks: List[str], index: faiss.Index):
+        self.chunks = chunks
+        self.index = index
+
+    @classmethod
+    def build(cls, chunks: List[str], vectors: np.ndarray) -> "UploadStore":
+        """Index chunk vectors with the same metric as LangChain's FAISS store (L2)"""
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        return cls(chunks, index)
+
+    @classmethod
+    def merge(cls, stores: Sequence["UploadStore"]) -> "UploadStore":
+        """One store holding the chunks and vectors of several stores"""
+        chunks = [chunk for store in stores for chunk in store.chunks]
+        filled = [store.index for store in stores if store.index.ntotal]
+        if not filled:
+            return cls.build(chunks, np.zeros((0, 1), dtype='float32'))
+        return cls.build(chunks, np.vstack([index.reconstruct_n(0, index.ntotal) for index in filled]))
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the store"""
+        return self.index.ntotal * self.index.d * 4 + sum(len(chunk) for chunk in self.chunks)
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[Tuple[float, str]]:
+        """(distance, chunk) of the k nearest chunks, nearest first"""
+        k = min(k, self.index.ntotal)
+        if k <= 0:
+            return []
+        distances, ids = self.index.search(np.asarray(query_vector, dtype='float32').reshape(1, -1), k)
+        return [(float(d), self.chunks[i]) for d, i in zip(distances[0], ids[0]) if i >= 0]
+
+    def save(self, path: Path):
+        """Write chunks and index into a directory (replaced atomically)"""
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        with open(tmp_path / self.CHUNKS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.chunks, f)
+        faiss.write_index(self.index, str(tmp_path / self.INDEX_FILE))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "UploadStore":
+        with open(path / cls.CHUNKS_FILE, 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+        return cls(chunks, faiss.read_index(str(path / cls.INDEX_FILE)))
+
+
+def search_stores(stores: Sequence[UploadStore], query_vector: np.ndarray, k: int) -> List[str]:
+    """
+    Top-k chunks over several stores, identical to searching one index over all their chunks
+
+    Args:
+        stores: Stores of the uploaded files
+        query_vector: Query embedding
+        k: Number of chunks
+
+    Returns:
+        Chunk texts, nearest first
+    """
+    hits = [hit for store in stores for hit in store.search(query_vector, k)]
+    hits.sort(key=lambda hit: hit[0])
+    return [chunk for _, chunk in hits[:k]]
+
+
+class UploadStoreCache:
+    """
+    Thread-safe LRU of UploadStores bounded by memory, with optional disk spill
+
+    Concurrent requests for the same file wait for a single build. Evicted
+    stores are written to spill_dir (when set) and promoted back on their next
+    use; the spill directory is pruned oldest-first to spill_max_bytes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 512 * 1024 * 1024,
+        spill_dir: Optional[str] = None,
+        spill_max_bytes: int = 4 * 1024 * 1024 * 1024
+    ):
+        """
+        Initialize cache
+
+        Args:
+            max_bytes: Memory budget of the cached stores
+            spill_dir: Directory evicted stores are written to (None = drop them)
+            spill_max_bytes: Disk budget of spill_dir
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_max_bytes = spill_max_bytes
+        self._entries: "OrderedDict[str, UploadStore]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._building_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get(self, key: str) -> Optional[UploadStore]:
+        with self._lock:
+            store = self._entries.get(key)
+            if store is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return store
+
+    def _put(self, key: str, store: UploadStore):
+        """Insert a store, spilling least recently used ones past the memory budget"""
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            self._entries[key] = store
+            self._bytes += store.nbytes
+            # The newest store is kept even if it alone exceeds the budget
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_store = self._entries.popitem(last=False)
+                self._bytes -= old_store.nbytes
+                evicted.append((old_key, old_store))
+
+        for old_key, old_store in evicted:
+            self._spill(old_key, old_store)
+
+    def _spill(self, key: str, store: UploadStore):
+        if self.spill_dir is None:
+            return
+        path = self.spill_dir / key
+        if not path.exists():
+            store.save(path)
+            self._prune_spill()
+        logger.info(f"Spilled upload store {key[:12]} ({len(store.chunks)} chunks) to disk")
+
+    def _prune_spill(self):
+        """Delete the oldest spilled stores past the disk budget"""
+        entries = []
+        for path in self.spill_dir.iterdir():
+            if path.is_dir() and not path.name.startswith('.'):
+                size = sum(f.stat().st_size for f in path.iterdir())
+                entries.append((path.stat().st_mtime, size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.spill_max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def _load_spilled(self, key: str) -> Optional[UploadStore]:
+        if self.spill_dir is None:
+            return None
+        path = self.spill_dir / key
+        if not path.exists():
+            return None
+        try:
+            store = UploadStore.load(path)
+        except (OSError, ValueError, RuntimeError) as e:
+            logger.warning(f"Dropping unreadable spilled upload store {path}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        # Recently used: kept by the next pruning
+        os.utime(path)
+        return store
+
+    def get_or_build(self, key: str, build: Callable[[], UploadStore]) -> UploadStore:
+        """
+        Store cached under `key`, loading it from disk or calling `build` on a miss
+
+        Args:
+            key: Content key (see upload_key)
+            build: Zero-argument function parsing, splitting and embedding the file
+
+        Returns:
+            The cached UploadStore
+        """
+        store = self._get(key)
+        if store is not None:
+            return store
+
+        with self._lock:
+            key_lock = self._building_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            store = self._get(key)
+            if store is None:
+                store = self._load_spilled(key)
+                if store is not None:
+                    with self._lock:
+                        self.disk_hits += 1
+                else:
+                    start = time.perf_counter()
+                    store = build()
+                    with self._lock:
+                        self.misses += 1
+                    logger.info(
+                        f"✓ Built upload store {key[:12]} ({len(store.chunks)} chunks) "
+                        f"in {time.perf_counter() - start:.2f}s"
+                    )
+                self._put(key, store)
+        with self._lock:
+            self._building_locks.pop(key, None)
+        return store
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,167 @@
+"""
+Uploaded-file handling shared by the Flask and async APIs
+Parses an upload, splits and embeds it into a per-file vector store cached by
+content, ingests document sets in the background, and retrieves the chunks
+closest to a question.
+"""
+
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_classic.document_loaders import(
+    TextLoader, # for .txt files
+    PyPDFLoader, # for .pdf files
+    Docx2txtLoader, # for .docx file
+    UnstructuredMarkdownLoader # for .md
+)
+from langchain_classic.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+
+from src.api.document_sets import DocumentSetRegistry
+from src.api.upload_cache import UploadStore, UploadStoreCache, search_stores, upload_key
+from src.ingestion.model_registry import get_model_registry
+from src.retriever.query_batcher import QueryBatcher, create_query_batcher
+from src.utils.config import Config
+
+
+def process_files(file_path: str):
+    file_ext = Path(file_path).suffix.lower()
+
+    if file_ext == ".pdf":
+        loader = PyPDFLoader(file_path)
+    elif file_ext == ".txt":
+        loader = TextLoader(file_path, encoding="utf-8")
+    elif file_ext in [".doc", ".docx"]:
+        loader = Docx2txtLoader(file_path)
+    elif file_ext == ".md":
+        loader = UnstructuredMarkdownLoader(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_ext}")
+
+    documents = loader.load()
+    documents = [doc for doc in documents if doc.page_content.strip() != ""] # filtering empyt
+    return documents
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    def __init__(self, model_name: str = 'bert-base-uncased'):
+        self.model_name = model_name
+
+    @property
+    def model(self):
+        # loaded on the first request, then shared through the process-wide registry
+        return get_model_registry().sentence_transformer(self.model_name)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of documents."""
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of documents into one float32 array (no Python lists)."""
+        return self.model.encode(texts, convert_to_numpy=True).astype('float32', copy=False)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query."""
+        embedding = self.model.encode([text], convert_to_numpy=True)
+        return embedding[0].tolist()
+
+
+embeddings = SentenceTransformerEmbeddings(Config.UPLOAD_EMBEDDING_MODEL)
+
+UPLOAD_CHUNK_SIZE = 800
+UPLOAD_CHUNK_OVERLAP = 100
+
+# Process-wide upload state, created on first use (importing this module starts nothing)
+_upload_stores: Optional[UploadStoreCache] = None
+_document_sets: Optional[DocumentSetRegistry] = None
+_query_batcher: Optional[QueryBatcher] = None
+_query_batcher_created = False
+_state_lock = threading.Lock()
+
+
+def get_upload_stores() -> UploadStoreCache:
+    """Stores of already-seen uploads: a follow-up question only embeds the query"""
+    global _upload_stores
+    with _state_lock:
+        if _upload_stores is None:
+            _upload_stores = UploadStoreCache(
+                max_bytes=Config.UPLOAD_CACHE_MAX_MB * 1024 * 1024,
+                spill_dir=Config.UPLOAD_CACHE_SPILL_DIR or None,
+                spill_max_bytes=Config.UPLOAD_CACHE_SPILL_MAX_MB * 1024 * 1024
+            )
+        return _upload_stores
+
+
+def create_temp_vectorestore(data: bytes, suffix: str) -> UploadStore:
+    """Parse, split and embed one uploaded file"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(data)
+        tmp_path = tmp.name
+    try:
+        docs = process_files(tmp_path)
+    finally:
+        os.unlink(tmp_path)
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=UPLOAD_CHUNK_SIZE, chunk_overlap=UPLOAD_CHUNK_OVERLAP)
+    chunks = [doc.page_content for doc in text_splitter.split_documents(docs)]
+    vectors = embeddings.embed_documents_array(chunks) if chunks else np.zeros((0, 1), dtype='float32')
+    return UploadStore.build(chunks, vectors)
+
+
+def get_upload_store(data: bytes, filename: str) -> UploadStore:
+    """Cached store of an uploaded file, keyed by its bytes and the chunking / model settings"""
+    suffix = Path(filename).suffix.lower()
+    key = upload_key(
+        data,
+        suffix=suffix,
+        model_name=embeddings.model_name,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        chunk_overlap=UPLOAD_CHUNK_OVERLAP
+    )
+    return get_upload_stores().get_or_build(key, lambda: create_temp_vectorestore(data, suffix))
+
+
+def get_document_sets() -> DocumentSetRegistry:
+    """Files uploaded once (POST /documents) and queried by set id (POST /ask)"""
+    global _document_sets
+    with _state_lock:
+        if _document_sets is None:
+            _document_sets = DocumentSetRegistry(
+                Config.DOCUMENT_SET_DIR,
+                build_store=get_upload_store,
+                max_bytes=Config.DOCUMENT_SET_CACHE_MB * 1024 * 1024,
+                workers=Config.INGEST_WORKERS
+            )
+        return _document_sets
+
+
+def get_query_batcher() -> Optional[QueryBatcher]:
+    """Batcher embedding the questions of concurrent requests together (None = Config.QUERY_BATCH_* disable it)"""
+    global _query_batcher, _query_batcher_created
+    with _state_lock:
+        if not _query_batcher_created:
+            _query_batcher = create_query_batcher(embeddings.embed_documents_array)
+            _query_batcher_created = True
+        return _query_batcher
+
+
+def embed_query(query: str) -> np.ndarray:
+    """Query embedding, batched with those of concurrent requests when batching is enabled"""
+    query_batcher = get_query_batcher()
+    if query_batcher is not None:
+        return query_batcher.embed_query(query)
+    return embeddings.embed_documents_array([query])[0]
+
+
+def search_documents(stores: List[UploadStore], query_vector: np.ndarray, k: int = 4) -> List[Dict]:
+    """Top-k chunks of the uploaded files for an embedded query, as augmented_prompt expects them"""
+    return [{'text': chunk, 'metadata': {}} for chunk in search_stores(stores, query_vector, k=k)]
+
+
+def retrieve_documents(stores: List[UploadStore], query: str, k: int = 4) -> List[Dict]:
+    """Top-k chunks of the uploaded files for a query (one query embedding)"""
+    return search_documents(stores, embed_query(query), k=k)
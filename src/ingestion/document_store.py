@@ -0,0 +1,606 @@
+"""
+Compact on-disk document store for the MongoDB vector index
+Documents are stored as offset-indexed records in one binary file. Repeated
+metadata values (source, database, collection, loaded_at, ...) are interned
+into per-field value tables, so each record only keeps a small integer code.
+Text is decoded lazily, only for the documents that are actually returned.
+
+Rows are append-only: updates append a new record and tombstone the old one,
+and compact() rewrites the store without the tombstoned rows.
+"""
+
+import json
+import logging
+import mmap
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional
+
+import numpy as np
+
+from src.utils.helpers import atomic_write_path, stable_hash64
+
+logger = logging.getLogger(__name__)
+
+# A metadata field is interned when its distinct values cover at most this share of records
+INTERN_MAX_DISTINCT_RATIO = 0.5
+
+# Code stored for records that do not have an interned field
+MISSING_CODE = -1
+
+
+def _intern_key(value):
+    """Hashable key that keeps 1, 1.0 and True apart"""
+    return (type(value).__name__, value)
+
+
+def _save_array(path: Path, array: np.ndarray):
+    """np.save through a temporary file so mapped readers are never truncated"""
+    with atomic_write_path(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+
+
+class DocumentStore:
+    """
+    Memory-mapped document store with in-memory pending appends
+
+    Layout inside the vector store directory:
+        documents.bin          - one record per row: inline JSON header, newline, UTF-8 text
+        documents.idx.npy      - int64 byte offsets, one more than the number of rows
+        documents.codes.npy    - int32 (n_rows, n_interned_fields) value codes
+        documents.keys.npy     - int64 stable hash of each row's Mongo _id
+        documents.hashes.npy   - int64 stable hash of each row's text (finds duplicate content)
+        documents.deleted.npy  - bool tombstone per row
+        documents.json         - interned fields, their value tables and live per-value counts
+    """
+
+    DATA_FILE = "documents.bin"
+    OFFSETS_FILE = "documents.idx.npy"
+    CODES_FILE = "documents.codes.npy"
+    KEYS_FILE = "documents.keys.npy"
+    HASHES_FILE = "documents.hashes.npy"
+    DELETED_FILE = "documents.deleted.npy"
+    HEADER_FILE = "documents.json"
+
+    def __init__(self, store_path: Path, create: bool = False):
+        """
+        Open a document store
+
+        Args:
+            store_path: Directory holding the document store files
+            create: Start an empty store that replaces any existing one on flush()
+        """
+        self.store_path = Path(store_path)
+        self._file = None
+        self._data = b""
+        self._pending: List[Dict[str, Any]] = []
+        self._lookup = None
+        self._hash_lookup = None
+        self._postings = {}
+
+        if create or not self.exists(self.store_path):
+            self._rewrite = True
+            self.interned_fields: List[str] = []
+            self.value_tables: Dict[str, list] = {}
+            self.value_counts: Dict[str, Dict[str, int]] = {}
+            self.offsets = np.zeros(1, dtype='int64')
+            self.codes = np.zeros((0, 0), dtype='int32')
+            self.keys = np.zeros(0, dtype='int64')
+            self.hashes = np.zeros(0, dtype='int64')
+            self.deleted = np.zeros(0, dtype=bool)
+            self._counts_dirty = True
+        else:
+            self._rewrite = False
+            self._open()
+
+        self._init_lookups()
+
+    def _open(self):
+        """Map the persisted store files"""
+        with open(self.store_path / self.HEADER_FILE, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        self.interned_fields = header['interned_fields']
+        self.value_tables = header['value_tables']
+        self.value_counts = header['value_counts']
+
+        self.offsets = np.load(self.store_path / self.OFFSETS_FILE, mmap_mode='r')
+        self.codes = np.load(self.store_path / self.CODES_FILE, mmap_mode='r')
+        self.keys = np.load(self.store_path / self.KEYS_FILE, mmap_mode='r')
+        # Tombstones are small and mutable, keep them in memory
+        self.deleted = np.load(self.store_path / self.DELETED_FILE)
+        self._counts_dirty = False
+
+        self._file = open(self.store_path / self.DATA_FILE, 'rb')
+        # mmap cannot map an empty file
+        if int(self.offsets[-1]):
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        hashes_path = self.store_path / self.HASHES_FILE
+        if hashes_path.exists():
+            self.hashes = np.load(hashes_path, mmap_mode='r')
+        else:
+            # Stores written before content hashes were kept: hash the texts once
+            self.hashes = np.array(
+                [stable_hash64(self.get_text(row)) for row in range(len(self.offsets) - 1)],
+                dtype='int64'
+            )
+
+    def _init_lookups(self):
+        """Rebuild per-field value -> code dictionaries used while appending"""
+        self._field_columns = {field: i for i, field in enumerate(self.interned_fields)}
+        self._value_lookup = {
+            field: {_intern_key(value): code for code, value in enumerate(values)}
+            for field, values in self.value_tables.items()
+        }
+
+    @classmethod
+    def exists(cls, store_path: Path) -> bool:
+        """Check whether a document store has been written to this directory"""
+        store_path = Path(store_path)
+        return all(
+            (store_path / name).exists()
+            for name in (cls.DATA_FILE, cls.OFFSETS_FILE, cls.CODES_FILE,
+                         cls.KEYS_FILE, cls.DELETED_FILE, cls.HEADER_FILE)
+        )
+
+    @staticmethod
+    def _select_interned_fields(documents: List[Dict[str, Any]]) -> List[str]:
+        """Pick scalar metadata fields whose values repeat across documents"""
+        max_distinct = max(1, int(len(documents) * INTERN_MAX_DISTINCT_RATIO))
+        distinct = {}
+        rejected = set()
+
+        for doc in documents:
+            for field, value in doc.get('metadata', {}).items():
+                if field in rejected:
+                    continue
+                # Only scalars can be interned; too many distinct values means no sharing
+                if not isinstance(value, (str, int, float, bool)):
+                    rejected.add(field)
+                    continue
+                values = distinct.setdefault(field, set())
+                values.add(_intern_key(value))
+                if len(values) > max_distinct:
+                    rejected.add(field)
+
+        return sorted(field for field in distinct if field not in rejected)
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+
+    def append(self, documents: List[Dict[str, Any]], keys: np.ndarray) -> np.ndarray:
+        """
+        Append documents as new rows (kept in memory until flush())
+
+        Args:
+            documents: Documents with 'id', 'text' and 'metadata'
+            keys: Stable int64 key per document
+
+        Returns:
+            Row numbers assigned to the documents
+        """
+        if not self.interned_fields and len(self) == 0:
+            # First batch of a new store decides which fields are interned
+            self.interned_fields = self._select_interned_fields(documents)
+            self.value_tables = {field: [] for field in self.interned_fields}
+            self._init_lookups()
+
+        codes = np.full((len(documents), len(self.interned_fields)), MISSING_CODE, dtype='int32')
+        for i, doc in enumerate(documents):
+            for field, value in doc.get('metadata', {}).items():
+                column = self._field_columns.get(field)
+                if column is None or not isinstance(value, (str, int, float, bool)):
+                    continue
+                lookup = self._value_lookup[field]
+                key = _intern_key(value)
+                if key not in lookup:
+                    lookup[key] = len(self.value_tables[field])
+                    self.value_tables[field].append(value)
+                codes[i, column] = lookup[key]
+
+        first_row = len(self)
+        self._pending.extend(documents)
+        self.codes = np.concatenate([self.codes, codes]) if len(self.codes) else codes
+        self.keys = np.concatenate([self.keys, np.asarray(keys, dtype='int64')])
+        self.hashes = np.concatenate([
+            self.hashes, np.array([stable_hash64(doc.get('text', '')) for doc in documents], dtype='int64')
+        ])
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(documents), dtype=bool)])
+        self._counts_dirty = True
+        self._lookup = None
+        self._hash_lookup = None
+        self._postings = {}
+
+        return np.arange(first_row, first_row + len(documents), dtype='int64')
+
+    def delete(self, rows: np.ndarray):
+        """Tombstone rows (persisted on flush(), reclaimed by compact())"""
+        rows = np.asarray(rows, dtype='int64')
+        if rows.size:
+            self.deleted[rows] = True
+            self._counts_dirty = True
+            self._lookup = None
+            self._hash_lookup = None
+
+    def _key_lookup(self):
+        """(sorted keys, their live rows), rebuilt after appends and deletes"""
+        if self._lookup is None:
+            live_rows = np.flatnonzero(~self.deleted)
+            order = np.argsort(self.keys[live_rows], kind='stable')
+            self._lookup = (np.asarray(self.keys[live_rows][order]), live_rows[order])
+        return self._lookup
+
+    def find_rows(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Map stable keys to their live row numbers
+
+        Args:
+            keys: int64 keys
+
+        Returns:
+            Row number per key, -1 where no live row has that key
+        """
+        sorted_keys, sorted_rows = self._key_lookup()
+        keys = np.asarray(keys, dtype='int64')
+        if not len(sorted_keys):
+            return np.full(len(keys), -1, dtype='int64')
+
+        positions = np.clip(np.searchsorted(sorted_keys, keys), 0, len(sorted_keys) - 1)
+        return np.where(sorted_keys[positions] == keys, sorted_rows[positions], -1)
+
+    def find_all_rows(self, keys: np.ndarray) -> np.ndarray:
+        """
+        All live rows of the given keys (a chunked document has one row per chunk)
+
+        Args:
+            keys: int64 keys
+
+        Returns:
+            Ascending row numbers
+        """
+        sorted_keys, sorted_rows = self._key_lookup()
+        keys = np.asarray(keys, dtype='int64')
+        starts = np.searchsorted(sorted_keys, keys, side='left')
+        ends = np.searchsorted(sorted_keys, keys, side='right')
+        rows = [sorted_rows[start:end] for start, end in zip(starts, ends) if end > start]
+        return np.sort(np.concatenate(rows)) if rows else np.zeros(0, dtype='int64')
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _encode_record(doc: Dict[str, Any], interned_fields: set) -> bytes:
+        """Inline JSON header (non-interned metadata) + newline + UTF-8 text"""
+        inline_metadata = {
+            field: value for field, value in doc.get('metadata', {}).items()
+            if field not in interned_fields or not isinstance(value, (str, int, float, bool))
+        }
+        # json.dumps escapes newlines, so the first newline ends the header
+        header = json.dumps(
+            {'id': doc.get('id', ''), 'metadata': inline_metadata},
+            ensure_ascii=False, default=str
+        ).encode('utf-8')
+        return header + b"\n" + doc.get('text', '').encode('utf-8')
+
+    def _compute_value_counts(self) -> Dict[str, Dict[str, int]]:
+        """Live documents per interned value"""
+        live = ~self.deleted
+        counts = {}
+        for field, column in self._field_columns.items():
+            codes = np.asarray(self.codes[live, column])
+            codes = codes[codes != MISSING_CODE]
+            values = self.value_tables[field]
+            counts[field] = {
+                str(values[code]): int(count)
+                for code, count in enumerate(np.bincount(codes, minlength=len(values))) if count
+            }
+        return counts
+
+    def flush(self):
+        """Persist pending rows, tombstones and counts to disk"""
+        if not self._pending and not self._counts_dirty:
+            return
+
+        interned = set(self.interned_fields)
+        data_path = self.store_path / self.DATA_FILE
+        base_size = 0 if self._rewrite else int(self.offsets[-1])
+
+        new_offsets = np.zeros(len(self._pending), dtype='int64')
+        if self._rewrite:
+            # New store: write the whole data file next to the old one and swap it in
+            with atomic_write_path(data_path) as tmp_path:
+                with open(tmp_path, 'wb') as f:
+                    self._write_records(f, self._pending, interned, base_size, new_offsets)
+        else:
+            # Appending never moves existing records, so mapped readers stay valid
+            with open(data_path, 'ab') as f:
+                self._write_records(f, self._pending, interned, base_size, new_offsets)
+
+        base_offsets = np.zeros(1, dtype='int64') if self._rewrite else np.asarray(self.offsets)
+        offsets = np.concatenate([base_offsets, new_offsets])
+
+        self.value_counts = self._compute_value_counts()
+        _save_array(self.store_path / self.OFFSETS_FILE, offsets)
+        _save_array(self.store_path / self.CODES_FILE, np.asarray(self.codes))
+        _save_array(self.store_path / self.KEYS_FILE, np.asarray(self.keys))
+        _save_array(self.store_path / self.HASHES_FILE, np.asarray(self.hashes))
+        _save_array(self.store_path / self.DELETED_FILE, self.deleted)
+        self._write_header()
+
+        logger.info(
+            f"✓ Flushed {len(self._pending)} new documents to {data_path} "
+            f"({self.num_live} live, {int(self.deleted.sum())} deleted)"
+        )
+
+        self.close()
+        self._pending = []
+        self._rewrite = False
+        self._open()
+
+    @staticmethod
+    def _write_records(f, documents, interned: set, base_size: int, offsets_out: np.ndarray):
+        position = base_size
+        for i, doc in enumerate(documents):
+            record = DocumentStore._encode_record(doc, interned)
+            f.write(record)
+            position += len(record)
+            offsets_out[i] = position
+
+    def _write_header(self):
+        with atomic_write_path(self.store_path / self.HEADER_FILE) as tmp_path:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'num_documents': len(self),
+                    'num_live': self.num_live,
+                    'interned_fields': self.interned_fields,
+                    'value_tables': self.value_tables,
+                    'value_counts': self.value_counts,
+                }, f, ensure_ascii=False, default=str)
+
+    def compact(self) -> np.ndarray:
+        """
+        Rewrite the store without tombstoned rows
+
+        Returns:
+            Old row numbers of the kept rows; kept row i becomes new row i
+        """
+        self.flush()
+        live_rows = np.flatnonzero(~self.deleted)
+        if len(live_rows) == len(self):
+            return live_rows
+
+        offsets = np.zeros(len(live_rows) + 1, dtype='int64')
+        with atomic_write_path(self.store_path / self.DATA_FILE) as tmp_path:
+            with open(tmp_path, 'wb') as f:
+                for i, row in enumerate(live_rows):
+                    # Records are copied as raw bytes, nothing is re-encoded
+                    record = self._data[int(self.offsets[row]):int(self.offsets[row + 1])]
+                    f.write(record)
+                    offsets[i + 1] = offsets[i] + len(record)
+
+        _save_array(self.store_path / self.OFFSETS_FILE, offsets)
+        _save_array(self.store_path / self.CODES_FILE, np.asarray(self.codes[live_rows]))
+        _save_array(self.store_path / self.KEYS_FILE, np.asarray(self.keys[live_rows]))
+        _save_array(self.store_path / self.HASHES_FILE, np.asarray(self.hashes[live_rows]))
+        _save_array(self.store_path / self.DELETED_FILE, np.zeros(len(live_rows), dtype=bool))
+
+        removed = len(self) - len(live_rows)
+        self.close()
+        self._open()
+        self._write_header()
+        self._lookup = None
+        self._hash_lookup = None
+        self._postings = {}
+        logger.info(f"✓ Compacted document store: removed {removed} deleted rows")
+        return live_rows
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    @property
+    def num_base(self) -> int:
+        """Rows already persisted in documents.bin"""
+        return 0 if self._rewrite else len(self.offsets) - 1
+
+    @property
+    def num_live(self) -> int:
+        """Rows that are not tombstoned"""
+        return int(len(self.deleted) - self.deleted.sum())
+
+    def __len__(self) -> int:
+        return self.num_base + len(self._pending)
+
+    def get(self, idx: int, include_text: bool = True) -> Dict[str, Any]:
+        """
+        Decode a single document
+
+        Args:
+            idx: Row number
+            include_text: Also decode the (potentially long) document text
+
+        Returns:
+            Document dict with 'id', 'metadata' and, if requested, 'text'
+        """
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Document index {idx} out of range")
+
+        if idx >= self.num_base:
+            pending = self._pending[idx - self.num_base]
+            document = {'id': pending.get('id', '')}
+            if include_text:
+                document['text'] = pending.get('text', '')
+            document['metadata'] = dict(pending.get('metadata', {}))
+            return document
+
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        split = self._data.find(b"\n", start, end)
+        header = json.loads(self._data[start:split])
+
+        metadata = {}
+        for field, code in zip(self.interned_fields, self.codes[idx]):
+            if code != MISSING_CODE:
+                metadata[field] = self.value_tables[field][code]
+        metadata.update(header['metadata'])
+
+        document = {'id': header['id']}
+        if include_text:
+            document['text'] = self._data[split + 1:end].decode('utf-8')
+        document['metadata'] = metadata
+        return document
+
+    def get_text(self, idx: int) -> str:
+        """Decode only the text of a document"""
+        return self.get(idx)['text']
+
+    def get_metadata(self, idx: int) -> Dict[str, Any]:
+        """Decode only the metadata of a document"""
+        return self.get(idx, include_text=False)['metadata']
+
+    def field_codes(self, field: str) -> Optional[np.ndarray]:
+        """Interned value codes of a field for every row (None if the field is stored inline)"""
+        column = self._field_columns.get(field)
+        return None if column is None else self.codes[:, column]
+
+    # ------------------------------------------------------------------
+    # Metadata filtering
+    # ------------------------------------------------------------------
+
+    def _field_postings(self, field: str):
+        """
+        Inverted index of an interned field, built from its code column on first use
+
+        Returns:
+            (row numbers sorted by value code, start position of each code's rows)
+        """
+        postings = self._postings.get(field)
+        if postings is None:
+            codes = np.asarray(self.codes[:, self._field_columns[field]])
+            # Stable sort keeps the rows of each value in ascending order
+            rows = np.argsort(codes, kind='stable').astype('int64')
+            starts = np.searchsorted(codes[rows], np.arange(len(self.value_tables[field]) + 1))
+            postings = (rows, starts)
+            self._postings[field] = postings
+        return postings
+
+    def value_rows(self, field: str, value) -> Optional[np.ndarray]:
+        """
+        Rows (including tombstoned ones) whose interned field equals a value
+
+        Returns:
+            Ascending row numbers, or None if the field/value cannot be looked up
+            (field stored inline or non-scalar value)
+        """
+        if field not in self._field_columns or not isinstance(value, (str, int, float, bool)):
+            return None
+        code = self._value_lookup[field].get(_intern_key(value))
+        if code is None:
+            return np.zeros(0, dtype='int64')
+        rows, starts = self._field_postings(field)
+        return rows[starts[code]:starts[code + 1]]
+
+    def filter_rows(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Live rows whose metadata equals every filter value
+
+        Interned fields are answered from their posting lists, so the cost
+        follows the size of the matching subset. Fields stored inline are
+        checked by decoding the headers of the remaining candidates only.
+
+        Args:
+            filters: Metadata field -> required value
+
+        Returns:
+            Ascending row numbers
+        """
+        rows = None
+        inline_filters = {}
+        for field, value in filters.items():
+            matching = self.value_rows(field, value)
+            if matching is None:
+                inline_filters[field] = value
+            else:
+                rows = matching if rows is None else np.intersect1d(rows, matching, assume_unique=True)
+
+        if rows is None:
+            rows = np.arange(len(self), dtype='int64')
+        rows = rows[~self.deleted[rows]]
+
+        if inline_filters and len(rows):
+            rows = np.array([
+                row for row in rows
+                if all(
+                    self.get(int(row), include_text=False)['metadata'].get(field) == value
+                    for field, value in inline_filters.items()
+                )
+            ], dtype='int64')
+        return rows
+
+    # ------------------------------------------------------------------
+    # Duplicate content
+    # ------------------------------------------------------------------
+
+    def distinct_rows(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Keep the first row of each distinct text
+
+        Args:
+            rows: Ascending row numbers
+
+        Returns:
+            Ascending subset of `rows` without repeated content
+        """
+        _, first = np.unique(np.asarray(self.hashes[rows]), return_index=True)
+        if len(first) == len(rows):
+            return rows
+        return rows[np.sort(first)]
+
+    def duplicate_rows(self, row: int) -> np.ndarray:
+        """Other live rows with the same text as `row`"""
+        if self._hash_lookup is None:
+            live_rows = np.flatnonzero(~self.deleted)
+            order = np.argsort(self.hashes[live_rows], kind='stable')
+            self._hash_lookup = (np.asarray(self.hashes[live_rows][order]), live_rows[order])
+
+        sorted_hashes, sorted_rows = self._hash_lookup
+        content_hash = self.hashes[row]
+        start = np.searchsorted(sorted_hashes, content_hash, side='left')
+        end = np.searchsorted(sorted_hashes, content_hash, side='right')
+        matches = sorted_rows[start:end]
+        return matches[matches != row]
+
+    def count_by(self, field: str) -> Dict[str, int]:
+        """Number of live documents per value of an interned field, without decoding records"""
+        if self._counts_dirty:
+            self.value_counts = self._compute_value_counts()
+            self._counts_dirty = False
+        return dict(self.value_counts.get(field, {}))
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        return self.get(idx)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over live documents"""
+        for idx in np.flatnonzero(~self.deleted):
+            yield self[int(idx)]
+
+    def file_paths(self) -> List[Path]:
+        """Files backing this store (used for page-cache warm-up)"""
+        return [
+            self.store_path / name
+            for name in (self.DATA_FILE, self.OFFSETS_FILE, self.CODES_FILE,
+                         self.KEYS_FILE, self.HASHES_FILE, self.DELETED_FILE, self.HEADER_FILE)
+        ]
+
+    def close(self):
+        """Release the memory map and file handle"""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,17 +1,41 @@
 # now comes the data embedding part of the RAG model to store that in the vector DB
 
-from transformers import AutoTokenizer, AutoModel
+from transformers import AutoTokenizer
 import torch
 import numpy as np
 from langchain.embeddings.base import Embeddings
+from src.ingestion.embedding_cache import EmbeddingCache, get_embedding_cache
+from src.ingestion.embedding_tuner import DEFAULT_BATCH_SIZE, load_tuning
+from src.ingestion.model_registry import get_model_registry
+from src.ingestion.onnx_backend import mean_pool, validate_backend
+from src.utils.config import Config
 
 class BERTEmbeddings(Embeddings):
-    def __init__(self, model_name="bert-base-uncased", device=None):
+    def __init__(self, model_name="bert-base-uncased", device=None, use_cache=True, cache=None, backend=None, batch_size=None):
+        self.model_name = model_name
+        self.max_length = 512
+        # backend: "torch", "onnx" or "onnx-int8" (ONNX Runtime on CPU), None = Config.EMBEDDING_BACKEND
+        self.backend = validate_backend(backend or Config.EMBEDDING_BACKEND)
+        # vectors already computed for a text (in any run) are read from the shared on-disk cache
+        self.cache = (cache or get_embedding_cache()) if use_cache else None
+        cache_params = dict(max_length=self.max_length, normalize=True)
+        if self.backend != "torch":
+            cache_params["backend"] = self.backend
+        self.cache_namespace = EmbeddingCache.namespace(model_name, **cache_params)
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
-        self.model.eval()
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.model.to(self.device)
+        # model weights are loaded once per process and shared by every embedder
+        if self.backend == "torch":
+            self.onnx_model = None
+            self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+            self.model = get_model_registry().transformer(model_name, self.device)
+        else:
+            self.model = None
+            self.onnx_model = get_model_registry().onnx_encoder(model_name, quantize=self.backend == "onnx-int8")
+            self.device = "cpu"
+        # batch size calibrated for this host (src/ingestion/embedding_tuner.py), if any;
+        # torch threads are process-wide and left to the ingestion entry point (apply_tuned_threads)
+        tuning = load_tuning(model_name, self.backend, self.device) or {}
+        self.batch_size = batch_size or tuning.get('batch_size', DEFAULT_BATCH_SIZE)
 
     def mean_pooling(self, model_output, attention_mask):
         token_embeddings = model_output[0]
@@ -21,15 +45,31 @@ class BERTEmbeddings(Embeddings):
         return sum_embeddings / sum_mask
 
     def embed_documents(self, texts):
+        if self.cache is None or not len(texts):
+            return self._embed_uncached(texts)
+        return self.cache.embed(self.cache_namespace, list(texts), self._embed_uncached)
+
+    def _embed_uncached(self, texts):
         all_embeddings = []
-        batch_size = 32
+        batch_size = self.batch_size
         for i in range(0, len(texts), batch_size):
             batch_texts = texts[i:i+batch_size]
+            if self.onnx_model is not None:
+                encoded_input = self.tokenizer(
+                    batch_texts,
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="np"
+                )
+                token_embeddings = self.onnx_model(encoded_input)
+                all_embeddings.append(mean_pool(token_embeddings, encoded_input["attention_mask"]))
+                continue
             encoded_input = self.tokenizer(
                 batch_texts,
                 padding=True,
                 truncation=True,
-                max_length=512,
+                max_length=self.max_length,
                 return_tensors="pt"
             ).to(self.device)
             with torch.no_grad():
@@ -39,8 +79,12 @@ class BERTEmbeddings(Embeddings):
             all_embeddings.append(embeddings.cpu().numpy())
         return np.vstack(all_embeddings)
 
+    def embed_queries(self, texts):
+        # search queries skip the on-disk cache (repeats hit the retriever's in-memory query cache)
+        return self._embed_uncached(list(texts))
+
     def embed_query(self, text):
-        return self.embed_documents([text])[0]
+        return self.embed_queries([text])[0]
 
 def get_embedder():
     return BERTEmbeddings()
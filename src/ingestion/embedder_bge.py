@@ -1,46 +1,92 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import torch
 from typing import List
+from src.ingestion.embedding_cache import EmbeddingCache, get_embedding_cache
+from src.ingestion.embedding_tuner import DEFAULT_BATCH_SIZE, load_tuning
+from src.ingestion.model_registry import get_model_registry
+from src.ingestion.onnx_backend import validate_backend
+from src.ingestion.token_chunker import TokenChunker, pad_token_ids
+from src.utils.config import Config
 
 class BGE_M3_Embedder:
-    def __init__(self, model_name="BAAI/bge-m3", batch_size=32, chunk_size=300, verbose=True):
+    def __init__(self, model_name="BAAI/bge-m3", batch_size=None, chunk_size=512, chunk_overlap=32, verbose=True, use_cache=True, cache=None, backend=None):
        
-        self.model = SentenceTransformer(model_name)
-        self.batch_size = batch_size
+        self.model_name = model_name
+        # backend: "torch", "onnx" or "onnx-int8" (ONNX Runtime, needs optimum), None = Config.EMBEDDING_BACKEND
+        self.backend = validate_backend(backend or Config.EMBEDDING_BACKEND)
+        # document vectors (chunk-averaged) are reused from the shared on-disk cache across runs
+        self.cache = (cache or get_embedding_cache()) if use_cache else None
+        # chunk_size counts model input tokens (it counted words before, hence the chunking key)
+        cache_params = dict(chunk_size=chunk_size, chunking="tokens", normalize=True)
+        if self.backend != "torch":
+            cache_params["backend"] = self.backend
+        self.cache_namespace = EmbeddingCache.namespace(model_name, **cache_params)
+        # shared with every other embedder of this model in the process
+        self.model = get_model_registry().sentence_transformer(model_name, self.backend)
+        # batch size calibrated for this host (src/ingestion/embedding_tuner.py), if any;
+        # torch threads are process-wide and left to the ingestion entry point (apply_tuned_threads)
+        device = "cpu" if self.backend != "torch" else str(self.model.device).split(":")[0]
+        tuning = load_tuning(model_name, self.backend, device) or {}
+        self.batch_size = batch_size or tuning.get('batch_size', DEFAULT_BATCH_SIZE)
         self.chunk_size = chunk_size
         self.verbose = verbose
+        # texts are tokenized once: chunks are cut on the model's tokens (sentence ends when possible)
+        # and their ids go straight to the model, never longer than max_seq_length
+        self.chunker = TokenChunker(
+            self.model.tokenizer, min(chunk_size, self.model.max_seq_length), chunk_overlap
+        )
 
-    def _chunk_text(self, text: str) -> List[str]:
-        
-        words = text.split()
-        if len(words) <= self.chunk_size:
-            return [text]
-        chunks = []
-        for i in range(0, len(words), self.chunk_size):
-            chunks.append(" ".join(words[i:i+self.chunk_size]))
-        return chunks
-
-    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+    def _chunk_text(self, texts: List[str]) -> List[List[np.ndarray]]:
+        # token ids of every chunk of every text, special tokens included
+        return [[ids for _, _, ids in chunks] for chunks in self.chunker.split(texts)]
+
+    def _embed_batch(self, token_ids: List[np.ndarray]) -> np.ndarray:
         
-        all_embeddings = []
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i:i+self.batch_size]
-            embeddings = self.model.encode(batch, normalize_embeddings=True)
-            all_embeddings.append(embeddings)
-        return np.vstack(all_embeddings)
+        # longest first so each batch is padded to similar lengths, scattered back to input order
+        order = np.argsort([-len(ids) for ids in token_ids], kind='stable')
+        embeddings = np.empty((len(token_ids), self.model.get_sentence_embedding_dimension()), dtype='float32')
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            features = {
+                name: torch.from_numpy(values).to(self.model.device)
+                for name, values in pad_token_ids(self.model.tokenizer, [token_ids[i] for i in positions]).items()
+            }
+            with torch.no_grad():
+                batch = self.model(features)['sentence_embedding']
+            embeddings[positions] = torch.nn.functional.normalize(batch, p=2, dim=1).float().cpu().numpy()
+        return embeddings
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         
-        if not texts:
-            return []
+        return [vec.tolist() for vec in self.embed_documents_array(texts)]
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        # same as embed_documents as one float32 array (no Python lists), used by the indexers
+        if self.cache is None:
+            return self._embed_rows(texts, self._embed_documents_uncached)
+        return self._embed_rows(
+            texts, lambda batch: self.cache.embed(self.cache_namespace, batch, self._embed_documents_uncached)
+        )
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        # search queries as one float32 array, without the on-disk cache
+        # (repeats hit the retriever's in-memory query cache)
+        return self._embed_rows(texts, self._embed_documents_uncached)
+
+    def _embed_rows(self, texts: List[str], embed) -> np.ndarray:
+        # one row per input text: empty texts are not embedded and get zero vectors
+        embeddings = np.zeros((len(texts), self.model.get_sentence_embedding_dimension()), dtype='float32')
+        rows = [i for i, text in enumerate(texts) if text and text.strip()]
+        if rows:
+            embeddings[rows] = embed([texts[i] for i in rows])
+        return embeddings
 
+    def _embed_documents_uncached(self, texts: List[str]) -> np.ndarray:
     
         all_chunks = []
         chunk_map = []  
-        for idx, text in enumerate(texts):
-            if not text or not text.strip():
-                continue
-            chunks = self._chunk_text(text)
+        texts = [text for text in texts if text and text.strip()]
+        for idx, chunks in enumerate(self._chunk_text(texts)):
             all_chunks.extend(chunks)
             chunk_map.append((idx, len(chunks)))
 
@@ -52,20 +98,19 @@ class BGE_M3_Embedder:
             print(f"Vector shape: {embeddings.shape}")
 
         
-        doc_embeddings = []
+        doc_embeddings = np.empty((len(chunk_map), embeddings.shape[1]), dtype='float32')
         start = 0
-        for _, n_chunks in chunk_map:
-            doc_vec = embeddings[start:start+n_chunks].mean(axis=0)
-            doc_embeddings.append(doc_vec)
+        for row, (_, n_chunks) in enumerate(chunk_map):
+            doc_embeddings[row] = embeddings[start:start+n_chunks].mean(axis=0)
             start += n_chunks
 
-        return [vec.tolist() for vec in doc_embeddings]
+        return doc_embeddings
 
     def embed_query(self, text: str) -> List[float]:
         if not text or not text.strip():
             return []
 
-        chunks = self._chunk_text(text)
+        chunks = self._chunk_text([text])[0]
         embeddings = self._embed_batch(chunks)
         query_embedding = embeddings.mean(axis=0)
 
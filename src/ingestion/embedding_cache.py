@@ -0,0 +1,242 @@
+"""
+Persistent, content-addressed embedding cache shared across ingestion runs
+Vectors are keyed by (model namespace, text hash), so re-running ingestion
+only runs the model for texts it has never seen with that model/config.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Rows per SELECT ... IN (...) lookup (SQLite limits bound parameters)
+LOOKUP_BATCH_SIZE = 500
+
+# After eviction the cache is trimmed to this share of its size budget
+EVICTION_TARGET_RATIO = 0.9
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed embedding cache with size-bounded LRU eviction
+
+    Each row stores one float32 vector as a compact BLOB. The cache file can be
+    shared by several processes (WAL journal).
+    """
+
+    def __init__(self, cache_path: str = "data/cache/embeddings.sqlite", max_size_mb: int = 2048):
+        """
+        Open (or create) an embedding cache
+
+        Args:
+            cache_path: SQLite file (relative paths are resolved from the project root)
+            max_size_mb: Size budget for stored vectors; least recently used are evicted beyond it
+        """
+        project_root = Path(__file__).parent.parent.parent
+        self.cache_path = (project_root / cache_path).resolve()
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " namespace TEXT NOT NULL,"
+            " text_hash BLOB NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (namespace, text_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+        self._total_bytes = self._stored_bytes()
+        self.hits = 0
+        self.misses = 0
+        logger.info(f"Embedding cache: {self.cache_path} ({self._total_bytes / 1e6:.1f} MB)")
+
+    @staticmethod
+    def namespace(model_name: str, **params) -> str:
+        """Cache namespace of a model configuration (every parameter that changes the vectors)"""
+        settings = ",".join(f"{key}={params[key]}" for key in sorted(params))
+        return f"{model_name}|{settings}"
+
+    @staticmethod
+    def _text_hash(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def _stored_bytes(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        return int(row[0])
+
+    def get_many(self, namespace: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached vectors
+
+        Returns:
+            One vector per text, None where the text is not cached
+        """
+        hashes = [self._text_hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            unique_hashes = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique_hashes), LOOKUP_BATCH_SIZE):
+                batch = unique_hashes[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE namespace = ? AND text_hash IN ({placeholders})",
+                    [namespace, *batch]
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[bytes(text_hash)] = np.frombuffer(vector, dtype='<f4')
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE namespace = ? AND text_hash = ?",
+                    [(now, namespace, text_hash) for text_hash in found]
+                )
+                self._conn.commit()
+
+            vectors = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(vector is not None for vector in vectors)
+            self.hits += hit_count
+            self.misses += len(vectors) - hit_count
+        return vectors
+
+    def put_many(self, namespace: str, texts: List[str], vectors: np.ndarray):
+        """Store vectors, evicting least recently used entries beyond the size budget"""
+        now = time.time()
+        rows = [
+            (namespace, self._text_hash(text), np.asarray(vector, dtype='<f4').tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._total_bytes += sum(len(row[2]) for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used vectors until the cache is back under its budget"""
+        # Other processes may have written too: start from the real size
+        self._total_bytes = self._stored_bytes()
+        excess = self._total_bytes - int(self.max_bytes * EVICTION_TARGET_RATIO)
+        if excess <= 0:
+            return
+
+        victims = []
+        freed = 0
+        for namespace, text_hash, size in self._conn.execute(
+            "SELECT namespace, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        ):
+            victims.append((namespace, text_hash))
+            freed += size
+            if freed >= excess:
+                break
+
+        self._conn.executemany("DELETE FROM embeddings WHERE namespace = ? AND text_hash = ?", victims)
+        self._conn.commit()
+        self._total_bytes -= freed
+        logger.info(f"Embedding cache: evicted {len(victims)} vectors ({freed / 1e6:.1f} MB)")
+
+    def embed(
+        self,
+        namespace: str,
+        texts: List[str],
+        embed_fn: Callable[[List[str]], Any]
+    ) -> np.ndarray:
+        """
+        Embeddings of `texts`, running `embed_fn` only on texts missing from the cache
+
+        Args:
+            namespace: Model namespace (see namespace())
+            texts: Texts to embed
+            embed_fn: Model embedding function returning one vector per input text
+
+        Returns:
+            float32 array (len(texts), dimension), in input order
+        """
+        vectors = self.get_many(namespace, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+        if missing:
+            embedded = np.asarray(embed_fn(missing), dtype='float32').reshape(len(missing), -1)
+            self.put_many(namespace, missing, embedded)
+            fresh = dict(zip(missing, embedded))
+            vectors = [fresh[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+
+        if len(texts) > 1:
+            logger.info(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} texts served from cache")
+        return np.vstack(vectors).astype('float32')
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit ratio"""
+        lookups = self.hits + self.misses
+        return {
+            'path': str(self.cache_path),
+            'size_mb': self._total_bytes / (1024 * 1024),
+            'max_size_mb': self.max_bytes / (1024 * 1024),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Remove every cached vector"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        """Close the SQLite connection"""
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Process-wide embedding cache configured through Config
+    (EMBEDDING_CACHE_PATH / EMBEDDING_CACHE_MAX_MB; an empty path disables caching)
+    """
+    global _default_cache
+    if not Config.EMBEDDING_CACHE_PATH:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(Config.EMBEDDING_CACHE_PATH, Config.EMBEDDING_CACHE_MAX_MB)
+        return _default_cache
+
+
+def query_embedding_fn(embedder) -> Callable[[List[str]], Any]:
+    """
+    Batch embedding function for online queries
+
+    Queries bypass the persistent cache (embed_queries) when the embedder
+    supports it: their repeats are served by the in-memory QueryEmbeddingCache,
+    and one-off queries would otherwise cost a SQLite write each and evict
+    ingestion vectors from the shared size budget.
+    """
+    return getattr(embedder, 'embed_queries', embedder.embed_documents)
@@ -0,0 +1,145 @@
+"""
+Multi-process embedding pool for large ingestion jobs
+Texts are sharded across worker processes, each loading the model once and
+running with a pinned number of intra-op threads, and the shard results are
+gathered in input order into one preallocated array.
+"""
+
+import logging
+import multiprocessing
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Texts per shard sent to a worker (shards of length-sorted texts batch efficiently)
+DEFAULT_SHARD_SIZE = 256
+
+# Per-process state of a pool worker
+_worker_embedder = None
+
+
+def _init_worker(model_name: str, num_threads: int, embedder_kwargs: Dict[str, Any]):
+    """Pin the thread count and load the model once per worker process"""
+    global _worker_embedder
+
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(num_threads)
+    # Several workers share the cores: no tokenizer threads on top of the model threads
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+    torch.set_num_threads(num_threads)
+
+    from src.ingestion.multi_collection_embedder import MultiCollectionEmbedder
+    _worker_embedder = MultiCollectionEmbedder(
+        model_name=model_name,
+        device="cpu",
+        use_cache=False,
+        num_workers=0,
+        num_threads=num_threads,
+        **embedder_kwargs
+    )
+
+
+def _embed_shard(task):
+    """Embed one shard in a worker; returns (shard index, embeddings)"""
+    shard_index, items = task
+    if items and not isinstance(items[0], str):
+        # Pre-tokenized chunks (TokenChunker token ids)
+        return shard_index, _worker_embedder._embed_ids_uncached(items)
+    return shard_index, _worker_embedder._embed_uncached(items)
+
+
+class EmbeddingPool:
+    """
+    Pool of embedding worker processes (CPU)
+
+    Workers are started on first use and kept alive between calls, so the
+    model load is paid once per worker for the whole ingestion run.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        num_workers: int,
+        threads_per_worker: Optional[int] = None,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        **embedder_kwargs
+    ):
+        """
+        Initialize pool
+
+        Args:
+            model_name: HuggingFace model name loaded by every worker
+            num_workers: Number of worker processes
+            threads_per_worker: Intra-op threads per worker (None = cores / num_workers)
+            shard_size: Texts per task sent to a worker
+            **embedder_kwargs: MultiCollectionEmbedder settings (max_length, backend, ...)
+        """
+        self.model_name = model_name
+        self.num_workers = max(1, num_workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.shard_size = max(1, shard_size)
+        self.embedder_kwargs = embedder_kwargs
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            logger.info(
+                f"Starting {self.num_workers} embedding workers "
+                f"({self.threads_per_worker} threads each)"
+            )
+            # spawn: fork is unsafe once torch/tokenizers threads exist in the parent
+            context = multiprocessing.get_context("spawn")
+            self._pool = context.Pool(
+                self.num_workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.threads_per_worker, self.embedder_kwargs)
+            )
+        return self._pool
+
+    def embed(self, texts: Sequence[str], order: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Embed texts across the workers
+
+        Args:
+            texts: Texts to embed, or token id sequences (special tokens included)
+            order: Positions in the order they are sharded (e.g. longest first, so
+                   shards hold texts of similar length and the slowest go out first);
+                   None = input order
+
+        Returns:
+            float32 array (len(texts), dimension), in input order
+        """
+        order = np.arange(len(texts)) if order is None else np.asarray(order)
+        shards: List[np.ndarray] = [
+            order[start:start + self.shard_size] for start in range(0, len(order), self.shard_size)
+        ]
+        tasks = ((i, [texts[position] for position in shard]) for i, shard in enumerate(shards))
+
+        all_embeddings = None
+        embedded = 0
+        for shard_index, embeddings in self._get_pool().imap_unordered(_embed_shard, tasks):
+            if all_embeddings is None:
+                all_embeddings = np.empty((len(texts), embeddings.shape[1]), dtype='float32')
+            all_embeddings[shards[shard_index]] = embeddings
+            embedded += len(embeddings)
+            logger.info(f"Embedded {embedded}/{len(texts)} documents ({self.num_workers} workers)")
+
+        return all_embeddings
+
+    def close(self):
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,98 @@
+"""
+Streaming embedding output
+Texts are embedded chunk by chunk and each chunk is written straight into a
+preallocated float32 array or a memory-mapped .npy file, so peak memory is one
+chunk of vectors rather than several copies of the full matrix.
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Texts embedded per streamed chunk
+STREAM_CHUNK_TEXTS = 4096
+
+
+def embed_array(embedder, texts: Sequence[str], token_ids: Optional[Sequence] = None) -> np.ndarray:
+    """
+    Embeddings of `texts` as a float32 array, whatever the embedder returns
+
+    Embedders exposing embed_documents_array() skip the Python-list round trip;
+    with `token_ids` (from the embedder's token_chunker) the texts are not tokenized again.
+    """
+    if token_ids is not None:
+        embeddings = embedder.embed_token_ids(list(token_ids), list(texts))
+    elif hasattr(embedder, 'embed_documents_array'):
+        embeddings = embedder.embed_documents_array(list(texts))
+    elif hasattr(embedder, 'embed_documents'):
+        embeddings = embedder.embed_documents(list(texts))
+    else:
+        embeddings = [embedder.embed_query(text) for text in texts]
+    return np.asarray(embeddings, dtype='float32').reshape(len(texts), -1)
+
+
+def iter_embeddings(
+    embedder,
+    texts: Sequence[str],
+    chunk_size: int = STREAM_CHUNK_TEXTS,
+    token_ids: Optional[Sequence] = None
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Embed texts chunk by chunk
+
+    Args:
+        embedder: Any embedder of this repo (or a LangChain Embeddings)
+        texts: Texts to embed
+        chunk_size: Texts per chunk
+        token_ids: Token ids of every text, embedded instead of the texts (see embed_array)
+
+    Yields:
+        (position of the chunk's first text, float32 array (chunk length, dimension))
+    """
+    for start in range(0, len(texts), chunk_size):
+        chunk_ids = token_ids[start:start + chunk_size] if token_ids is not None else None
+        yield start, embed_array(embedder, texts[start:start + chunk_size], chunk_ids)
+        if len(texts) > chunk_size:
+            logger.info(f"Embedded {min(start + chunk_size, len(texts))}/{len(texts)} texts")
+
+
+def open_vectors_memmap(path: Union[str, Path], num_vectors: int, dimension: int) -> np.memmap:
+    """Create a float32 .npy file of the given shape, memory-mapped for writing"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return np.lib.format.open_memmap(str(path), mode='w+', dtype='float32', shape=(num_vectors, dimension))
+
+
+def embed_into(
+    embedder,
+    texts: Sequence[str],
+    out: Optional[np.ndarray] = None,
+    path: Optional[Union[str, Path]] = None,
+    chunk_size: int = STREAM_CHUNK_TEXTS
+) -> np.ndarray:
+    """
+    Embed texts straight into a preallocated matrix
+
+    Args:
+        embedder: Embedder instance
+        texts: Texts to embed
+        out: Preallocated float32 array or memmap (len(texts), dimension)
+        path: Create a memory-mapped .npy file here instead (sized on the first chunk)
+        chunk_size: Texts per chunk
+
+    Returns:
+        The filled matrix (`out`, the new memmap, or a new in-memory array)
+    """
+    for start, embeddings in iter_embeddings(embedder, texts, chunk_size):
+        if out is None:
+            shape = (len(texts), embeddings.shape[1])
+            out = open_vectors_memmap(path, *shape) if path is not None else np.empty(shape, dtype='float32')
+        out[start:start + len(embeddings)] = embeddings
+
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
@@ -0,0 +1,411 @@
+"""
+Embedding throughput auto-tuner
+Micro-benchmarks intra-op threads, token budgets, batch sizes, inter-op threads
+and the worker-process split for one model on the current host, and stores the
+fastest settings in a JSON file that the embedders read when they start.
+
+Usage:
+    python -m src.ingestion.embedding_tuner --model BAAI/bge-base-en-v1.5
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from src.utils.config import Config
+from src.utils.helpers import atomic_write_path
+
+logger = logging.getLogger(__name__)
+
+# Candidates measured unless the caller gives its own
+DEFAULT_TOKEN_BUDGETS = (2048, 4096, 8192, 16384, 32768)
+DEFAULT_BATCH_SIZES = (8, 16, 32, 64, 128)
+DEFAULT_INTEROP_THREADS = (1, 2, 4)
+
+# Texts per measurement and timed runs per candidate (best run counts)
+CALIBRATION_TEXTS = 256
+CALIBRATION_REPEATS = 2
+
+# Settings an embedder falls back to when this host has not been calibrated
+DEFAULT_BATCH_SIZE = 32
+
+
+def _thread_candidates(cpu_count: int) -> List[int]:
+    """Powers of two up to the core count, plus the core count itself"""
+    candidates = []
+    threads = 1
+    while threads < cpu_count:
+        candidates.append(threads)
+        threads *= 2
+    return candidates + [cpu_count]
+
+
+def host_fingerprint(device: str = "cpu") -> Dict[str, Any]:
+    """What the tuned settings depend on: a calibration is reused only on a matching host"""
+    import torch
+
+    fingerprint = {
+        'cpu_count': os.cpu_count() or 1,
+        'machine': platform.machine(),
+        'torch': torch.__version__.split('+')[0],
+        'device': device,
+    }
+    if device.startswith("cuda") and torch.cuda.is_available():
+        fingerprint['gpu'] = torch.cuda.get_device_name(0)
+    return fingerprint
+
+
+def _tuning_path(path: Optional[str] = None) -> Optional[Path]:
+    """Tuning file (None = disabled through an empty EMBEDDING_TUNING_PATH)"""
+    path = Config.EMBEDDING_TUNING_PATH if path is None else path
+    if not path:
+        return None
+    path = Path(path)
+    if not path.is_absolute():
+        path = Path(__file__).parent.parent.parent / path
+    return path
+
+
+def _tuning_key(model_name: str, backend: str, device: str) -> str:
+    return f"{model_name}|{backend}|{device}"
+
+
+def _default_device() -> str:
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def load_tuning(
+    model_name: str,
+    backend: Optional[str] = None,
+    device: Optional[str] = None,
+    path: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Calibrated settings of a model on this host
+
+    Args:
+        model_name: HuggingFace model name
+        backend: "torch", "onnx" or "onnx-int8" (None = Config.EMBEDDING_BACKEND)
+        device: "cpu" or "cuda" (None = auto-detect)
+        path: Tuning file (None = Config.EMBEDDING_TUNING_PATH)
+
+    Returns:
+        Settings dict (num_threads, interop_threads, max_batch_tokens, batch_size,
+        num_workers, threads_per_worker), or None when not calibrated on this host
+    """
+    tuning_path = _tuning_path(path)
+    if tuning_path is None or not tuning_path.exists():
+        return None
+
+    backend = backend or Config.EMBEDDING_BACKEND
+    device = device or _default_device()
+    try:
+        with open(tuning_path, 'r') as f:
+            entry = json.load(f).get(_tuning_key(model_name, backend, device))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable tuning file {tuning_path}: {e}")
+        return None
+
+    if entry is None:
+        return None
+    if entry.get('host') != host_fingerprint(device):
+        logger.info(f"Tuning of {model_name} was calibrated on another host, using defaults")
+        return None
+    return entry['settings']
+
+
+def save_tuning(
+    model_name: str,
+    backend: str,
+    device: str,
+    settings: Dict[str, Any],
+    docs_per_second: float,
+    path: Optional[str] = None
+):
+    """Store calibrated settings (other models and backends in the file are kept)"""
+    tuning_path = _tuning_path(path)
+    if tuning_path is None:
+        return
+
+    entries = {}
+    if tuning_path.exists():
+        with open(tuning_path, 'r') as f:
+            entries = json.load(f)
+    entries[_tuning_key(model_name, backend, device)] = {
+        'settings': settings,
+        'docs_per_second': docs_per_second,
+        'host': host_fingerprint(device),
+        'calibrated_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+    tuning_path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write_path(tuning_path) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f, indent=2)
+    logger.info(f"✓ Saved tuning of {model_name} ({backend}, {device}) to {tuning_path}")
+
+
+def apply_thread_settings(num_threads: Optional[int] = None, interop_threads: Optional[int] = None):
+    """
+    Set torch intra-op / inter-op thread counts for this process
+
+    Inter-op threads can only be set before the first parallel torch operation;
+    later calls keep the current value.
+    """
+    import torch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads and torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            logger.debug(f"Inter-op threads already fixed at {torch.get_num_interop_threads()}")
+
+
+def apply_tuned_threads(model_name: str, backend: Optional[str] = None, device: Optional[str] = None) -> bool:
+    """
+    Apply this host's calibrated torch thread counts for a model to the process
+
+    Thread counts are process-wide, so only ingestion entry points call this
+    (embedders never do: it would change the threads of a serving process too).
+
+    Returns:
+        Whether calibrated thread counts were applied
+    """
+    backend = backend or Config.EMBEDDING_BACKEND
+    device = device or _default_device()
+    tuning = load_tuning(model_name, backend, device) or {}
+    if backend != "torch" or device != "cpu" or not tuning.get('num_threads'):
+        return False
+    apply_thread_settings(tuning['num_threads'], tuning.get('interop_threads'))
+    return True
+
+
+def calibration_texts(num_texts: int = CALIBRATION_TEXTS, seed: int = 42) -> List[str]:
+    """Mix of short records, medium FAQ answers and long policy texts, like the collections"""
+    rng = random.Random(seed)
+    words = ("patient treatment dental implant cleaning whitening privacy data consent "
+             "appointment clinic orthodontic crown filling policy processing rights").split()
+
+    texts = []
+    for i in range(num_texts):
+        kind = rng.random()
+        if kind < 0.05:
+            paragraph = " ".join(rng.choice(words) for _ in range(rng.randint(300, 450)))
+            texts.append(f"Privacy Policy:\nTitle: Section {i}\nContent: {paragraph}\n")
+        elif kind < 0.35:
+            answer = " ".join(rng.choice(words) for _ in range(rng.randint(30, 80)))
+            texts.append(f"FAQ:\nQuestion: What about {rng.choice(words)} {i}?\nAnswer: {answer}\n")
+        else:
+            texts.append(f"Treatment Category:\nName: {rng.choice(words).title()} {i}\n")
+    return texts
+
+
+def _throughput(embed: Callable[[List[str]], Any], texts: List[str], repeats: int) -> float:
+    """Docs/s of the best timed run, after a warm-up run (large enough to reach every pool worker)"""
+    embed(texts[:max(32, len(texts) // 4)])
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embed(texts)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def _interop_throughput(model_name: str, backend: str, settings: Dict[str, Any], texts: List[str], repeats: int) -> float:
+    """Throughput with given inter-op threads, measured in a fresh (spawned) process"""
+    apply_thread_settings(settings['num_threads'], settings['interop_threads'])
+    from src.ingestion.multi_collection_embedder import MultiCollectionEmbedder
+    embedder = MultiCollectionEmbedder(
+        model_name=model_name,
+        device="cpu",
+        use_cache=False,
+        use_tuning=False,
+        backend=backend,
+        num_threads=settings['num_threads'],
+        max_batch_tokens=settings['max_batch_tokens']
+    )
+    return _throughput(embedder._embed_uncached, texts, repeats)
+
+
+def calibrate(
+    model_name: str,
+    backend: Optional[str] = None,
+    device: Optional[str] = None,
+    texts: Optional[Sequence[str]] = None,
+    thread_counts: Optional[Sequence[int]] = None,
+    token_budgets: Sequence[int] = DEFAULT_TOKEN_BUDGETS,
+    batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+    interop_threads: Sequence[int] = DEFAULT_INTEROP_THREADS,
+    worker_counts: Optional[Sequence[int]] = None,
+    repeats: int = CALIBRATION_REPEATS,
+    save: bool = True,
+    path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Find the fastest embedding settings for a model on this host
+
+    Parameters are tuned one after the other, each with the best values found
+    so far: intra-op threads, token budget per batch (length-bucketed batching),
+    batch size (fixed-size batching), inter-op threads (torch on CPU, one fresh
+    process per candidate) and the split of the cores into worker processes.
+
+    Args:
+        model_name: HuggingFace model name
+        backend: "torch", "onnx" or "onnx-int8" (None = Config.EMBEDDING_BACKEND)
+        device: "cpu" or "cuda" (None = auto-detect); GPUs only tune batching
+        texts: Calibration texts (None = calibration_texts())
+        thread_counts: Intra-op thread candidates (None = powers of two up to the cores)
+        token_budgets: max_batch_tokens candidates
+        batch_sizes: batch_size candidates
+        interop_threads: Inter-op thread candidates (empty = skip)
+        worker_counts: Worker process candidates for ingestion (None = powers of two
+                       up to cores / 2; empty = skip)
+        repeats: Timed runs per candidate
+        save: Store the result in the tuning file
+        path: Tuning file (None = Config.EMBEDDING_TUNING_PATH)
+
+    Returns:
+        Dict with 'settings', 'docs_per_second' and every 'measurements' row
+    """
+    from src.ingestion.embedding_pool import EmbeddingPool
+    from src.ingestion.multi_collection_embedder import MultiCollectionEmbedder
+    from src.ingestion.onnx_backend import validate_backend
+
+    backend = validate_backend(backend or Config.EMBEDDING_BACKEND)
+    device = device or _default_device()
+    if backend != "torch":
+        device = "cpu"
+    on_cpu = device == "cpu"
+    cpu_count = os.cpu_count() or 1
+    texts = list(texts) if texts is not None else calibration_texts()
+    measurements = []
+
+    def record(parameter, value, docs_per_second):
+        measurements.append({'parameter': parameter, 'value': value, 'docs_per_second': docs_per_second})
+        logger.info(f"  {parameter}={value}: {docs_per_second:.1f} docs/s")
+        return docs_per_second
+
+    def make_embedder(num_threads=None, **kwargs):
+        return MultiCollectionEmbedder(
+            model_name=model_name, device=device, use_cache=False, use_tuning=False,
+            backend=backend, num_threads=num_threads, **kwargs
+        )
+
+    settings = {
+        'num_threads': cpu_count if on_cpu else None,
+        'interop_threads': None,
+        'max_batch_tokens': DEFAULT_BATCH_SIZE * 512,
+        'batch_size': DEFAULT_BATCH_SIZE,
+        'num_workers': 1,
+        'threads_per_worker': None,
+    }
+    logger.info(f"Calibrating {model_name} ({backend}, {device}, {cpu_count} cores) on {len(texts)} texts")
+
+    # Warm allocators and kernels once, so the first candidate is not measured cold
+    make_embedder(settings['num_threads'])._embed_uncached(texts)
+
+    # 1. Intra-op threads (ONNX Runtime gets one session per count)
+    if on_cpu:
+        rates = {}
+        for threads in thread_counts or _thread_candidates(cpu_count):
+            apply_thread_settings(threads)
+            embedder = make_embedder(threads, max_batch_tokens=settings['max_batch_tokens'])
+            rates[threads] = record('num_threads', threads, _throughput(embedder._embed_uncached, texts, repeats))
+        settings['num_threads'] = max(rates, key=rates.get)
+        apply_thread_settings(settings['num_threads'])
+
+    # 2. Token budget per length-bucketed batch
+    embedder = make_embedder(settings['num_threads'])
+    rates = {}
+    for budget in token_budgets:
+        embedder.max_batch_tokens = budget
+        rates[budget] = record('max_batch_tokens', budget, _throughput(embedder._embed_uncached, texts, repeats))
+    settings['max_batch_tokens'] = max(rates, key=rates.get)
+    embedder.max_batch_tokens = settings['max_batch_tokens']
+    best_rate = rates[settings['max_batch_tokens']]
+
+    # 3. Batch size of fixed-size batching (BGE / BERT embedders, length_bucketing=False)
+    rates = {}
+    for batch_size in batch_sizes:
+        embedder.batch_size = batch_size
+        rates[batch_size] = record('batch_size', batch_size, _throughput(embedder._embed_fixed_batches, texts, repeats))
+    settings['batch_size'] = max(rates, key=rates.get)
+
+    # 4. Inter-op threads: fixed once per process, so each candidate runs in a fresh one
+    if on_cpu and backend == "torch" and len(interop_threads) > 1:
+        rates = {}
+        context = multiprocessing.get_context("spawn")
+        for interop in interop_threads:
+            with context.Pool(1) as pool:
+                rate = pool.apply(
+                    _interop_throughput,
+                    (model_name, backend, {**settings, 'interop_threads': interop}, texts, repeats)
+                )
+            rates[interop] = record('interop_threads', interop, rate)
+        settings['interop_threads'] = max(rates, key=rates.get)
+
+    # 5. Worker processes sharing the cores (ingestion only; queries stay in-process)
+    if on_cpu:
+        if worker_counts is None:
+            worker_counts = [count for count in _thread_candidates(cpu_count // 2) if count > 1]
+        # Enough shards to keep every worker busy
+        pool_texts = texts * max(1, max(worker_counts, default=1))
+        in_process_rate = record('num_workers', 1, _throughput(embedder._embed_uncached, pool_texts, 1))
+        rates = {1: in_process_rate}
+        for workers in worker_counts:
+            threads = max(1, cpu_count // workers)
+            with EmbeddingPool(
+                model_name, workers, threads_per_worker=threads, shard_size=max(32, len(texts) // 8),
+                backend=backend, max_batch_tokens=settings['max_batch_tokens']
+            ) as pool:
+                rates[workers] = record('num_workers', workers, _throughput(pool.embed, pool_texts, 1))
+        settings['num_workers'] = max(rates, key=rates.get)
+        if settings['num_workers'] > 1:
+            settings['threads_per_worker'] = max(1, cpu_count // settings['num_workers'])
+
+    logger.info(f"✓ Best settings for {model_name} ({backend}, {device}): {settings}")
+    if save:
+        save_tuning(model_name, backend, device, settings, best_rate, path)
+    return {'settings': settings, 'docs_per_second': best_rate, 'measurements': measurements}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="BAAI/bge-base-en-v1.5")
+    parser.add_argument("--backend", default=None, help="torch, onnx or onnx-int8 (default: EMBEDDING_BACKEND)")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--texts", type=int, default=CALIBRATION_TEXTS)
+    parser.add_argument("--repeats", type=int, default=CALIBRATION_REPEATS)
+    parser.add_argument("--no-workers", action="store_true", help="Skip the worker-process split")
+    parser.add_argument("--dry-run", action="store_true", help="Report without saving")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    result = calibrate(
+        args.model,
+        backend=args.backend,
+        device=args.device,
+        texts=calibration_texts(args.texts),
+        worker_counts=[] if args.no_workers else None,
+        repeats=args.repeats,
+        save=not args.dry_run
+    )
+    print(json.dumps(result['settings'], indent=2))
+    print(f"{result['docs_per_second']:.1f} docs/s in-process")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ sys.path.insert(0, str(project_root))
 from src.ingestion.mongodb_loader import MongoDBLoader
 from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
 from src.ingestion.embedder_bge import get_embedder  #bge-m3 embedder
+from src.ingestion.embedding_tuner import apply_tuned_threads
 from src.utils.config import Config  
 from src.utils.logger import setup_logger
 from dotenv import load_dotenv
@@ -76,6 +77,8 @@ def main():
 
     print(f"\n[4] Initializing embedder...")
     embedder = get_embedder()  
+    # Calibrated torch threads for this host, if any
+    apply_tuned_threads(embedder.model_name)
     
     # Initialize vector indexer
     print(f"\n[5] Creating vector index...")
@@ -6,14 +6,22 @@ Processes multiple collections from medical practice database
 import os
 import sys
 from pathlib import Path
+from typing import Dict, Optional
 
 # Add project root to path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.ingestion.multi_collection_mongodb_loader import MultiCollectionMongoDBLoader
+from src.ingestion.multi_collection_mongodb_loader import (
+    MultiCollectionMongoDBLoader,
+    DELTA_STATE_FILE,
+    load_delta_state,
+    save_delta_state,
+)
 from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
 from src.ingestion.multi_collection_embedder import get_embedder
+from src.ingestion.embedding_tuner import apply_tuned_threads, load_tuning
+from src.utils.config import Config
 from dotenv import load_dotenv
 import logging
 
@@ -50,10 +58,92 @@ def display_collection_preview(formatted_docs: dict, max_per_collection: int = 2
             print(f"  Metadata: {doc['metadata']['collection']}")
 
 
+def run_delta_ingestion(
+    loader: MultiCollectionMongoDBLoader,
+    indexer: MongoDBVectorIndexer,
+    collections: list,
+    embedding_model: str,
+    embedding_workers: int = 0,
+    compact_ratio: Optional[float] = 0.2
+) -> Optional[Dict[str, int]]:
+    """
+    Apply only the changes since the last run to the saved index
+    
+    Args:
+        loader: Connected MongoDB loader
+        indexer: Indexer pointing at the existing vector store
+        collections: Collections to check for changes
+        embedding_model: Model used to embed new/updated documents
+        embedding_workers: Embedding worker processes (0 = in-process)
+        compact_ratio: Compact the index once this share of its rows are
+            tombstones of updated or deleted documents (None = never)
+        
+    Returns:
+        Dict with 'upserted', 'deleted', 'live' and 'reclaimed' row counts once
+        the index and delta state are saved, None if no delta state exists
+    """
+    state_path = indexer.vector_store_path / DELTA_STATE_FILE
+    state = load_delta_state(state_path)
+    if state is None:
+        print(f"\n❌ No delta state found at {state_path}")
+        print("   Run a full ingestion first")
+        return None
+    
+    print(f"\n[3] Loading existing index...")
+    indexer.load_index()
+    print(f"    ✓ {indexer.documents.num_live} documents indexed")
+    
+    print(f"\n[4] Loading changes since the last run...")
+    known_keys = {collection: indexer.collection_keys(collection) for collection in collections}
+    delta = loader.load_all_deltas(state, collections=collections, known_keys=known_keys)
+    
+    if delta['upserted']:
+        print(f"\n[5] Embedding {len(delta['upserted'])} changed documents...")
+        indexer.embedder = get_embedder(model_name=embedding_model, num_workers=embedding_workers)
+        try:
+            indexer.upsert(delta['upserted'])
+        finally:
+            indexer.embedder.close()
+    # Deletes last: a document removed while the delta was read must not survive
+    deleted = indexer.delete_keys(delta['deleted_keys']) if len(delta['deleted_keys']) else 0
+    
+    # Every update and delete leaves a tombstone row behind
+    reclaimed = 0
+    tombstones = int(indexer.documents.deleted.sum())
+    total_rows = len(indexer.documents)
+    if compact_ratio is not None and total_rows and tombstones / total_rows >= compact_ratio:
+        print(f"\n    Compacting {tombstones}/{total_rows} tombstoned rows...")
+        reclaimed = indexer.compact()
+    
+    print(f"\n[6] Saving index to disk...")
+    if delta['upserted'] or deleted or reclaimed:
+        indexer.save_index()
+    # Only advance the watermarks once the index is safely on disk
+    save_delta_state(state_path, delta['state'])
+    
+    print("\n" + "="*70)
+    print("✅ DELTA INGESTION COMPLETED SUCCESSFULLY!")
+    print("="*70)
+    print(f"\n📊 Summary:")
+    print(f"   - Upserted Documents: {len(delta['upserted'])}")
+    print(f"   - Deleted Documents: {deleted}")
+    print(f"   - Live Documents: {indexer.documents.num_live}")
+    print(f"   - Reclaimed Rows: {reclaimed}")
+    return {
+        'upserted': len(delta['upserted']),
+        'deleted': deleted,
+        'live': indexer.documents.num_live,
+        'reclaimed': reclaimed
+    }
+
+
 def main():
     """
     Main ingestion pipeline for multi-collection medical database
     
+    Run with --delta to index only the changes since the previous run, and
+    with --workers N to embed in N worker processes.
+    
     Steps:
     1. Connect to MongoDB
     2. Load and format documents from multiple collections
@@ -83,6 +173,36 @@ def main():
     # - "BAAI/bge-base-en-v1.5" (English only, faster)
     # - "bert-base-uncased" (lightweight)
     
+    # Embedding worker processes, each loading the model once and using
+    # EMBEDDING_THREADS cores (1 = embed in this process, the default). Set with
+    # --workers N or Config.EMBEDDING_WORKERS; otherwise hosts calibrated with
+    # `python -m src.ingestion.embedding_tuner` use their measured split.
+    TUNING = load_tuning(EMBEDDING_MODEL) or {}
+    EMBEDDING_WORKERS = Config.EMBEDDING_WORKERS or TUNING.get('num_workers') or 1
+    if "--workers" in sys.argv:
+        EMBEDDING_WORKERS = int(sys.argv[sys.argv.index("--workers") + 1])
+    EMBEDDING_THREADS = TUNING.get('threads_per_worker')  # None = cores / workers
+    # Calibrated torch threads for in-process embedding (pool workers pin their own)
+    apply_tuned_threads(EMBEDDING_MODEL)
+    
+    # FAISS index layout: "flat" (exact), "ivf_flat" or "hnsw" (approximate, for large catalogs)
+    INDEX_TYPE = "flat"
+    # IVF: nlist clusters (None = auto), nprobe clusters scanned per query
+    # HNSW: M links per node, ef_search candidates per query
+    INDEX_PARAMS = {"nlist": None, "nprobe": 16, "hnsw_m": 32, "ef_search": 64}
+    # Vector compression: None, "sq8", "fp16" or "pq"; rescore re-ranks with exact float vectors
+    QUANTIZATION_PARAMS = {"quantization": None, "rescore": False}
+    # Stream embeddings into a memory-mapped vectors.npy instead of RAM
+    # (for catalogs whose vectors do not fit in memory; combine with quantization)
+    VECTORS_ON_DISK = False
+    # Long documents (privacy policies, terms, GDPR) are split into chunks, each
+    # searched as its own vector (chunk_size None = whole documents). "tokens" chunks
+    # fill the model's max_length exactly and are embedded from the chunker's token ids
+    CHUNK_PARAMS = {"chunk_size": 512, "chunk_overlap": 64, "chunk_unit": "tokens"}
+    # Dimensionality reduction: None, "pca" or "truncate" (Matryoshka models only);
+    # reduced_dim None = half the model dimension (half the search FLOPs and memory)
+    REDUCTION_PARAMS = {"reduction": None, "reduced_dim": None}
+    
     # Collections to process (None = all available)
     COLLECTIONS_TO_PROCESS = None  # Will auto-detect
     # Or specify: ['doctors', 'faqs', 'treatmentlists', 'treatmentfees']
@@ -90,6 +210,14 @@ def main():
     # Limit documents per collection (None = all)
     LIMIT_PER_COLLECTION = None  # Set to 50 for testing
     
+    # Delta mode: apply only inserts/updates/deletes since the last run (--delta)
+    DELTA_MODE = "--delta" in sys.argv
+    # Track changes with change-stream resume tokens instead of updatedAt/_id
+    # watermarks (requires a replica set). Takes effect on the next full ingestion.
+    USE_CHANGE_STREAMS = False
+    # Delta runs compact the index once this share of its rows are tombstones (None = never)
+    COMPACT_TOMBSTONE_RATIO = 0.2
+    
     if not MONGODB_URI:
         print("\n❌ ERROR: MONGODB_URI not found in environment variables")
         print("Please set it in your .env file")
@@ -99,6 +227,8 @@ def main():
     print(f"    📊 Database: {DATABASE_NAME}")
     print(f"    🧠 Embedding Model: {EMBEDDING_MODEL}")
     print(f"    💾 Vector Store: {VECTOR_STORE_PATH}")
+    print(f"    🗂️  Index Type: {INDEX_TYPE}")
+    print(f"    🔁 Mode: {'delta' if DELTA_MODE else 'full'}")
     
     # ============================================================
     # STEP 1: CONNECT TO MONGODB
@@ -122,12 +252,33 @@ def main():
         loader.close()
         return
     
+    if DELTA_MODE:
+        indexer = MongoDBVectorIndexer(embedder=None, vector_store_path=VECTOR_STORE_PATH)
+        try:
+            run_delta_ingestion(
+                loader,
+                indexer,
+                collections=COLLECTIONS_TO_PROCESS or available_collections,
+                embedding_model=EMBEDDING_MODEL,
+                embedding_workers=EMBEDDING_WORKERS,
+                compact_ratio=COMPACT_TOMBSTONE_RATIO
+            )
+        finally:
+            loader.close()
+        return
+    
     # ============================================================
     # STEP 2: LOAD AND FORMAT DOCUMENTS
     # ============================================================
     
     print(f"\n[3] Loading and formatting documents...")
     
+    # Watermarks are taken before loading so changes made meanwhile reach the next delta run
+    delta_state = loader.get_watermarks(
+        collections=COLLECTIONS_TO_PROCESS or available_collections,
+        use_change_stream=USE_CHANGE_STREAMS
+    )
+    
     # Option A: Load as dictionary (organized by collection)
     formatted_by_collection = loader.load_and_format_all_collections(
         collections=COLLECTIONS_TO_PROCESS,
@@ -168,9 +319,15 @@ def main():
     print(f"\n[4] Initializing embedding model...")
     print(f"    Model: {EMBEDDING_MODEL}")
     
-    embedder = get_embedder(model_name=EMBEDDING_MODEL)
+    embedder = get_embedder(
+        model_name=EMBEDDING_MODEL,
+        num_workers=EMBEDDING_WORKERS,
+        threads_per_worker=EMBEDDING_THREADS
+    )
     
     print(f"    ✓ Model loaded")
+    if embedder.pool is not None:
+        print(f"    ✓ {EMBEDDING_WORKERS} embedding workers")
     print(f"    ✓ Embedding dimension: {embedder.get_embedding_dimension()}")
     
     # ============================================================
@@ -181,7 +338,12 @@ def main():
     
     indexer = MongoDBVectorIndexer(
         embedder=embedder,
-        vector_store_path=VECTOR_STORE_PATH
+        vector_store_path=VECTOR_STORE_PATH,
+        index_type=INDEX_TYPE,
+        **INDEX_PARAMS,
+        **QUANTIZATION_PARAMS,
+        **CHUNK_PARAMS,
+        **REDUCTION_PARAMS
     )
     
     print(f"\n[6] Building FAISS index...")
@@ -189,22 +351,38 @@ def main():
     print(f"    Processing {len(all_documents)} documents...")
     
     try:
-        indexer.build_index(all_documents)
+        indexer.build_index(all_documents, vectors_on_disk=VECTORS_ON_DISK)
         print(f"    ✓ Index built successfully!")
     except Exception as e:
         print(f"\n❌ Error building index: {e}")
         logger.exception("Index building failed")
         loader.close()
         return
+    finally:
+        # Test searches below embed queries in-process
+        embedder.close()
     
     # ============================================================
     # STEP 5: SAVE INDEX
     # ============================================================
     
+    index_stats = indexer.get_index_stats()
+    if index_stats.get('recall_delta'):
+        print(f"    Recall delta vs exact search: {index_stats['recall_delta']:.3f}")
+    for stat, value in index_stats.items():
+        if stat.startswith('reduction_recall_at_'):
+            print(
+                f"    Reduced {index_stats['input_dimension']} -> {index_stats['dimension']} dims "
+                f"({index_stats['reduction']}), recall@{stat.rsplit('_', 1)[1]} "
+                f"vs full-dimension flat search: {value:.3f}"
+            )
+
     print(f"\n[7] Saving index to disk...")
     
     try:
         indexer.save_index()
+        if LIMIT_PER_COLLECTION is None:
+            save_delta_state(indexer.vector_store_path / DELTA_STATE_FILE, delta_state)
         print(f"    ✓ Index saved to: {VECTOR_STORE_PATH}")
     except Exception as e:
         print(f"\n❌ Error saving index: {e}")
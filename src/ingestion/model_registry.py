@@ -0,0 +1,105 @@
+"""
+Process-wide registry of embedding models
+Each (model, backend, device) is loaded once, on first use, and shared by
+every embedder in the process - API, retrievers and ingestion scripts.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Thread-safe, lazily populated model cache
+
+    Concurrent requests for the same model wait for a single load; different
+    models load in parallel. Loaded models are used read-only (inference only).
+    """
+
+    def __init__(self):
+        self._models: Dict[Hashable, Any] = {}
+        self._loading_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Model stored under `key`, calling `loader` on first use
+
+        Args:
+            key: Registry key, e.g. ("transformer", model_name, backend, device)
+            loader: Zero-argument function loading the model
+
+        Returns:
+            The shared model instance
+        """
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            key_lock = self._loading_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            model = self._models.get(key)
+            if model is None:
+                start = time.perf_counter()
+                model = loader()
+                self._models[key] = model
+                logger.info(f"✓ Loaded {'/'.join(str(part) for part in key)} in {time.perf_counter() - start:.1f}s")
+        return model
+
+    def transformer(self, model_name: str, device: str = "cpu"):
+        """HuggingFace encoder (eval mode) on `device`"""
+        def load():
+            from transformers import AutoModel
+            model = AutoModel.from_pretrained(model_name)
+            model.eval()
+            return model.to(device)
+
+        return self.get_or_load(("transformer", model_name, "torch", device), load)
+
+    def onnx_encoder(self, model_name: str, quantize: bool = False, num_threads: Optional[int] = None):
+        """ONNX Runtime session of an encoder (exported on first use)"""
+        def load():
+            from src.ingestion.onnx_backend import OnnxEncoder
+            return OnnxEncoder(model_name, quantize=quantize, num_threads=num_threads)
+
+        backend = "onnx-int8" if quantize else "onnx"
+        return self.get_or_load(("transformer", model_name, backend, "cpu", num_threads), load)
+
+    def sentence_transformer(self, model_name: str, backend: str = "torch"):
+        """SentenceTransformer on the given backend ("torch", "onnx" or "onnx-int8")"""
+        def load():
+            from src.ingestion.onnx_backend import load_sentence_transformer
+            return load_sentence_transformer(model_name, backend)
+
+        return self.get_or_load(("sentence_transformer", model_name, backend), load)
+
+    def dimension(self, model_name: str) -> int:
+        """Hidden size of a model, read from its config (no weights loaded, no forward pass)"""
+        def load():
+            from transformers import AutoConfig
+            return AutoConfig.from_pretrained(model_name)
+
+        return int(self.get_or_load(("config", model_name), load).hidden_size)
+
+    def loaded(self) -> List[Hashable]:
+        """Keys of the models loaded so far"""
+        return list(self._models)
+
+    def clear(self):
+        """Drop every model (they are freed once no embedder references them)"""
+        with self._lock:
+            self._models.clear()
+            self._loading_locks.clear()
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """The registry shared by the whole process"""
+    return _registry
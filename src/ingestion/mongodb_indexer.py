@@ -5,116 +5,818 @@ MongoDB Vector Indexer - Updated for Multi-Collection Medical Database
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import numpy as np
 import faiss
 import pickle
+import json
 import logging
+import threading
 from pathlib import Path
 import os
+from src.ingestion.document_store import DocumentStore
+from src.ingestion.embedding_cache import query_embedding_fn
+from src.ingestion.embedding_stream import iter_embeddings, open_vectors_memmap
+from src.ingestion.splitter import chunk_spans
+from src.utils.helpers import atomic_write_path, stable_hash64
 
 logger = logging.getLogger(__name__)
 
+# Supported FAISS index layouts
+#   flat     - exact brute-force inner product (default, best for small corpora)
+#   ivf_flat - inverted file with nlist clusters, nprobe clusters scanned per query
+#   hnsw     - hierarchical navigable small world graph with M links per node
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw")
+
+# Compressed vector encodings (None = raw float32, 4 bytes per dimension)
+#   sq8  - 8-bit scalar quantization, 1 byte per dimension (4x smaller)
+#   fp16 - half precision floats, 2 bytes per dimension (2x smaller)
+#   pq   - product quantization, pq_m sub-vectors of pq_nbits each (16x+ smaller)
+QUANTIZATION_TYPES = (None, "sq8", "fp16", "pq")
+
+# Dimensionality reduction applied to document and query vectors before indexing
+#   pca      - PCA fitted on the corpus, keeps the reduced_dim main components
+#   truncate - keep the first reduced_dim components (Matryoshka-trained models only)
+REDUCTION_TYPES = (None, "pca", "truncate")
+
+# Number of sampled queries and neighbours used to measure recall after a build
+RECALL_SAMPLE_SIZE = 200
+RECALL_K = 10
+
+# Read-only, zero-copy loading flags: IVF inverted lists are mapped with IO_FLAG_MMAP,
+# flat code arrays (flat / SQ / PQ / HNSW storage) with IO_FLAG_MMAP_IFC (faiss >= 1.10)
+IVF_MMAP_IO_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+CODES_MMAP_IO_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+# Chunk size used when paging files into the OS cache
+WARMUP_CHUNK_BYTES = 16 * 1024 * 1024
+
+# FAISS wants roughly this many training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+# Filtered searches over approximate indexes score subsets of at most this many rows
+# exactly against vectors.npy; larger subsets are searched in FAISS through an ID selector.
+# Flat indexes always score the subset directly (never more work than the full scan).
+EXACT_FILTER_MAX_ROWS = 10_000
+
+# Rows gathered from vectors.npy per step of an exact subset search
+EXACT_SEARCH_CHUNK_ROWS = 65_536
+
+# Rows normalized / added to FAISS per step while building (bounds copies of memory-mapped vectors)
+BUILD_CHUNK_ROWS = 65_536
+
+# Chunked indexes fetch this many chunk hits per requested document (doubled while
+# fewer than top_k distinct documents come back)
+CHUNK_OVERFETCH = 4
+
+# Units of chunk_size / chunk_overlap
+#   chars  - characters, broken at sentence ends (splitter.chunk_spans)
+#   tokens - model input tokens, cut on the embedder's own tokenization; each document
+#            is tokenized once and the chunk token ids are embedded directly
+CHUNK_UNITS = ("chars", "tokens")
+
+
+def document_key(doc_id) -> int:
+    """Stable 63-bit key of a Mongo _id, used to find a document's row for upsert/delete"""
+    return stable_hash64(doc_id)
+
 
 class MongoDBVectorIndexer:
     def __init__(
         self,
-        embedder, 
-        vector_store_path: str = "data/embeddings/medical_practice_vectors"  # UPDATED PATH
+        embedder,
+        vector_store_path: str = "data/embeddings/medical_practice_vectors",  # UPDATED PATH
+        index_type: str = "flat",
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        train_sample_size: int = 100_000,
+        quantization: Optional[str] = None,
+        pq_m: Optional[int] = None,
+        pq_nbits: int = 8,
+        rescore: bool = False,
+        rescore_factor: int = 4,
+        query_cache=None,
+        query_batcher=None,
+        collapse_duplicates: bool = True,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: int = 100,
+        chunk_unit: str = "chars",
+        reduction: Optional[str] = None,
+        reduced_dim: Optional[int] = None
     ):
         """
         Initialize Vector Indexer
-        
+
         Args:
             embedder: Embedding model instance
             vector_store_path: Path to store FAISS index (NEW: medical_practice_vectors)
+            index_type: "flat", "ivf_flat" or "hnsw" (see INDEX_TYPES)
+            nlist: Number of IVF clusters (None = 4 * sqrt(n_vectors))
+            nprobe: IVF clusters scanned per query
+            hnsw_m: HNSW neighbours per node
+            ef_construction: HNSW candidate list size while building
+            ef_search: HNSW candidate list size while searching
+            train_sample_size: Max vectors sampled to train IVF centroids / quantizers
+            quantization: None, "sq8", "fp16" or "pq" (see QUANTIZATION_TYPES)
+            pq_m: Number of PQ sub-vectors (None = dimension / 8)
+            pq_nbits: Bits per PQ sub-vector code
+            rescore: Re-rank candidates with exact float vectors from vectors.npy
+            rescore_factor: Candidates fetched per requested result when rescoring
+            query_cache: Optional QueryEmbeddingCache consulted before embedding queries
+            query_batcher: Optional QueryBatcher embedding the cache misses together with
+                           those of concurrent searches
+            collapse_duplicates: Return one hit per distinct text, listing the other
+                                 documents with that text in 'duplicate_ids'
+            chunk_size: Split documents longer than this many characters into chunks,
+                        each indexed as its own vector; hits are aggregated per document
+                        by their best chunk (None = one vector per document)
+            chunk_overlap: Characters shared by consecutive chunks
+            chunk_unit: "chars" or "tokens" (see CHUNK_UNITS); "tokens" needs an
+                        embedder with token_chunker() and embed_token_ids()
+            reduction: None, "pca" or "truncate" (see REDUCTION_TYPES); the transform
+                       is saved with the index and applied to every query
+            reduced_dim: Dimension kept by the reduction (None = half the model dimension)
         """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type '{index_type}', expected one of {INDEX_TYPES}")
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(
+                f"Unknown quantization '{quantization}', expected one of {QUANTIZATION_TYPES}"
+            )
+        if chunk_unit not in CHUNK_UNITS:
+            raise ValueError(f"Unknown chunk_unit '{chunk_unit}', expected one of {CHUNK_UNITS}")
+        if reduction not in REDUCTION_TYPES:
+            raise ValueError(f"Unknown reduction '{reduction}', expected one of {REDUCTION_TYPES}")
+
         self.embedder = embedder
-        project_root = Path(__file__).parent.parent.parent  
+        project_root = Path(__file__).parent.parent.parent
         self.vector_store_path = (project_root / vector_store_path).resolve()
         self.index = None
         self.documents = []
-        
+
+        # Index layout and build/search parameters (persisted in index_config.json)
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.train_sample_size = train_sample_size
+
+        # Vector compression and exact re-scoring over the stored float vectors
+        self.quantization = quantization
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        self.vectors = None
+        # Vectors of rows upserted since vectors.npy was written (saved to
+        # vectors_delta.npy, merged into vectors.npy by compact())
+        self.pending_vectors = None
+        self.quality_stats = {}
+
+        # Repeated queries reuse their embedding instead of running the model
+        self.query_cache = query_cache
+        # Concurrent searches share one embedding batch
+        self.query_batcher = query_batcher
+
+        # Documents rendering to identical text share one hit in the results
+        self.collapse_duplicates = collapse_duplicates
+
+        # Multi-vector layout: every chunk of a long document is a document store row
+        # (same key and metadata as its document, plus its character span)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunk_unit = chunk_unit
+
+        # Vectors are stored and searched in reduced_dim dimensions; input_dimension
+        # is the model's. The fitted PCA is saved next to the index.
+        self.reduction = reduction
+        self.reduced_dim = reduced_dim
+        self.input_dimension = None
+        self.pca = None
+
+        # Set when the index is memory-mapped; mapped indexes cannot be modified
+        self.read_only = False
+
+        # FAISS ids are document store row numbers; upsert/delete find rows by document_key().
+        # HNSW cannot remove vectors, so deleted rows stay in the graph as "stale" vectors
+        # that are masked out at search time until compact() rebuilds the index.
+        self.id_mapped = True
+        self.stale_vectors = 0
+        self._vectors_dirty = False
+        self._pending_dirty = False
+        self._live_bitmap = None
+        self._distinct_live_rows = None
+        self._distinct_bitmap = None
+
         # Create directory if not exists
         os.makedirs(self.vector_store_path, exist_ok=True)
         logger.info(f"Vector store path: {self.vector_store_path}")
+
+    @property
+    def config_path(self) -> Path:
+        """Location of the index configuration saved next to faiss_index.bin"""
+        return self.vector_store_path / "index_config.json"
+
+    @property
+    def vectors_path(self) -> Path:
+        """Normalized float32 vectors kept on disk for exact re-scoring"""
+        return self.vector_store_path / "vectors.npy"
+
+    @property
+    def delta_vectors_path(self) -> Path:
+        """Vectors of the rows appended after vectors.npy, in row order"""
+        return self.vector_store_path / "vectors_delta.npy"
+
+    @property
+    def building_vectors_path(self) -> Path:
+        """Memory-mapped vectors of a build in progress, renamed to vectors.npy by save_index()"""
+        return self.vector_store_path / ".vectors.npy.building"
+
+    @property
+    def pca_path(self) -> Path:
+        """Fitted PCA transform applied to document and query vectors"""
+        return self.vector_store_path / "pca_transform.bin"
+
+    def _resolve_nlist(self, num_vectors: int) -> int:
+        """Pick the number of IVF clusters, capped so every centroid gets enough training points"""
+        nlist = self.nlist or int(4 * np.sqrt(num_vectors))
+        max_nlist = max(1, num_vectors // MIN_POINTS_PER_CENTROID)
+        if nlist > max_nlist:
+            logger.warning(
+                f"nlist={nlist} is too large for {num_vectors} vectors, using {max_nlist} instead"
+            )
+            nlist = max_nlist
+        return nlist
+
+    def _resolve_pq_params(self, dimension: int, num_vectors: int):
+        """Pick PQ sub-vector count (must divide the dimension) and code size"""
+        pq_m = self.pq_m or max(1, dimension // 8)
+        if dimension % pq_m != 0:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dimension}")
+
+        # Each sub-quantizer learns 2^nbits centroids and needs at least that many points
+        pq_nbits = self.pq_nbits
+        while pq_nbits > 1 and 2 ** pq_nbits > num_vectors:
+            pq_nbits -= 1
+        if pq_nbits != self.pq_nbits:
+            logger.warning(
+                f"pq_nbits={self.pq_nbits} is too large for {num_vectors} vectors, using {pq_nbits} instead"
+            )
+
+        self.pq_m, self.pq_nbits = pq_m, pq_nbits
+
+    def _vector_encoding(self, dimension: int, num_vectors: int) -> str:
+        """FAISS factory suffix describing how vectors are stored"""
+        if self.quantization == "sq8":
+            return "SQ8"
+        if self.quantization == "fp16":
+            return "SQfp16"
+        if self.quantization == "pq":
+            self._resolve_pq_params(dimension, num_vectors)
+            return f"PQ{self.pq_m}x{self.pq_nbits}"
+        return "Flat"
+
+    def _create_faiss_index(self, dimension: int, num_vectors: int) -> faiss.Index:
+        """
+        Create an empty FAISS index for the configured index type
+
+        Args:
+            dimension: Embedding dimension
+            num_vectors: Number of vectors that will be added (used to size IVF)
+
+        Returns:
+            Untrained FAISS index using inner product (cosine on normalized vectors)
+        """
+        encoding = self._vector_encoding(dimension, num_vectors)
+
+        if self.index_type == "ivf_flat":
+            self.nlist = self._resolve_nlist(num_vectors)
+            description = f"IVF{self.nlist},{encoding}"
+        elif self.index_type == "hnsw":
+            # HNSW over compressed storage uses the "HNSW32_SQ8" factory form
+            separator = "," if encoding == "Flat" else "_"
+            description = f"HNSW{self.hnsw_m}{separator}{encoding}"
+        else:
+            description = encoding
+
+        index = faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+
+        if self.index_type == "hnsw":
+            faiss.downcast_index(index).hnsw.efConstruction = self.ef_construction
+
+        # IVF stores explicit ids natively; flat and HNSW need an IDMap so row ids
+        # survive removals (IDMap over IVF would desync on remove_ids)
+        if self.index_type != "ivf_flat":
+            index = faiss.IndexIDMap(index)
+
+        logger.info(f"Created FAISS index '{description}' (dimension: {dimension})")
+        return index
+
+    def _train_index(self, index: faiss.Index, embeddings: np.ndarray):
+        """Train the index on a random sample of the embeddings if it needs training"""
+        if index.is_trained:
+            return
+
+        training_set = self._training_sample(embeddings)
+        logger.info(f"Training {self.index_type} index on {training_set.shape[0]} vectors...")
+        index.train(training_set)
+
+    def _training_sample(self, embeddings: np.ndarray) -> np.ndarray:
+        """Random sample of at most train_sample_size rows (all rows for small corpora)"""
+        num_vectors = embeddings.shape[0]
+        if num_vectors <= self.train_sample_size:
+            return np.ascontiguousarray(embeddings)
+        rng = np.random.default_rng(42)
+        sample_ids = np.sort(rng.choice(num_vectors, self.train_sample_size, replace=False))
+        return np.ascontiguousarray(embeddings[sample_ids])
+
+    def _fit_reduction(self, embeddings: np.ndarray):
+        """
+        Fit the dimensionality reduction on normalized full-dimension embeddings
+
+        Args:
+            embeddings: Normalized embeddings (n_vectors, model dimension)
+        """
+        self.input_dimension = embeddings.shape[1]
+        self.reduced_dim = self.reduced_dim or self.input_dimension // 2
+        if not 0 < self.reduced_dim < self.input_dimension:
+            raise ValueError(
+                f"reduced_dim={self.reduced_dim} must be between 1 and the embedding "
+                f"dimension {self.input_dimension} (exclusive)"
+            )
+
+        if self.reduction == "pca":
+            training_set = self._training_sample(embeddings)
+            logger.info(
+                f"Fitting PCA {self.input_dimension} -> {self.reduced_dim} "
+                f"on {training_set.shape[0]} vectors..."
+            )
+            self.pca = faiss.PCAMatrix(self.input_dimension, self.reduced_dim)
+            self.pca.train(training_set)
+
+    def _reduce(self, vectors: np.ndarray) -> np.ndarray:
+        """Apply the fitted reduction to full-dimension vectors and re-normalize them"""
+        if self.reduction is None:
+            return vectors
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        if self.reduction == "pca":
+            reduced = self.pca.apply(vectors)
+        else:
+            reduced = np.ascontiguousarray(vectors[:, :self.reduced_dim])
+        faiss.normalize_L2(reduced)
+        return reduced
+
+    def _reduce_rows(self, embeddings: np.ndarray, out_path: Optional[Path] = None) -> np.ndarray:
+        """Reduce embeddings BUILD_CHUNK_ROWS at a time, into RAM or a memory-mapped file"""
+        shape = (embeddings.shape[0], self.reduced_dim)
+        if out_path is not None:
+            reduced = open_vectors_memmap(out_path, *shape)
+        else:
+            reduced = np.empty(shape, dtype='float32')
+        for start in range(0, embeddings.shape[0], BUILD_CHUNK_ROWS):
+            reduced[start:start + BUILD_CHUNK_ROWS] = self._reduce(embeddings[start:start + BUILD_CHUNK_ROWS])
+        return reduced
+
+    def _apply_search_params(self):
+        """Push nprobe / efSearch into the loaded index"""
+        if self.index is None:
+            return
+
+        params = faiss.ParameterSpace()
+        if self.index_type == "ivf_flat":
+            params.set_index_parameter(self.index, "nprobe", self.nprobe)
+        elif self.index_type == "hnsw":
+            params.set_index_parameter(self.index, "efSearch", self.ef_search)
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """
+        Tune the speed/recall trade-off of an approximate index at query time
+
+        Args:
+            nprobe: IVF clusters scanned per query (higher = better recall, slower)
+            ef_search: HNSW candidate list size (higher = better recall, slower)
+        """
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        self._apply_search_params()
+
+    def _index_config(self) -> Dict[str, Any]:
+        """Index layout and parameters persisted next to faiss_index.bin"""
+        return {
+            'index_type': self.index_type,
+            'dimension': self.index.d if self.index is not None else None,
+            'num_vectors': self.index.ntotal if self.index is not None else 0,
+            'nlist': self.nlist,
+            'nprobe': self.nprobe,
+            'hnsw_m': self.hnsw_m,
+            'ef_construction': self.ef_construction,
+            'ef_search': self.ef_search,
+            'train_sample_size': self.train_sample_size,
+            'quantization': self.quantization,
+            'pq_m': self.pq_m,
+            'pq_nbits': self.pq_nbits,
+            'rescore': self.rescore,
+            'rescore_factor': self.rescore_factor,
+            'quality_stats': self.quality_stats,
+            'id_mapped': self.id_mapped,
+            'stale_vectors': self.stale_vectors,
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'chunk_unit': self.chunk_unit,
+            'reduction': self.reduction,
+            'reduced_dim': self.reduced_dim,
+            'input_dimension': self.input_dimension,
+        }
+
+    def _restore_index_config(self, config: Dict[str, Any]):
+        """Restore index layout and parameters from a saved configuration"""
+        self.index_type = config.get('index_type', 'flat')
+        self.nlist = config.get('nlist', self.nlist)
+        self.nprobe = config.get('nprobe', self.nprobe)
+        self.hnsw_m = config.get('hnsw_m', self.hnsw_m)
+        self.ef_construction = config.get('ef_construction', self.ef_construction)
+        self.ef_search = config.get('ef_search', self.ef_search)
+        self.train_sample_size = config.get('train_sample_size', self.train_sample_size)
+        self.quantization = config.get('quantization')
+        self.pq_m = config.get('pq_m', self.pq_m)
+        self.pq_nbits = config.get('pq_nbits', self.pq_nbits)
+        self.rescore = config.get('rescore', self.rescore)
+        self.rescore_factor = config.get('rescore_factor', self.rescore_factor)
+        self.quality_stats = config.get('quality_stats', {})
+        # Indexes saved before incremental updates used positional ids
+        self.id_mapped = config.get('id_mapped', False)
+        self.stale_vectors = config.get('stale_vectors', 0)
+        self.chunk_size = config.get('chunk_size')
+        self.chunk_overlap = config.get('chunk_overlap', self.chunk_overlap)
+        self.chunk_unit = config.get('chunk_unit', 'chars')
+        self.reduction = config.get('reduction')
+        self.reduced_dim = config.get('reduced_dim')
+        self.input_dimension = config.get('input_dimension')
+
+    def _measure_recall(
+        self,
+        embeddings: np.ndarray,
+        full_embeddings: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]:
+        """
+        Measure recall@RECALL_K of the built index against exact float search
+
+        Sampled stored vectors are used as queries; ground truth comes from a
+        brute-force inner product over the uncompressed embeddings.
+
+        Args:
+            embeddings: Normalized vectors added to the index
+            full_embeddings: Normalized vectors before dimensionality reduction; ground
+                             truth is then the full-dimension flat index, and the
+                             loss of the reduction alone is reported separately
+        """
+        num_vectors = embeddings.shape[0]
+        k = min(RECALL_K, num_vectors)
+        rng = np.random.default_rng(7)
+        query_ids = np.sort(rng.choice(num_vectors, min(RECALL_SAMPLE_SIZE, num_vectors), replace=False))
+        queries = np.ascontiguousarray(embeddings[query_ids])
+
+        if full_embeddings is not None:
+            _, exact_ids = faiss.knn(
+                np.ascontiguousarray(full_embeddings[query_ids]), full_embeddings, k,
+                metric=faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            _, exact_ids = faiss.knn(queries, embeddings, k, metric=faiss.METRIC_INNER_PRODUCT)
+        _, approx_ids = self._search_index(queries, k)
+        _, rescored_ids = self._rescore(queries, *self._search_index(queries, k * self.rescore_factor), k, embeddings)
+
+        def recall(found: np.ndarray) -> float:
+            hits = sum(len(set(f[f >= 0]) & set(e)) for f, e in zip(found, exact_ids))
+            return hits / exact_ids.size
+
+        stats = {
+            f'recall_at_{k}': recall(approx_ids),
+            f'recall_at_{k}_rescored': recall(rescored_ids),
+        }
+        stats['recall_delta'] = 1.0 - stats[f'recall_at_{k}']
+        stats['recall_delta_rescored'] = 1.0 - stats[f'recall_at_{k}_rescored']
+        logger.info(
+            f"✓ Recall@{k} vs exact search: {stats[f'recall_at_{k}']:.3f} "
+            f"(rescored: {stats[f'recall_at_{k}_rescored']:.3f})"
+        )
+
+        if full_embeddings is not None:
+            # Exact search in the reduced space: what the reduction alone costs
+            _, reduced_ids = faiss.knn(queries, embeddings, k, metric=faiss.METRIC_INNER_PRODUCT)
+            stats[f'reduction_recall_at_{k}'] = recall(reduced_ids)
+            logger.info(
+                f"✓ Recall@{k} of exact {self.reduced_dim}-d search vs "
+                f"{self.input_dimension}-d flat search: {stats[f'reduction_recall_at_{k}']:.3f}"
+            )
+        return stats
+
+    def _rescore(
+        self,
+        query_vectors: np.ndarray,
+        scores: np.ndarray,
+        indices: np.ndarray,
+        top_k: int,
+        vectors: Optional[np.ndarray] = None
+    ):
+        """
+        Re-rank candidate ids with exact inner products over float vectors
+
+        Args:
+            query_vectors: Normalized queries (n_queries, dimension)
+            scores: Approximate candidate scores from the index
+            indices: Candidate ids from the index (-1 = no candidate)
+            top_k: Results to keep per query
+            vectors: Float vectors to score against (defaults to self.vectors)
+
+        Returns:
+            Tuple of (scores, indices) trimmed to top_k, best first
+        """
+        if vectors is None and self.vectors is None:
+            return scores[:, :top_k], indices[:, :top_k]
+
+        new_scores = np.full((len(indices), top_k), -np.inf, dtype='float32')
+        new_indices = np.full((len(indices), top_k), -1, dtype='int64')
+        for row, (query_vector, candidates) in enumerate(zip(query_vectors, indices)):
+            candidates = np.unique(candidates[candidates >= 0])
+            if candidates.size == 0:
+                continue
+            candidate_vectors = self._vector_rows(candidates) if vectors is None else vectors[candidates]
+            exact = candidate_vectors @ query_vector
+            order = np.argsort(-exact)[:top_k]
+            new_scores[row, :len(order)] = exact[order]
+            new_indices[row, :len(order)] = candidates[order]
+        return new_scores, new_indices
+
+    def get_index_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about the vector index: layout, memory footprint and recall
+
+        Returns:
+            Dictionary with index statistics
+        """
+        if self.index is None:
+            return {'index_type': self.index_type, 'num_vectors': 0}
+
+        chunk_stats = {}
+        if self.chunk_size and isinstance(self.documents, DocumentStore):
+            live_keys = np.asarray(self.documents.keys)[~self.documents.deleted]
+            chunk_stats = {
+                'chunk_size': self.chunk_size,
+                'live_chunks': self.documents.num_live,
+                'live_documents': len(np.unique(live_keys)),
+            }
+
+        index_path = self.vector_store_path / "faiss_index.bin"
+        raw_bytes = self.index.ntotal * self.index.d * 4
+        if index_path.exists():
+            index_bytes = index_path.stat().st_size
+        else:
+            index_bytes = faiss.serialize_index(self.index).nbytes
+
+        reduction_stats = {}
+        if self.reduction:
+            reduction_stats = {
+                'reduction': self.reduction,
+                'input_dimension': self.input_dimension,
+                'reduction_ratio': self.input_dimension / self.index.d if self.input_dimension else None,
+            }
+
+        return {
+            'index_type': self.index_type,
+            'quantization': self.quantization or 'none',
+            'rescore': self.rescore,
+            'num_vectors': self.index.ntotal,
+            'dimension': self.index.d,
+            'raw_vector_bytes': raw_bytes,
+            'index_bytes': index_bytes,
+            'compression_ratio': raw_bytes / index_bytes if index_bytes else None,
+            'live_documents': self.documents.num_live if isinstance(self.documents, DocumentStore) else len(self.documents),
+            'deleted_documents': int(self.documents.deleted.sum()) if isinstance(self.documents, DocumentStore) else 0,
+            'stale_vectors': self.stale_vectors,
+            **chunk_stats,
+            **reduction_stats,
+            **self.quality_stats,
+            **({'query_cache': self.query_cache.stats()} if self.query_cache is not None else {})
+        }
     
-    def create_embeddings(self, documents: List[Dict[str, Any]]) -> np.ndarray:
+    def create_embeddings(
+        self,
+        documents: List[Dict[str, Any]],
+        out: Optional[np.ndarray] = None,
+        out_path: Optional[Path] = None,
+        token_ids: Optional[List[np.ndarray]] = None
+    ) -> np.ndarray:
         """
         Create embeddings for documents
         
+        Embeddings are streamed chunk by chunk into one preallocated matrix.
+        
         Args:
             documents: List of documents with 'text' field
+            out: Preallocated float32 array or memmap (len(documents), dimension)
+            out_path: Write into a memory-mapped .npy file created here instead
+            token_ids: Model input ids of every document (token chunking), embedded
+                       without tokenizing the texts again
             
         Returns:
-            Numpy array of embeddings
+            Numpy array (or memmap) of embeddings
         """
         texts = [doc['text'] for doc in documents]
         
-        logger.info(f"Creating embeddings for {len(texts)} documents...")
+        # Records often render to identical text through the collection templates:
+        # embed each distinct text once and fan the vector out to every owner
+        text_positions = {}
+        owners = np.array([text_positions.setdefault(text, len(text_positions)) for text in texts], dtype='int64')
+        unique_texts = list(text_positions)
+        unique_token_ids = None
+        if token_ids is not None:
+            unique_token_ids = [None] * len(unique_texts)
+            for owner, ids in zip(owners, token_ids):
+                unique_token_ids[owner] = ids
         
-        # OPTIMIZED: Use batch embedding if available
-        if hasattr(self.embedder, 'embed_documents'):
-            # Batch embedding (faster)
-            embeddings = self.embedder.embed_documents(texts)
-        else:
-            # Fallback: One by one
-            embeddings = []
-            for i, text in enumerate(texts):
-                if i % 50 == 0:
-                    logger.info(f"  Embedded {i}/{len(texts)} documents...")
-                embedding = self.embedder.embed_query(text)
-                embeddings.append(embedding)
-        
-        embeddings_array = np.array(embeddings).astype('float32')   
+        logger.info(
+            f"Creating embeddings for {len(texts)} documents "
+            f"({len(unique_texts)} distinct texts)..."
+        )
+        
+        # Owners of each distinct text, found by binary search over the sorted owner ids
+        fan_out = len(unique_texts) < len(texts)
+        if fan_out:
+            by_owner = np.argsort(owners, kind='stable')
+            sorted_owners = owners[by_owner]
+        
+        embeddings_array = out
+        for start, embeddings in iter_embeddings(self.embedder, unique_texts, token_ids=unique_token_ids):
+            if embeddings_array is None:
+                shape = (len(texts), embeddings.shape[1])
+                if out_path is not None:
+                    embeddings_array = open_vectors_memmap(out_path, *shape)
+                else:
+                    embeddings_array = np.empty(shape, dtype='float32')
+            
+            if fan_out:
+                lo, hi = np.searchsorted(sorted_owners, [start, start + len(embeddings)])
+                rows = by_owner[lo:hi]
+                embeddings_array[rows] = embeddings[owners[rows] - start]
+            else:
+                embeddings_array[start:start + len(embeddings)] = embeddings
+        
+        if embeddings_array is None:
+            embeddings_array = np.empty((0, 0), dtype='float32')
         logger.info(f"Created embeddings with shape: {embeddings_array.shape}")
         return embeddings_array
+
+    @staticmethod
+    def _normalize_rows(embeddings: np.ndarray):
+        """L2-normalize in place, BUILD_CHUNK_ROWS at a time (works on memmaps too)"""
+        for start in range(0, embeddings.shape[0], BUILD_CHUNK_ROWS):
+            chunk = np.ascontiguousarray(embeddings[start:start + BUILD_CHUNK_ROWS])
+            faiss.normalize_L2(chunk)
+            embeddings[start:start + BUILD_CHUNK_ROWS] = chunk
     
-    def build_index(self, documents: List[Dict[str, Any]]):
+    def build_index(self, documents: List[Dict[str, Any]], vectors_on_disk: bool = False):
         """
         Build FAISS index from documents
         
         Args:
             documents: List of documents with 'text' and 'metadata'
+            vectors_on_disk: Stream the float vectors into a memory-mapped file instead
+                             of RAM (corpora whose vectors do not fit in memory; pair
+                             with quantization so the FAISS index itself stays small)
         """
+        documents = self._dedupe_by_key(documents)
         logger.info(f"Building index for {len(documents)} documents...")
+        documents, token_ids = self._split_documents(documents)
         
-        # Create embeddings
-        embeddings = self.create_embeddings(documents)
-        
-        # Build FAISS index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner Product (for cosine similarity)
-        
+        # Create embeddings (a reduced on-disk build streams the full-dimension
+        # vectors to a scratch file, deleted once recall has been measured)
+        full_vectors_path = self.vector_store_path / ".vectors_full.npy.building"
+        out_path = None
+        if vectors_on_disk:
+            out_path = full_vectors_path if self.reduction else self.building_vectors_path
+        embeddings = self.create_embeddings(documents, out_path=out_path, token_ids=token_ids)
+
         # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
-        
+        self._normalize_rows(embeddings)
+
+        # Fit and apply the dimensionality reduction; only reduced vectors are indexed and stored
+        full_embeddings = None
+        if self.reduction:
+            full_embeddings = embeddings
+            self._fit_reduction(full_embeddings)
+            embeddings = self._reduce_rows(
+                full_embeddings, self.building_vectors_path if vectors_on_disk else None
+            )
+
+        # Build FAISS index (Inner Product on normalized vectors = cosine similarity)
+        dimension = embeddings.shape[1]
+        self.index = self._create_faiss_index(dimension, embeddings.shape[0])
+
+        # Train IVF centroids / quantizer codebooks (no-op for raw flat / HNSW)
+        self._train_index(self.index, embeddings)
+
+        # Store documents for retrieval; FAISS ids are the document store rows
+        self.documents = DocumentStore(self.vector_store_path, create=True)
+        rows = self.documents.append(documents, self._document_keys(documents))
+        self.id_mapped = True
+        self.stale_vectors = 0
+        self._live_bitmap = None
+        self._distinct_live_rows = None
+
         # Add embeddings to index
-        self.index.add(embeddings)
-        
-        # Store documents for retrieval
-        self.documents = documents
-        
-        logger.info(f"✓ Built FAISS index with {self.index.ntotal} vectors (dimension: {dimension})")
-    
+        for start in range(0, len(rows), BUILD_CHUNK_ROWS):
+            chunk = np.ascontiguousarray(embeddings[start:start + BUILD_CHUNK_ROWS])
+            self.index.add_with_ids(chunk, rows[start:start + BUILD_CHUNK_ROWS])
+        self._apply_search_params()
+
+        # Keep exact float vectors for re-scoring and measure what compression costs
+        self.vectors = embeddings
+        self._vectors_dirty = True
+        self.pending_vectors = None
+        self._pending_dirty = False
+        self.quality_stats = self._measure_recall(embeddings, full_embeddings)
+        if isinstance(full_embeddings, np.memmap):
+            del full_embeddings
+            full_vectors_path.unlink()
+
+        logger.info(
+            f"✓ Built {self.index_type} FAISS index with {self.index.ntotal} vectors "
+            f"(dimension: {dimension})"
+        )
+
     def save_index(self):
-        """Save FAISS index and document metadata to disk"""
+        """Save FAISS index, index configuration and document store to disk"""
         index_path = self.vector_store_path / "faiss_index.bin"
-        metadata_path = self.vector_store_path / "documents.pkl"
-        
-        # Save FAISS index
-        faiss.write_index(self.index, str(index_path))
-        
-        # Save documents metadata
-        with open(metadata_path, 'wb') as f:
-            pickle.dump(self.documents, f)
-        
+
+        # Files are swapped in atomically so processes that memory-mapped them keep working
+        with atomic_write_path(index_path) as tmp_path:
+            faiss.write_index(self.index, str(tmp_path))
+
+        # Save float vectors used for exact re-scoring and rebuilds (memory-mapped on load)
+        if self.vectors is not None and self._vectors_dirty:
+            if isinstance(self.vectors, np.memmap) and Path(self.vectors.filename) == self.building_vectors_path:
+                # Streamed build: the file is already complete, swap it in without a copy
+                self.vectors.flush()
+                os.replace(self.building_vectors_path, self.vectors_path)
+                self.vectors = np.load(self.vectors_path, mmap_mode='r')
+            else:
+                with atomic_write_path(self.vectors_path) as tmp_path:
+                    with open(tmp_path, 'wb') as f:
+                        np.save(f, np.asarray(self.vectors))
+                # A streamed build updated before its first save leaves its file behind
+                if self.building_vectors_path.exists():
+                    self.building_vectors_path.unlink()
+            # vectors.npy now holds every row
+            if self.pending_vectors is None and self.delta_vectors_path.exists():
+                self.delta_vectors_path.unlink()
+            self._vectors_dirty = False
+
+        # Upserted rows only: vectors.npy is not rewritten until compact()
+        if self._pending_dirty:
+            with atomic_write_path(self.delta_vectors_path) as tmp_path:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, self.pending_vectors)
+            self._pending_dirty = False
+
+        # Save the fitted PCA: queries must go through the same transform
+        if self.pca is not None:
+            with atomic_write_path(self.pca_path) as tmp_path:
+                faiss.write_VectorTransform(self.pca, str(tmp_path))
+
+        # Save index layout so load_index restores the same mode and search params
+        with atomic_write_path(self.config_path) as tmp_path:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._index_config(), f, indent=2)
+
+        # Persist new rows and tombstones of the document store
+        self.documents.flush()
+
         logger.info(f"✓ Saved index to {index_path}")
-        logger.info(f"✓ Saved metadata to {metadata_path}")
+        logger.info(f"✓ Saved index config to {self.config_path}")
+        logger.info(f"✓ Saved documents to {self.vector_store_path / DocumentStore.DATA_FILE}")
         logger.info(f"✓ Total size: {len(self.documents)} documents")
     
-    def load_index(self):
-        """Load FAISS index and document metadata from disk"""
+    def load_index(self, mmap: bool = False, warmup: bool = False):
+        """
+        Load FAISS index and document store from disk
+
+        Documents are always read lazily from the memory-mapped document store;
+        documents.pkl is only read for indexes saved before the store existed.
+
+        Args:
+            mmap: Memory-map the FAISS index instead of reading it into the heap.
+                  Pages are shared between processes through the OS page cache and the
+                  index becomes read-only.
+            warmup: Page the mapped files into the OS cache in a background thread
+        """
         index_path = self.vector_store_path / "faiss_index.bin"
         metadata_path = self.vector_store_path / "documents.pkl"
         
@@ -124,55 +826,668 @@ class MongoDBVectorIndexer:
                 f"Please run ingestion first: python src/ingestion/ingest_multi_collection_mongodb.py"
             )
         
+        # Restore index layout (indexes saved before index_config.json existed are flat)
+        if self.config_path.exists():
+            with open(self.config_path, 'r') as f:
+                self._restore_index_config(json.load(f))
+        else:
+            self.index_type = "flat"
+            self.id_mapped = False
+            self.stale_vectors = 0
+
         # Load FAISS index
-        self.index = faiss.read_index(str(index_path))
-        
-        # Load documents metadata
-        with open(metadata_path, 'rb') as f:
-            self.documents = pickle.load(f)
-        
-        logger.info(f"✓ Loaded index with {self.index.ntotal} vectors")
+        if mmap:
+            io_flags = IVF_MMAP_IO_FLAGS if self.index_type == "ivf_flat" else CODES_MMAP_IO_FLAGS
+            self.index = faiss.read_index(str(index_path), io_flags)
+        else:
+            self.index = faiss.read_index(str(index_path))
+        self.read_only = mmap
+        self.vectors = None
+        self.pending_vectors = None
+        self._vectors_dirty = False
+        self._pending_dirty = False
+        self._apply_search_params()
+
+        # Queries of a reduced index are projected like the stored vectors
+        self.pca = None
+        if self.reduction == "pca":
+            if not self.pca_path.exists():
+                raise FileNotFoundError(f"PCA transform of the index not found at {self.pca_path}")
+            self.pca = faiss.read_VectorTransform(str(self.pca_path))
+
+        # Float vectors are only paged in for the candidates being re-scored
+        if self.rescore and self.vectors_path.exists():
+            self._load_vectors()
+        elif self.rescore:
+            logger.warning(f"Re-scoring disabled: {self.vectors_path} not found")
+            self.rescore = False
+
+        # Load documents
+        if DocumentStore.exists(self.vector_store_path):
+            self.documents = DocumentStore(self.vector_store_path)
+        else:
+            # Legacy pickle: rows are positions, converted to a store on the next save
+            logger.warning("No document store found, falling back to legacy documents.pkl")
+            with open(metadata_path, 'rb') as f:
+                legacy_documents = pickle.load(f)
+            self.documents = DocumentStore(self.vector_store_path, create=True)
+            self.documents.append(legacy_documents, self._document_keys(legacy_documents))
+        self._live_bitmap = None
+        self._distinct_live_rows = None
+
+        mode = "memory-mapped" if mmap else "in-memory"
+        logger.info(f"✓ Loaded {self.index_type} index with {self.index.ntotal} vectors ({mode})")
         logger.info(f"✓ Loaded {len(self.documents)} documents")
+
+        if warmup:
+            self.warmup()
+
+    def warmup(self, background: bool = True) -> Optional[threading.Thread]:
+        """
+        Page the index, vectors and document files into the OS page cache so the
+        first queries after start-up do not pay for disk reads
+
+        Args:
+            background: Run in a daemon thread instead of blocking the caller
+
+        Returns:
+            The warm-up thread when running in the background
+        """
+        paths = [self.vector_store_path / "faiss_index.bin"]
+        if self.vectors is not None:
+            paths.append(self.vectors_path)
+        paths.extend(self.documents.file_paths())
+
+        if not background:
+            _page_in(paths)
+            return None
+
+        thread = threading.Thread(target=_page_in, args=(paths,), name="index-warmup", daemon=True)
+        thread.start()
+        return thread
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def get_document(self, idx: int, include_text: bool = True) -> Dict[str, Any]:
         """
-        Search for similar documents given a query
-        
+        Fetch a single document by index position
+
         Args:
-            query: Search query text
-            top_k: Number of results to return
-            
+            idx: Position of the document in the index
+            include_text: Decode the document text (skip when only metadata is needed)
+
         Returns:
-            List of top-k most similar documents with scores
+            Copy of the document dict
         """
+        return self.documents.get(idx, include_text=include_text)
+
+    def collection_counts(self) -> Dict[str, int]:
+        """Number of indexed (live) documents per source collection"""
+        if 'collection' in self.documents.interned_fields:
+            return self.documents.count_by('collection')
+
+        counts = {}
+        for idx in np.flatnonzero(~self.documents.deleted):
+            collection = self.get_document(int(idx), include_text=False)['metadata'].get('collection', 'unknown')
+            counts[collection] = counts.get(collection, 0) + 1
+        return counts
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _document_keys(documents: List[Dict[str, Any]]) -> np.ndarray:
+        """Stable key of every document's Mongo _id"""
+        return np.array([document_key(doc.get('id', '')) for doc in documents], dtype='int64')
+
+    @staticmethod
+    def _dedupe_by_key(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep only the last document for each _id"""
+        latest = {}
+        for doc in documents:
+            latest[doc.get('id', '')] = doc
+        if len(latest) < len(documents):
+            logger.warning(f"Dropped {len(documents) - len(latest)} documents with duplicate ids")
+        return list(latest.values())
+
+    def _split_documents(self, documents: List[Dict[str, Any]]):
+        """
+        Split long documents into chunk documents (no-op unless chunk_size is set)
+
+        Each chunk keeps its document's id and metadata and adds chunk_index,
+        num_chunks, chunk_start and chunk_end; its text is the exact slice
+        text[chunk_start:chunk_end]. Short documents are kept whole.
+
+        Returns:
+            Tuple of (documents and chunks, model input ids of each when chunking
+            on tokens, else None)
+        """
+        if not self.chunk_size:
+            return documents, None
+
+        if self.chunk_unit == "tokens":
+            if not hasattr(self.embedder, 'token_chunker'):
+                raise ValueError(
+                    f"chunk_unit='tokens' needs an embedder with token_chunker(), "
+                    f"got {type(self.embedder).__name__}"
+                )
+            chunker = self.embedder.token_chunker(self.chunk_size, self.chunk_overlap)
+            token_chunks = chunker.split([doc.get('text', '') for doc in documents])
+            all_spans = [[(start, end) for start, end, _ in doc_chunks] for doc_chunks in token_chunks]
+            token_ids = [ids for doc_chunks in token_chunks for _, _, ids in doc_chunks]
+        else:
+            all_spans = (chunk_spans(doc.get('text', ''), self.chunk_size, self.chunk_overlap) for doc in documents)
+            token_ids = None
+
+        chunks = []
+        for doc, spans in zip(documents, all_spans):
+            text = doc.get('text', '')
+            if len(spans) == 1:
+                chunks.append(doc)
+                continue
+            for chunk_index, (start, end) in enumerate(spans):
+                chunks.append({
+                    **doc,
+                    'text': text[start:end],
+                    'metadata': {
+                        **doc.get('metadata', {}),
+                        'chunk_index': chunk_index,
+                        'num_chunks': len(spans),
+                        'chunk_start': start,
+                        'chunk_end': end,
+                    },
+                })
+        if len(chunks) > len(documents):
+            logger.info(f"Split {len(documents)} documents into {len(chunks)} chunks ({self.chunk_unit})")
+        return chunks, token_ids
+
+    def get_document_text(self, doc_id) -> Optional[str]:
+        """
+        Full text of a document, reassembled from its chunk rows when it was split
+
+        Search results of long documents only carry their best chunk; call this
+        when the whole document is needed.
+
+        Args:
+            doc_id: Mongo _id of the document (the result's 'id')
+
+        Returns:
+            Document text, or None when no live row has that id
+        """
+        rows = self.documents.find_all_rows(np.array([document_key(doc_id)], dtype='int64'))
+        if not len(rows):
+            return None
+        text = ''
+        for chunk_row in rows:
+            chunk = self.get_document(int(chunk_row))
+            # Skip the part overlapping what is already assembled
+            text += chunk['text'][len(text) - chunk['metadata'].get('chunk_start', 0):]
+        return text
+
+    def _check_writable(self):
+        """Incremental updates need an id-mapped, in-memory index"""
         if self.index is None:
+            raise ValueError("Index not built or loaded. Call build_index() or load_index() first.")
+        if self.read_only:
             raise ValueError(
-                "Index not built or loaded. "
-                "Call build_index() or load_index() first."
+                "Index is memory-mapped and read-only. Load it with load_index(mmap=False) to update it."
             )
-        
-        # Create query embedding
-        query_embedding = self.embedder.embed_query(query)
-        query_vector = np.array([query_embedding]).astype('float32')
-        
+        if not self.id_mapped:
+            raise ValueError(
+                "Index was built before incremental updates were supported. "
+                "Rebuild it once with build_index() to enable upsert/delete."
+            )
+
+    def _load_vectors(self):
+        """Map vectors.npy and read the vectors of the rows upserted after it was written"""
+        self.vectors = np.load(self.vectors_path, mmap_mode='r')
+        if self.delta_vectors_path.exists():
+            self.pending_vectors = np.load(self.delta_vectors_path)
+
+    def _ensure_vectors(self):
+        """Map the stored float vectors if they are not loaded yet"""
+        if self.vectors is None and self.vectors_path.exists():
+            self._load_vectors()
+
+    def _vector_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Float vectors of document store rows, from vectors.npy or the pending upserts"""
+        rows = np.asarray(rows, dtype='int64')
+        if self.pending_vectors is None:
+            return np.asarray(self.vectors[rows])
+
+        base = len(self.vectors)
+        out = np.empty((len(rows), self.vectors.shape[1]), dtype='float32')
+        in_base = rows < base
+        out[in_base] = self.vectors[rows[in_base]]
+        out[~in_base] = self.pending_vectors[rows[~in_base] - base]
+        return out
+
+    def _remove_rows(self, rows: np.ndarray):
+        """Tombstone rows in the document store and drop their vectors from the index"""
+        rows = np.asarray(rows, dtype='int64')
+        rows = rows[rows >= 0]
+        if not rows.size:
+            return
+
+        self.documents.delete(rows)
+        self._live_bitmap = None
+        self._distinct_live_rows = None
+        if self.index_type == "hnsw":
+            # HNSW graphs do not support removal; masked at search time until compact()
+            self.stale_vectors += len(rows)
+        else:
+            self.index.remove_ids(rows)
+
+    def upsert(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Insert new documents and replace existing ones with the same _id
+
+        Only the given documents are embedded. Call save_index() to persist.
+
+        Args:
+            documents: Formatted documents with 'id', 'text' and 'metadata'
+
+        Returns:
+            Number of documents written
+        """
+        self._check_writable()
+        documents = self._dedupe_by_key(documents)
+        if not documents:
+            return 0
+
+        keys = self._document_keys(documents)
+        existing_rows = self.documents.find_rows(keys)
+        chunks, token_ids = self._split_documents(documents)
+        embeddings = self.create_embeddings(chunks, token_ids=token_ids)
+        faiss.normalize_L2(embeddings)
+        embeddings = self._reduce(embeddings)
+
+        # Every chunk row of a replaced document goes
+        self._remove_rows(self.documents.find_all_rows(keys))
+
+        rows = self.documents.append(chunks, self._document_keys(chunks))
+        self.index.add_with_ids(embeddings, rows)
+        # Search masks are sized to the number of rows
+        self._live_bitmap = None
+        self._distinct_live_rows = None
+
+        # Keep the float vectors row-aligned with the document store: new rows go to the
+        # pending vectors, so an upsert costs O(changes) whatever the size of vectors.npy
+        self._ensure_vectors()
+        if self.vectors is not None:
+            if self.pending_vectors is None:
+                self.pending_vectors = embeddings
+            else:
+                self.pending_vectors = np.concatenate([self.pending_vectors, embeddings])
+            self._pending_dirty = True
+
+        updated = int((existing_rows >= 0).sum())
+        logger.info(f"✓ Upserted {len(documents)} documents ({updated} updated, {len(documents) - updated} new)")
+        return len(documents)
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Delete documents by Mongo _id. Call save_index() to persist.
+
+        Args:
+            ids: Document ids (the 'id' field of formatted documents)
+
+        Returns:
+            Number of documents deleted
+        """
+        return self.delete_keys(np.array([document_key(doc_id) for doc_id in ids], dtype='int64'))
+
+    def delete_keys(self, keys: np.ndarray) -> int:
+        """
+        Delete documents by stable key (see document_key). Call save_index() to persist.
+
+        Args:
+            keys: int64 document keys
+
+        Returns:
+            Number of documents deleted
+        """
+        self._check_writable()
+        keys = np.asarray(keys, dtype='int64')
+        deleted = int((self.documents.find_rows(keys) >= 0).sum())
+        self._remove_rows(self.documents.find_all_rows(keys))
+        logger.info(f"✓ Deleted {deleted}/{len(keys)} documents")
+        return deleted
+
+    def collection_keys(self, collection: str) -> np.ndarray:
+        """Stable keys of the live documents from one source collection (for delta ingestion)"""
+        live = ~self.documents.deleted
+        codes = self.documents.field_codes('collection')
+        if codes is not None:
+            values = self.documents.value_tables['collection']
+            if collection not in values:
+                return np.zeros(0, dtype='int64')
+            rows = np.flatnonzero(live & (np.asarray(codes) == values.index(collection)))
+        else:
+            rows = np.array([
+                idx for idx in np.flatnonzero(live)
+                if self.get_document(int(idx), include_text=False)['metadata'].get('collection') == collection
+            ], dtype='int64')
+        # Chunked documents have one row per chunk
+        return np.unique(np.asarray(self.documents.keys[rows], dtype='int64'))
+
+    def compact(self) -> int:
+        """
+        Reclaim space held by deleted documents
+
+        Rewrites the document store without tombstoned rows and re-adds the
+        remaining vectors under their new row ids (no re-embedding); the
+        vectors of upserted rows are merged into vectors.npy. Call
+        save_index() afterwards to persist the rebuilt index.
+
+        Returns:
+            Number of rows reclaimed
+        """
+        self._check_writable()
+        self._ensure_vectors()
+        if self.vectors is None:
+            raise ValueError(f"Cannot compact without stored vectors ({self.vectors_path})")
+
+        total_rows = len(self.documents)
+        kept_rows = self.documents.compact()
+        reclaimed = total_rows - len(kept_rows)
+        if not reclaimed:
+            return 0
+
+        vectors = np.ascontiguousarray(self._vector_rows(kept_rows))
+        self.index.reset()
+        self.index.add_with_ids(vectors, np.arange(len(kept_rows), dtype='int64'))
+
+        self.vectors = vectors
+        self._vectors_dirty = True
+        self.pending_vectors = None
+        self._pending_dirty = False
+        self.stale_vectors = 0
+        self._live_bitmap = None
+        self._distinct_live_rows = None
+
+        logger.info(f"✓ Compacted index: reclaimed {reclaimed} rows, {len(kept_rows)} remaining")
+        return reclaimed
+
+    def _search_params(self, rows: Optional[np.ndarray] = None) -> Optional[faiss.SearchParameters]:
+        """
+        Per-query parameters restricting the search to a set of rows
+
+        Args:
+            rows: Live rows allowed in the results (None = all live rows)
+
+        Returns:
+            Search parameters with an ID selector, or None when nothing is masked
+        """
+        if rows is None:
+            if not self.stale_vectors:
+                return None
+            # Only stale HNSW vectors to hide
+            if self._live_bitmap is None:
+                self._live_bitmap = np.packbits(~self.documents.deleted, bitorder='little')
+            bitmap = self._live_bitmap
+        elif rows is self._distinct_live_rows:
+            # Unfiltered search with duplicates collapsed: same mask for every query
+            if self._distinct_bitmap is None:
+                mask = np.zeros(len(self.documents), dtype=bool)
+                mask[rows] = True
+                self._distinct_bitmap = np.packbits(mask, bitorder='little')
+            bitmap = self._distinct_bitmap
+        else:
+            mask = np.zeros(len(self.documents), dtype=bool)
+            mask[rows] = True
+            bitmap = np.packbits(mask, bitorder='little')
+
+        selector = faiss.IDSelectorBitmap(len(self.documents), faiss.swig_ptr(bitmap))
+        # Parameters passed explicitly replace the index defaults, so carry nprobe / efSearch
+        if self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        elif self.index_type == "ivf_flat":
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        # Keep the selector and its bitmap alive as long as the parameters
+        params.selector_ref = selector
+        params.bitmap_ref = bitmap
+        return params
+
+    def _search_index(self, query_vectors: np.ndarray, k: int, rows: Optional[np.ndarray] = None):
+        """Search the FAISS index, skipping deleted rows and rows outside `rows`"""
+        params = self._search_params(rows)
+        if params is None:
+            return self.index.search(query_vectors, k)
+        return self.index.search(query_vectors, k, params=params)
+
+    def _search_rows(self, query_vectors: np.ndarray, k: int, rows: np.ndarray):
+        """Exact inner-product search restricted to `rows`, chunked to bound memory"""
+        scores = np.full((len(query_vectors), k), -np.inf, dtype='float32')
+        indices = np.full((len(query_vectors), k), -1, dtype='int64')
+        for start in range(0, len(rows), EXACT_SEARCH_CHUNK_ROWS):
+            chunk = rows[start:start + EXACT_SEARCH_CHUNK_ROWS]
+            # Merge this chunk's scores with the best k so far
+            all_scores = np.hstack([scores, query_vectors @ self._vector_rows(chunk).T])
+            all_indices = np.hstack([indices, np.broadcast_to(chunk, (len(query_vectors), len(chunk)))])
+            top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(all_scores, top, axis=1)
+            indices = np.take_along_axis(all_indices, top, axis=1)
+
+        order = np.argsort(-scores, axis=1)
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed all queries in one embedder call (cache misses only), L2-normalize and reduce them"""
+        embed_fn = self.query_batcher.embed if self.query_batcher is not None else query_embedding_fn(self.embedder)
+        if self.query_cache is not None:
+            model_name = getattr(self.embedder, 'model_name', type(self.embedder).__name__)
+            query_vectors = self.query_cache.get_or_embed(model_name, list(queries), embed_fn)
+        else:
+            query_vectors = np.asarray(embed_fn(list(queries)), dtype='float32')
+        query_vectors = np.ascontiguousarray(query_vectors.reshape(len(queries), -1))
         # Normalize for cosine similarity
-        faiss.normalize_L2(query_vector)
-        
-        # Search the index
-        scores, indices = self.index.search(query_vector, top_k)
-        
-        # Prepare results
+        faiss.normalize_L2(query_vectors)
+        # Same projection as the stored vectors
+        return self._reduce(query_vectors)
+
+    def _search_vectors(self, query_vectors: np.ndarray, top_k: int, rows: Optional[np.ndarray] = None):
+        """
+        Search normalized query vectors, optionally restricted to `rows`
+
+        Returns:
+            Tuple of (scores, indices), one row per query, -1 padded
+        """
+        scan_subset = rows is not None and (
+            self.index_type == "flat" or len(rows) <= EXACT_FILTER_MAX_ROWS
+        )
+        if scan_subset:
+            self._ensure_vectors()
+
+        if scan_subset and self.vectors is not None:
+            # Scoring the matching rows directly is exact and cheaper than a full scan or graph walk
+            return self._search_rows(query_vectors, top_k, rows)
+        if self.rescore and self.vectors is not None:
+            # Over-fetch candidates when re-scoring with exact vectors
+            scores, indices = self._search_index(query_vectors, top_k * self.rescore_factor, rows)
+            return self._rescore(query_vectors, scores, indices, top_k)
+        return self._search_index(query_vectors, top_k, rows)
+
+    def _best_chunk_per_document(self, scores: np.ndarray, indices: np.ndarray, top_k: int):
+        """Keep each document's best-scoring chunk (max-sim), up to top_k documents"""
+        valid = indices >= 0
+        scores, indices = scores[valid], indices[valid]
+        # Hits are sorted by score, so the first hit of a key is its best chunk
+        _, first = np.unique(np.asarray(self.documents.keys[indices]), return_index=True)
+        first = np.sort(first)[:top_k]
+        return scores[first], indices[first]
+
+    def _search_chunks(self, query_vectors: np.ndarray, top_k: int, rows: Optional[np.ndarray] = None):
+        """
+        Search chunk vectors and aggregate the hits to documents
+
+        Over-fetches chunks, doubling the count until every query has top_k
+        distinct documents or every candidate chunk has been scored.
+
+        Returns:
+            One (scores, rows) pair per query; rows are the best chunk of each document
+        """
+        limit = max(1, len(rows) if rows is not None else self.index.ntotal)
+        fetch_k = min(top_k * CHUNK_OVERFETCH, limit)
+        while True:
+            scores, indices = self._search_vectors(query_vectors, fetch_k, rows)
+            hits = [self._best_chunk_per_document(s, i, top_k) for s, i in zip(scores, indices)]
+            if fetch_k >= limit or all(len(hit_rows) >= top_k for _, hit_rows in hits):
+                return hits
+            fetch_k = min(fetch_k * 2, limit)
+
+    def _collapse_rows(self, rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """
+        Restrict a search to one row per distinct text
+
+        Args:
+            rows: Rows allowed by the filters (None = all live rows)
+
+        Returns:
+            Rows to search, or None when no restriction is needed
+        """
+        if rows is not None:
+            return self.documents.distinct_rows(rows)
+
+        if self._distinct_live_rows is None:
+            live_rows = np.flatnonzero(~self.documents.deleted)
+            distinct = self.documents.distinct_rows(live_rows)
+            # False marks "no duplicates": search the whole index without a selector
+            self._distinct_live_rows = distinct if len(distinct) < len(live_rows) else False
+            self._distinct_bitmap = None
+        return None if self._distinct_live_rows is False else self._distinct_live_rows
+
+    def _collect_results(self, scores: np.ndarray, indices: np.ndarray) -> List[Dict[str, Any]]:
+        """Decode the documents of one query's hits"""
         results = []
-        for idx, score in zip(indices[0], scores[0]):
-            if idx < len(self.documents):
-                result = self.documents[idx].copy()
+        for idx, score in zip(indices, scores):
+            # Approximate indexes pad missing neighbours with -1
+            if 0 <= idx < len(self.documents):
+                result = self.get_document(idx)
                 result['similarity_score'] = float(score)
+                if 'num_chunks' in result['metadata']:
+                    # Best chunk of a long document; its id and chunk_start/chunk_end locate it
+                    # in the parent (whole text through get_document_text)
+                    result['snippet'] = result['text']
+                if self.collapse_duplicates:
+                    duplicates = self.documents.duplicate_rows(int(idx))
+                    duplicate_ids = dict.fromkeys(
+                        self.get_document(int(row), include_text=False)['id'] for row in duplicates
+                    )
+                    duplicate_ids.pop(result['id'], None)
+                    if duplicate_ids:
+                        result['duplicate_ids'] = list(duplicate_ids)
                 results.append(result)
+        return results
+
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filters: Union[Dict[str, Any], List[Optional[Dict[str, Any]]], None] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many queries at once
+
+        All queries are embedded in one forward pass and searched with one
+        FAISS call per distinct filter over the whole query matrix.
+
+        Args:
+            queries: Search query texts
+            top_k: Number of results per query
+            filters: One metadata filter dict for all queries, or one (or None) per query
+
+        Returns:
+            One list of top-k documents with scores per query, in query order
+        """
+        if self.index is None:
+            raise ValueError(
+                "Index not built or loaded. "
+                "Call build_index() or load_index() first."
+            )
+
+        if filters is None or isinstance(filters, dict):
+            filters = [filters] * len(queries)
+        elif len(filters) != len(queries):
+            raise ValueError(f"Got {len(filters)} filters for {len(queries)} queries")
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        # Empty queries have no embedding and no results
+        positions = [i for i, query in enumerate(queries) if query and query.strip()]
+        if not positions:
+            return results
+
+        # Queries sharing a filter share its row subset and one FAISS search
+        groups: Dict[str, tuple] = {}
+        for i in positions:
+            group_key = json.dumps(filters[i] or {}, sort_keys=True, default=str)
+            groups.setdefault(group_key, (filters[i], []))[1].append(i)
+
+        query_vectors = self._embed_queries([queries[i] for i in positions])
+        vector_rows = {query_pos: row for row, query_pos in enumerate(positions)}
+
+        for group_filters, group_positions in groups.values():
+            rows = None
+            if group_filters:
+                rows = self.documents.filter_rows(group_filters)
+                if not len(rows):
+                    logger.info(f"No documents match filters {group_filters}")
+                    continue
+            if self.collapse_duplicates:
+                rows = self._collapse_rows(rows)
+
+            group_vectors = query_vectors[[vector_rows[i] for i in group_positions]]
+            if self.chunk_size:
+                hits = self._search_chunks(group_vectors, top_k, rows)
+            else:
+                hits = zip(*self._search_vectors(group_vectors, top_k, rows))
+            for i, (query_scores, query_indices) in zip(group_positions, hits):
+                results[i] = self._collect_results(query_scores, query_indices)
+
+        logger.info(f"Searched {len(queries)} queries in {len(groups)} batch(es)")
+        return results
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for similar documents given a query
         
+        Args:
+            query: Search query text
+            top_k: Number of results to return
+            filters: Metadata field -> required value (e.g. {'collection': 'faqs'});
+                     applied inside the search, so up to top_k matches are returned
+            
+        Returns:
+            List of top-k most similar documents with scores
+        """
+        results = self.search_batch([query], top_k=top_k, filters=filters)[0]
         logger.info(f"Found {len(results)} similar documents for query: '{query[:50]}...'")
         return results
 
 
+def _page_in(paths: List[Path]):
+    """Read files sequentially so their pages land in the OS page cache"""
+    total = 0
+    for path in paths:
+        if not path.exists():
+            continue
+        with open(path, 'rb') as f:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            while True:
+                chunk = f.read(WARMUP_CHUNK_BYTES)
+                if not chunk:
+                    break
+                total += len(chunk)
+    logger.info(f"✓ Warmed up {total / 1e6:.1f} MB of index files")
+
+
 #------------------------------------------
 
 # #mongodb_indexer.py
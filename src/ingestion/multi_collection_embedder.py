@@ -3,12 +3,20 @@ Enhanced embedder for multi-collection RAG pipeline
 Supports both BERT and BGE-M3 models with improved batching and chunking
 """
 
-from transformers import AutoTokenizer, AutoModel
+from transformers import AutoTokenizer
 import torch
 import numpy as np
 from langchain.embeddings.base import Embeddings
-from typing import List, Union
+from typing import Dict, List, Optional, Sequence, Union
 import logging
+from src.ingestion.embedding_cache import EmbeddingCache, get_embedding_cache
+from src.ingestion.embedding_pool import EmbeddingPool
+from src.ingestion.embedding_tuner import DEFAULT_BATCH_SIZE, load_tuning
+from src.ingestion.model_registry import get_model_registry
+from src.ingestion.onnx_backend import mean_pool, validate_backend
+from src.ingestion.splitter import chunk_spans
+from src.ingestion.token_chunker import TokenChunker, pad_token_ids
+from src.utils.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -24,8 +32,17 @@ class MultiCollectionEmbedder(Embeddings):
         model_name: str = "BAAI/bge-base-en-v1.5",  # Default to BGE-M3 for multilingual
         device: str = None,
         max_length: int = 512,
-        batch_size: int = 32,
-        normalize_embeddings: bool = True
+        batch_size: Optional[int] = None,
+        normalize_embeddings: bool = True,
+        use_cache: bool = True,
+        cache: Optional[EmbeddingCache] = None,
+        max_batch_tokens: Optional[int] = None,
+        length_bucketing: bool = True,
+        backend: Optional[str] = None,
+        num_threads: Optional[int] = None,
+        num_workers: int = 0,
+        threads_per_worker: Optional[int] = None,
+        use_tuning: bool = True
     ):
         """
         Initialize embedder
@@ -37,26 +54,83 @@ class MultiCollectionEmbedder(Embeddings):
                 - "BAAI/bge-base-en-v1.5" (English, high quality)
             device: "cuda", "cpu", or None (auto-detect)
             max_length: Maximum token length
-            batch_size: Batch size for encoding
+            batch_size: Batch size for encoding (fixed-size batches when length_bucketing is off;
+                        None = tuned value, else 32)
             normalize_embeddings: Whether to normalize embeddings
+            use_cache: Reuse vectors from the persistent embedding cache
+            cache: Cache instance (None = shared cache from Config)
+            max_batch_tokens: Padded tokens per batch (None = tuned value, else batch_size * max_length)
+            length_bucketing: Sort texts by token length and batch them by token budget,
+                              so short texts are not padded to the length of long ones
+            backend: "torch", "onnx" (ONNX Runtime) or "onnx-int8" (ONNX Runtime with
+                     dynamic int8 weights); None = Config.EMBEDDING_BACKEND
+            num_threads: Intra-op threads of the ONNX Runtime session (None = tuned value,
+                         else all cores). Torch threads are process-wide: ingestion entry
+                         points set them with embedding_tuner.apply_tuned_threads
+            num_workers: Embed large batches in this many worker processes (CPU only;
+                         0 or 1 = in this process). Queries always run in-process.
+            threads_per_worker: Intra-op threads per worker (None = cores / num_workers)
+            use_tuning: Fill unset batching / thread settings from this host's calibration
+                        (python -m src.ingestion.embedding_tuner)
         """
         logger.info(f"Loading embedding model: {model_name}")
         
         self.model_name = model_name
         self.max_length = max_length
-        self.batch_size = batch_size
         self.normalize_embeddings = normalize_embeddings
+        self.length_bucketing = length_bucketing
+        self.backend = validate_backend(backend or Config.EMBEDDING_BACKEND)
+        if self.backend == "torch":
+            self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        else:
+            self.device = "cpu"
         
-        # Load tokenizer and model
+        # Settings calibrated for this model on this host, for whatever the caller left unset
+        tuning = (load_tuning(model_name, self.backend, self.device) if use_tuning else None) or {}
+        self.batch_size = batch_size or tuning.get('batch_size', DEFAULT_BATCH_SIZE)
+        self.max_batch_tokens = max_batch_tokens or tuning.get('max_batch_tokens') or self.batch_size * max_length
+        num_threads = num_threads or tuning.get('num_threads')
+        
+        # Texts embedded before with the same model settings are read from disk
+        # (int8 vectors differ slightly from fp32 ones, so each backend gets its own namespace)
+        self.cache = (cache or get_embedding_cache()) if use_cache else None
+        cache_params = dict(max_length=max_length, normalize=normalize_embeddings, pooling="mean")
+        if self.backend != "torch":
+            cache_params["backend"] = self.backend
+        self.cache_namespace = EmbeddingCache.namespace(model_name, **cache_params)
+        
+        # Tokenizer per embedder (fast tokenizers are not safe to share between threads),
+        # model weights shared process-wide through the registry
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
-        self.model.eval()
+        registry = get_model_registry()
+        if self.backend == "torch":
+            self.onnx_model = None
+            self.model = registry.transformer(model_name, self.device)
+        else:
+            # ONNX Runtime on CPU; the torch model is only loaded once, for the export
+            self.model = None
+            self.onnx_model = registry.onnx_encoder(
+                model_name, quantize=self.backend == "onnx-int8", num_threads=num_threads
+            )
         
-        # Set device
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.model.to(self.device)
+        # Worker processes are started on the first large embed_documents call
+        self.pool = None
+        if num_workers > 1 and self.device == "cpu":
+            self.pool = EmbeddingPool(
+                model_name,
+                num_workers=num_workers,
+                threads_per_worker=threads_per_worker,
+                max_length=max_length,
+                batch_size=self.batch_size,
+                normalize_embeddings=normalize_embeddings,
+                max_batch_tokens=self.max_batch_tokens,
+                length_bucketing=length_bucketing,
+                backend=self.backend
+            )
+        elif num_workers > 1:
+            logger.info(f"num_workers ignored on {self.device}: the pool is CPU-only")
         
-        logger.info(f"✓ Model loaded on {self.device}")
+        logger.info(f"✓ Model loaded on {self.device} ({self.backend} backend)")
         logger.info(f"✓ Embedding dimension: {self.get_embedding_dimension()}")
     
     def mean_pooling(self, model_output, attention_mask):
@@ -89,27 +163,21 @@ class MultiCollectionEmbedder(Embeddings):
         if len(text) <= chunk_size:
             return [text]
         
-        chunks = []
-        start = 0
+        return [text[start:end].strip() for start, end in chunk_spans(text, chunk_size, overlap)]
+    
+    def token_chunker(self, max_tokens: Optional[int] = None, overlap_tokens: int = 32) -> TokenChunker:
+        """
+        Chunker cutting texts on this model's tokens (see TokenChunker)
         
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                break_point = max(last_period, last_newline)
-                
-                if break_point > chunk_size * 0.7:  # Only break if not too early
-                    chunk = chunk[:break_point + 1]
-                    end = start + break_point + 1
+        Args:
+            max_tokens: Model input length per chunk (None or more than max_length = max_length)
+            overlap_tokens: Tokens shared by consecutive chunks
             
-            chunks.append(chunk.strip())
-            start = end - overlap
-        
-        return chunks
+        Returns:
+            TokenChunker whose chunk ids can be passed to embed_token_ids()
+        """
+        max_tokens = min(max_tokens or self.max_length, self.max_length)
+        return TokenChunker(self.tokenizer, max_tokens, overlap_tokens)
     
     def embed_documents(self, texts: Union[str, List[str]]) -> np.ndarray:
         """
@@ -128,32 +196,189 @@ class MultiCollectionEmbedder(Embeddings):
         if len(texts) == 0:
             return np.array([])
         
-        all_embeddings = []
+        if self.cache is not None:
+            return self.cache.embed(self.cache_namespace, list(texts), self._embed_uncached)
+        return self._embed_uncached(texts)
+    
+    def embed_queries(self, texts: Union[str, List[str]]) -> np.ndarray:
+        """
+        Embed search queries, bypassing the persistent embedding cache
         
-        # Process in batches
-        for i in range(0, len(texts), self.batch_size):
-            batch_texts = texts[i:i + self.batch_size]
+        Args:
+            texts: Single query or list of queries
             
-            # Tokenize
-            encoded_input = self.tokenizer(
-                batch_texts,
-                padding=True,
-                truncation=True,
-                max_length=self.max_length,
-                return_tensors="pt"
-            ).to(self.device)
+        Returns:
+            Numpy array of embeddings (n_texts, embedding_dim)
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        
+        if len(texts) == 0:
+            return np.array([])
+        
+        return self._embed_uncached(texts)
+    
+    def embed_token_ids(
+        self,
+        token_ids: Sequence[Sequence[int]],
+        texts: Optional[List[str]] = None
+    ) -> np.ndarray:
+        """
+        Embed pre-tokenized inputs (e.g. TokenChunker chunks) without tokenizing again
+        
+        Args:
+            token_ids: Token ids per input, special tokens included, at most max_length
+            texts: Text of every input; used as embedding cache keys when given
             
-            # Generate embeddings
-            with torch.no_grad():
-                model_output = self.model(**encoded_input)
+        Returns:
+            Numpy array of embeddings (n_inputs, embedding_dim)
+        """
+        if len(token_ids) == 0:
+            return np.array([])
+        
+        if self.cache is not None and texts is not None:
+            ids_by_text = dict(zip(texts, token_ids))
+            return self.cache.embed(
+                self.cache_namespace,
+                list(texts),
+                lambda missing: self._embed_ids_uncached([ids_by_text[text] for text in missing])
+            )
+        return self._embed_ids_uncached(token_ids)
+    
+    def _encode(self, batch_texts: List[str]) -> np.ndarray:
+        """Tokenize one batch (padded to its longest text), run the model, pool and normalize"""
+        encoded_input = self.tokenizer(
+            batch_texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        return self._run_model(encoded_input)
+    
+    def _encode_ids(self, batch_ids: List[Sequence[int]]) -> np.ndarray:
+        """Pad one batch of token ids (no tokenization), run the model, pool and normalize"""
+        return self._run_model(pad_token_ids(self.tokenizer, batch_ids))
+    
+    def _run_model(self, encoded_input: Dict[str, np.ndarray]) -> np.ndarray:
+        """Run the model on padded inputs, then mean-pool and optionally normalize"""
+        if self.onnx_model is not None:
+            token_embeddings = self.onnx_model(encoded_input)
+            return mean_pool(token_embeddings, encoded_input["attention_mask"], self.normalize_embeddings)
+        
+        encoded_input = {
+            name: torch.from_numpy(np.asarray(values)).to(self.device)
+            for name, values in encoded_input.items()
+        }
+        
+        # Generate embeddings
+        with torch.no_grad():
+            model_output = self.model(**encoded_input)
+        
+        # Pool and optionally normalize
+        embeddings = self.mean_pooling(model_output, encoded_input["attention_mask"])
+        
+        if self.normalize_embeddings:
+            embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+        
+        return embeddings.cpu().numpy()
+    
+    def _token_budget_batches(self, lengths: np.ndarray) -> List[np.ndarray]:
+        """
+        Group text positions into batches of similar token length
+        
+        Texts are sorted longest first; each batch takes as many texts as fit
+        in max_batch_tokens once padded to its first (longest) member.
+        
+        Args:
+            lengths: Token count of every text
+            
+        Returns:
+            List of position arrays, one per batch
+        """
+        order = np.argsort(-lengths, kind='stable')
+        batches = []
+        start = 0
+        while start < len(order):
+            longest = max(int(lengths[order[start]]), 1)
+            size = max(1, self.max_batch_tokens // longest)
+            batches.append(order[start:start + size])
+            start += size
+        return batches
+    
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
+        """
+        Run the model on a list of texts (no cache lookup)
+        
+        Args:
+            texts: List of texts
             
-            # Pool and optionally normalize
-            embeddings = self.mean_pooling(model_output, encoded_input["attention_mask"])
+        Returns:
+            Numpy array of embeddings (n_texts, embedding_dim), in input order
+        """
+        texts = list(texts)
+        use_pool = self.pool is not None and len(texts) > self.pool.shard_size
+        if not self.length_bucketing and not use_pool:
+            return self._embed_fixed_batches(texts)
+        
+        # Token lengths only (no padding, no tensors) to plan the batches
+        lengths = np.array([
+            len(ids) for ids in self.tokenizer(
+                texts,
+                truncation=True,
+                max_length=self.max_length,
+                return_attention_mask=False,
+                return_token_type_ids=False
+            )["input_ids"]
+        ])
+        return self._embed_by_length(texts, lengths, self._encode)
+    
+    def _embed_ids_uncached(self, token_ids: Sequence[Sequence[int]]) -> np.ndarray:
+        """Run the model on pre-tokenized inputs, batched by token budget (no cache lookup)"""
+        lengths = np.array([len(ids) for ids in token_ids])
+        return self._embed_by_length(list(token_ids), lengths, self._encode_ids)
+    
+    def _embed_by_length(self, items: list, lengths: np.ndarray, encode) -> np.ndarray:
+        """
+        Embed texts or token id sequences in token-budget batches (or in the pool)
+        
+        Args:
+            items: Texts or token id sequences
+            lengths: Token count of every item
+            encode: Batch function (_encode or _encode_ids)
             
-            if self.normalize_embeddings:
-                embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+        Returns:
+            Numpy array of embeddings (n_items, embedding_dim), in input order
+        """
+        if self.pool is not None and len(items) > self.pool.shard_size:
+            # Longest texts first: shards of similar length, slowest shards dispatched first
+            return self.pool.embed(items, order=np.argsort(-lengths, kind='stable'))
+        batches = self._token_budget_batches(lengths)
+        
+        all_embeddings = None
+        embedded = 0
+        for batch_number, positions in enumerate(batches):
+            embeddings = encode([items[i] for i in positions])
+            if all_embeddings is None:
+                all_embeddings = np.empty((len(items), embeddings.shape[1]), dtype='float32')
+            # Scatter back to the original order
+            all_embeddings[positions] = embeddings
+            embedded += len(positions)
             
-            all_embeddings.append(embeddings.cpu().numpy())
+            # Log progress for large batches
+            if len(items) > 100 and batch_number % 10 == 0:
+                logger.info(f"Embedded {embedded}/{len(items)} documents ({len(batches)} batches)")
+        
+        return all_embeddings
+    
+    def _embed_fixed_batches(self, texts: List[str]) -> np.ndarray:
+        """Embed in input order with fixed batch_size batches"""
+        all_embeddings = []
+        
+        # Process in batches
+        for i in range(0, len(texts), self.batch_size):
+            batch_texts = texts[i:i + self.batch_size]
+            all_embeddings.append(self._encode(batch_texts))
             
             # Log progress for large batches
             if len(texts) > 100 and (i // self.batch_size) % 10 == 0:
@@ -172,21 +397,24 @@ class MultiCollectionEmbedder(Embeddings):
         Returns:
             1D numpy array of embeddings
         """
-        return self.embed_documents([text])[0]
+        return self.embed_queries([text])[0]
     
     def embed_documents_with_chunking(
         self, 
         texts: List[str],
         chunk_size: int = 400,
-        overlap: int = 50
+        overlap: int = 50,
+        chunk_unit: str = "chars"
     ) -> tuple[np.ndarray, List[List[int]]]:
         """
         Embed documents with automatic chunking for long texts
         
         Args:
             texts: List of texts (can be very long)
-            chunk_size: Characters per chunk
-            overlap: Overlapping characters
+            chunk_size: Characters (or model input tokens) per chunk
+            overlap: Overlapping characters (or tokens)
+            chunk_unit: "chars", or "tokens" to chunk on this model's tokens;
+                        texts are then tokenized once and the chunk ids embedded directly
             
         Returns:
             Tuple of:
@@ -194,24 +422,38 @@ class MultiCollectionEmbedder(Embeddings):
                 - Chunk mapping (which chunks belong to which document)
         """
         all_chunks = []
+        all_token_ids = []
         chunk_mapping = []
         
-        for doc_idx, text in enumerate(texts):
-            chunks = self.chunk_text(text, chunk_size, overlap)
-            all_chunks.extend(chunks)
-            chunk_mapping.append(list(range(len(all_chunks) - len(chunks), len(all_chunks))))
+        if chunk_unit == "tokens":
+            for text, chunks in zip(texts, self.token_chunker(chunk_size, overlap).split(texts)):
+                all_chunks.extend(text[start:end] for start, end, _ in chunks)
+                all_token_ids.extend(ids for _, _, ids in chunks)
+                chunk_mapping.append(list(range(len(all_chunks) - len(chunks), len(all_chunks))))
+        else:
+            for doc_idx, text in enumerate(texts):
+                chunks = self.chunk_text(text, chunk_size, overlap)
+                all_chunks.extend(chunks)
+                chunk_mapping.append(list(range(len(all_chunks) - len(chunks), len(all_chunks))))
         
         logger.info(f"Split {len(texts)} documents into {len(all_chunks)} chunks")
         
         # Embed all chunks
-        embeddings = self.embed_documents(all_chunks)
+        if all_token_ids:
+            embeddings = self.embed_token_ids(all_token_ids, all_chunks)
+        else:
+            embeddings = self.embed_documents(all_chunks)
         
         return embeddings, chunk_mapping
     
+    def close(self):
+        """Stop the embedding worker processes, if any"""
+        if self.pool is not None:
+            self.pool.close()
+    
     def get_embedding_dimension(self) -> int:
-        """Get the dimension of embeddings produced by this model"""
-        dummy_embedding = self.embed_query("test")
-        return len(dummy_embedding)
+        """Get the dimension of embeddings produced by this model (from its config, no forward pass)"""
+        return get_model_registry().dimension(self.model_name)
 
 
 def get_embedder(model_name: str = "BAAI/bge-base-en-v1.5", **kwargs) -> MultiCollectionEmbedder:
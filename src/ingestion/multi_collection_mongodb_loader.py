@@ -1,12 +1,45 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from bson import json_util
+from pathlib import Path
+import numpy as np
 import logging
 from datetime import datetime
 from bs4 import BeautifulSoup
 import re
 
+from src.utils.helpers import atomic_write_path, stable_hash64
+
 logger = logging.getLogger(__name__)
 
+# Delta ingestion state (per-collection watermarks), saved next to the FAISS index
+DELTA_STATE_FILE = "delta_state.json"
+
+# Ways of finding changes since the last run:
+#   timestamp:     documents whose updatedAt is > the last seen value, plus the ones at that
+#                  value that were not seen yet (inserts + updates)
+#   objectid:      documents whose _id is > the last seen ObjectId (inserts only)
+#   change_stream: resume a change stream from the last token (needs a replica set)
+DELTA_MODES = ("timestamp", "objectid", "change_stream")
+
+
+def load_delta_state(path: Path) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Read saved delta watermarks (None if no delta state exists yet)"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        # json_util restores datetimes, ObjectIds and resume tokens
+        return json_util.loads(f.read())
+
+
+def save_delta_state(path: Path, state: Dict[str, Dict[str, Any]]):
+    """Atomically write delta watermarks"""
+    with atomic_write_path(path) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json_util.dumps(state, indent=2))
+
 
 class MultiCollectionMongoDBLoader:
     """
@@ -103,15 +136,25 @@ Content: {gdprContent}
     # Collections to EXCLUDE from RAG (privacy/security concerns)
     EXCLUDED_COLLECTIONS = ['users', 'bookings', 'referrals', 'galleries', 'contacts']
     
-    def __init__(self, connection_string: str, database_name: str):
+    # Last-modified field used for delta ingestion (Mongoose `timestamps: true`).
+    # A schema can override it with a "timestamp_field" entry.
+    TIMESTAMP_FIELD = "updatedAt"
+    
+    def __init__(
+        self,
+        connection_string: Optional[str],
+        database_name: str,
+        client: Optional[MongoClient] = None
+    ):
         """
         Initialize loader for multiple collections
         
         Args:
-            connection_string: MongoDB connection URI
+            connection_string: MongoDB connection URI (ignored when client is given)
             database_name: Name of the database
+            client: Existing MongoClient-compatible client (e.g. mongomock for tests)
         """
-        self.client = MongoClient(connection_string)
+        self.client = client if client is not None else MongoClient(connection_string)
         self.db = self.client[database_name]
         self.database_name = database_name
         logger.info(f"Connected to MongoDB: {database_name}")
@@ -189,7 +232,8 @@ Content: {gdprContent}
     def format_document_for_rag(
         self, 
         document: Dict[str, Any], 
-        collection_name: str
+        collection_name: str,
+        loaded_at: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Format a single document for RAG pipeline based on its collection schema
@@ -197,6 +241,7 @@ Content: {gdprContent}
         Args:
             document: Raw MongoDB document
             collection_name: Source collection name
+            loaded_at: Load timestamp shared by the batch (defaults to now)
             
         Returns:
             Formatted document with text and metadata, or None if invalid
@@ -247,7 +292,7 @@ Content: {gdprContent}
                 'database': self.database_name,
                 'collection': collection_name,
                 'document_id': str(document.get('_id', '')),
-                'loaded_at': datetime.now().isoformat(),
+                'loaded_at': loaded_at or datetime.now().isoformat(),
                 # Include key fields in metadata for filtering
                 **{k: v for k, v in extracted_data.items() if k in schema['required_fields']}
             }
@@ -276,9 +321,12 @@ Content: {gdprContent}
             limit=limit
         )
         
+        # One timestamp per load so the value is shared (and interned) across the batch
+        loaded_at = datetime.now().isoformat()
+        
         formatted_documents = []
         for doc in raw_documents:
-            formatted = self.format_document_for_rag(doc, collection_name)
+            formatted = self.format_document_for_rag(doc, collection_name, loaded_at=loaded_at)
             if formatted:
                 formatted_documents.append(formatted)
         
@@ -353,6 +401,246 @@ Content: {gdprContent}
         
         return all_documents
     
+    # ------------------------------------------------------------------
+    # Delta ingestion
+    # ------------------------------------------------------------------
+    
+    def _timestamp_field(self, collection_name: str) -> str:
+        """Last-modified field of a collection"""
+        schema = self.COLLECTION_SCHEMAS.get(collection_name, {})
+        return schema.get('timestamp_field', self.TIMESTAMP_FIELD)
+    
+    def get_collection_watermark(
+        self,
+        collection_name: str,
+        use_change_stream: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Capture the current high-water mark of a collection
+        
+        Take it *before* a full load so changes made during the load are
+        picked up again by the next delta run.
+        
+        Args:
+            collection_name: Name of the collection
+            use_change_stream: Record a change-stream resume token instead of a field watermark
+            
+        Returns:
+            Delta state entry: {'mode', 'watermark'} or {'mode', 'resume_token'};
+            timestamp entries also list the '_ids' already read at the watermark
+        """
+        collection = self.db[collection_name]
+        
+        if use_change_stream:
+            with collection.watch(full_document='updateLookup') as stream:
+                # An empty poll still advances the stream to the current cluster time
+                stream.try_next()
+                return {'mode': 'change_stream', 'resume_token': stream.resume_token}
+        
+        timestamp_field = self._timestamp_field(collection_name)
+        latest = collection.find_one(
+            {timestamp_field: {'$exists': True}},
+            {timestamp_field: 1},
+            sort=[(timestamp_field, -1)]
+        )
+        if latest is not None:
+            watermark = latest[timestamp_field]
+            # Several documents can share the watermark; the next run skips only these
+            boundary_ids = [doc['_id'] for doc in collection.find({timestamp_field: watermark}, {'_id': 1})]
+            return {'mode': 'timestamp', 'field': timestamp_field, 'watermark': watermark, '_ids': boundary_ids}
+        
+        # No last-modified field: ObjectIds grow with insertion time
+        latest = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        return {'mode': 'objectid', 'watermark': latest['_id'] if latest else None}
+    
+    def get_watermarks(
+        self,
+        collections: Optional[List[str]] = None,
+        use_change_stream: bool = False
+    ) -> Dict[str, Dict[str, Any]]:
+        """Current high-water mark of every collection (see get_collection_watermark)"""
+        if collections is None:
+            collections = self.get_available_collections()
+        return {
+            collection_name: self.get_collection_watermark(collection_name, use_change_stream)
+            for collection_name in collections
+        }
+    
+    def _read_change_stream(
+        self,
+        collection_name: str,
+        resume_token: Dict[str, Any]
+    ) -> Tuple[Dict[str, Optional[Dict[str, Any]]], Dict[str, Any]]:
+        """
+        Drain a collection's change stream from a resume token
+        
+        Returns:
+            (latest full document per _id, None for deleted documents), new resume token
+        """
+        changes = {}
+        collection = self.db[collection_name]
+        try:
+            with collection.watch(full_document='updateLookup', resume_after=resume_token) as stream:
+                while True:
+                    change = stream.try_next()
+                    if change is None:
+                        break
+                    operation = change['operationType']
+                    if operation in ('insert', 'update', 'replace'):
+                        # fullDocument is None when the document was deleted after the update
+                        changes[change['documentKey']['_id']] = change.get('fullDocument')
+                    elif operation == 'delete':
+                        changes[change['documentKey']['_id']] = None
+                    elif operation in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+                        raise ValueError(
+                            f"Change stream on {collection_name} was invalidated ({operation}). "
+                            "Run a full ingestion."
+                        )
+                resume_token = stream.resume_token
+        except PyMongoError as e:
+            # Typically the resume token fell off the oplog
+            raise ValueError(
+                f"Cannot resume change stream on {collection_name}: {e}. Run a full ingestion."
+            ) from e
+        
+        return changes, resume_token
+    
+    def load_collection_delta(
+        self,
+        collection_name: str,
+        state: Optional[Dict[str, Any]] = None,
+        known_keys: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]:
+        """
+        Load only the documents of a collection that changed since the last run
+        
+        Timestamp and ObjectId watermarks cannot see deletions, so when
+        `known_keys` (stable keys of the indexed documents, see
+        MongoDBVectorIndexer.collection_keys) is given, deletions are found by
+        diffing them against the keys of the _ids still in the collection.
+        Only _ids are read for that, never full documents.
+        
+        Args:
+            collection_name: Name of the collection
+            state: Delta state entry from the previous run (None = load everything)
+            known_keys: Keys of the documents currently indexed for this collection
+            
+        Returns:
+            Dict with 'upserted' (formatted documents), 'deleted_keys' (int64
+            stable keys of documents to remove) and 'state' (new state entry)
+        """
+        state = state or {}
+        mode = state.get('mode')
+        collection = self.db[collection_name]
+        
+        if mode == 'change_stream':
+            changes, resume_token = self._read_change_stream(collection_name, state['resume_token'])
+            new_state = {'mode': 'change_stream', 'resume_token': resume_token}
+        else:
+            # Capture the next watermark before reading so concurrent writes are not skipped
+            new_state = self.get_collection_watermark(collection_name)
+            
+            watermark = state.get('watermark')
+            if watermark is None or mode not in DELTA_MODES:
+                filter_query = {}
+            elif mode == 'timestamp':
+                # Documents at the watermark that the last run did not see (written in the same
+                # tick after it was taken); the ones it saw are not embedded again
+                timestamp_field = state.get('field', self.TIMESTAMP_FIELD)
+                filter_query = {'$or': [
+                    {timestamp_field: {'$gt': watermark}},
+                    {timestamp_field: watermark, '_id': {'$nin': state.get('_ids', [])}}
+                ]}
+            else:
+                filter_query = {'_id': {'$gt': watermark}}
+            
+            if new_state['mode'] == 'objectid' and watermark is not None:
+                logger.warning(
+                    f"{collection_name} has no '{self._timestamp_field(collection_name)}' field; "
+                    f"only inserts and deletes are detected"
+                )
+            
+            changes = {
+                doc['_id']: doc
+                for doc in self.load_collection_documents(collection_name, filter_query=filter_query)
+            }
+        
+        loaded_at = datetime.now().isoformat()
+        upserted = []
+        deleted_keys = []
+        for doc_id, doc in changes.items():
+            formatted = self.format_document_for_rag(doc, collection_name, loaded_at=loaded_at) if doc else None
+            if formatted:
+                upserted.append(formatted)
+            else:
+                # Deleted, or no longer valid for RAG after the update
+                deleted_keys.append(stable_hash64(str(doc_id)))
+        deleted_keys = np.array(deleted_keys, dtype='int64')
+        
+        if known_keys is not None and mode != 'change_stream':
+            current_keys = np.fromiter(
+                (stable_hash64(str(doc['_id'])) for doc in collection.find({}, {'_id': 1})),
+                dtype='int64'
+            )
+            missing = np.setdiff1d(np.asarray(known_keys, dtype='int64'), current_keys)
+            deleted_keys = np.union1d(deleted_keys, missing)
+        
+        logger.info(
+            f"Delta for {collection_name}: {len(upserted)} upserted, {len(deleted_keys)} deleted"
+        )
+        return {'upserted': upserted, 'deleted_keys': deleted_keys, 'state': new_state}
+    
+    def load_all_deltas(
+        self,
+        state: Dict[str, Dict[str, Any]],
+        collections: Optional[List[str]] = None,
+        known_keys: Optional[Dict[str, np.ndarray]] = None
+    ) -> Dict[str, Any]:
+        """
+        Load changes since the last run from multiple collections
+        
+        Collections missing from `state` (new since the last run) are loaded in full.
+        
+        Args:
+            state: Delta state from the previous run (collection -> state entry)
+            collections: List of collection names (None = all available)
+            known_keys: Indexed document keys per collection, enables deletion detection
+            
+        Returns:
+            Dict with 'upserted', 'deleted_keys' and the new 'state' for all collections
+        """
+        if collections is None:
+            collections = self.get_available_collections()
+        known_keys = known_keys or {}
+        
+        upserted = []
+        deleted_keys = []
+        new_state = dict(state)
+        
+        print(f"\n{'='*70}")
+        print(f"Loading changes from {len(collections)} collections...")
+        print(f"{'='*70}\n")
+        
+        for collection_name in collections:
+            print(f"📚 Processing: {collection_name}...", end=' ')
+            delta = self.load_collection_delta(
+                collection_name=collection_name,
+                state=state.get(collection_name),
+                known_keys=known_keys.get(collection_name)
+            )
+            upserted.extend(delta['upserted'])
+            deleted_keys.append(delta['deleted_keys'])
+            new_state[collection_name] = delta['state']
+            print(f"✓ {len(delta['upserted'])} upserted, {len(delta['deleted_keys'])} deleted")
+        
+        deleted_keys = np.concatenate(deleted_keys) if deleted_keys else np.zeros(0, dtype='int64')
+        
+        print(f"\n{'='*70}")
+        print(f"✅ Total: {len(upserted)} upserted, {len(deleted_keys)} deleted")
+        print(f"{'='*70}\n")
+        
+        return {'upserted': upserted, 'deleted_keys': deleted_keys, 'state': new_state}
+    
     def close(self):
         """Close MongoDB connection"""
         self.client.close()
@@ -1,5 +1,7 @@
 #this is to split the text of the files into chunks and by utilizing certain separators
 
+from typing import List, Tuple
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 def split_documents(documents, chunk_size=800, chunk_overlap=100):
@@ -12,3 +14,37 @@ def split_documents(documents, chunk_size=800, chunk_overlap=100):
     split_docs = text_splitter.split_documents(documents)
     print(f"Split into {len(split_docs)} chunks.")
     return split_docs
+
+
+def chunk_spans(text: str, chunk_size: int = 400, overlap: int = 50) -> List[Tuple[int, int]]:
+    """
+    Character spans of overlapping chunks, broken at a sentence or line end when possible
+
+    Every chunk is the exact slice text[start:end], so chunks can be mapped
+    back to (and reassembled into) the original text.
+
+    Args:
+        text: Input text
+        chunk_size: Maximum characters per chunk
+        overlap: Characters shared by consecutive chunks
+
+    Returns:
+        List of (start, end) character offsets, covering the whole text
+    """
+    if len(text) <= chunk_size:
+        return [(0, len(text))]
+
+    spans = []
+    start = 0
+    while True:
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Try to break at sentence boundary (only if not too early)
+            window = text[start:end]
+            break_point = max(window.rfind('.'), window.rfind('\n'))
+            if break_point > chunk_size * 0.7:
+                end = start + break_point + 1
+        spans.append((start, end))
+        if end >= len(text):
+            return spans
+        start = max(end - overlap, start + 1)
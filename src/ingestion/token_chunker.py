@@ -0,0 +1,188 @@
+"""
+Token-aware chunking with the embedding model's own tokenizer
+Each document is tokenized once (fast tokenizer, with character offsets);
+chunks are cut on token boundaries, preferably at sentence ends, and keep
+their token ids so the model can embed them without tokenizing again.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A token ending with one of these (or followed by a line break) ends a sentence
+SENTENCE_END_CHARS = ".!?;"
+
+# Chunks are only cut at a sentence end past this share of the token budget
+MIN_CHUNK_FILL = 0.7
+
+# Texts tokenized per tokenizer call
+TOKENIZE_BATCH_TEXTS = 1024
+
+# One chunk: (char_start, char_end, input_ids with the model's special tokens)
+TokenChunk = Tuple[int, int, np.ndarray]
+
+
+def _continues_word(text: str, offsets: np.ndarray, token: int) -> bool:
+    """True when `token` is glued to the previous token inside one word (e.g. a ## piece)"""
+    if token == 0:
+        return False
+    start = offsets[token][0]
+    return (
+        start == offsets[token - 1][1]
+        and 0 < start < len(text)
+        and text[start].isalnum()
+        and text[start - 1].isalnum()
+    )
+
+
+def _ends_sentence(text: str, offsets: np.ndarray, token: int) -> bool:
+    """True when a sentence (or line) ends with `token`"""
+    end = offsets[token][1]
+    if end and text[end - 1] in SENTENCE_END_CHARS:
+        return True
+    next_start = offsets[token + 1][0] if token + 1 < len(offsets) else len(text)
+    return '\n' in text[end:next_start]
+
+
+def token_chunk_ranges(
+    text: str,
+    offsets: np.ndarray,
+    max_tokens: int,
+    overlap_tokens: int = 0
+) -> List[Tuple[int, int]]:
+    """
+    Split a tokenized text into overlapping token ranges of at most max_tokens
+
+    A range ends at the last sentence end found past MIN_CHUNK_FILL of the
+    budget, otherwise at the last word boundary; ranges never start or end
+    inside a word.
+
+    Args:
+        text: Original text
+        offsets: (n_tokens, 2) character offsets of the tokens (no special tokens)
+        max_tokens: Tokens per range
+        overlap_tokens: Tokens shared by consecutive ranges
+
+    Returns:
+        List of (first token, end token) ranges covering every token
+    """
+    num_tokens = len(offsets)
+    if num_tokens <= max_tokens:
+        return [(0, num_tokens)]
+
+    ranges = []
+    start = 0
+    while True:
+        end = min(start + max_tokens, num_tokens)
+        if end < num_tokens:
+            earliest = start + max(1, int(max_tokens * MIN_CHUNK_FILL))
+            cut = next((t for t in range(end, earliest - 1, -1) if _ends_sentence(text, offsets, t - 1)), None)
+            if cut is None:
+                cut = next((t for t in range(end, start, -1) if not _continues_word(text, offsets, t)), end)
+            end = cut
+        ranges.append((start, end))
+        if end >= num_tokens:
+            return ranges
+
+        next_start = max(end - overlap_tokens, start + 1)
+        while next_start < end and _continues_word(text, offsets, next_start):
+            next_start += 1
+        start = next_start
+
+
+def pad_token_ids(tokenizer, token_ids: Sequence[Sequence[int]]) -> Dict[str, np.ndarray]:
+    """
+    Model inputs for pre-tokenized sequences, padded to the longest one
+
+    Args:
+        tokenizer: Tokenizer of the model (pad token and input names)
+        token_ids: Token ids per sequence, special tokens included
+
+    Returns:
+        input_ids and attention_mask (plus zero token_type_ids when the model takes them)
+    """
+    longest = max(len(ids) for ids in token_ids)
+    input_ids = np.full((len(token_ids), longest), tokenizer.pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((len(token_ids), longest), dtype=np.int64)
+    for row, ids in enumerate(token_ids):
+        input_ids[row, :len(ids)] = ids
+        attention_mask[row, :len(ids)] = 1
+
+    encoded_input = {'input_ids': input_ids, 'attention_mask': attention_mask}
+    if 'token_type_ids' in tokenizer.model_input_names:
+        encoded_input['token_type_ids'] = np.zeros_like(input_ids)
+    return encoded_input
+
+
+class TokenChunker:
+    """
+    Splits texts into chunks that fill the model's input length
+
+    Every chunk carries its exact character span and its ready-to-embed
+    token ids, so texts are tokenized once for chunking and embedding.
+    """
+
+    def __init__(self, tokenizer, max_tokens: Optional[int] = None, overlap_tokens: int = 32):
+        """
+        Initialize chunker
+
+        Args:
+            tokenizer: Fast (Rust) tokenizer of the embedding model
+            max_tokens: Model input length per chunk, special tokens included
+                        (None = tokenizer.model_max_length)
+            overlap_tokens: Tokens shared by consecutive chunks
+        """
+        if not tokenizer.is_fast:
+            raise ValueError("Token-aware chunking needs a fast tokenizer (character offsets)")
+
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens or tokenizer.model_max_length
+        # Room left for [CLS]/[SEP] (or <s>/</s>) once the chunk is wrapped
+        self.content_tokens = self.max_tokens - tokenizer.num_special_tokens_to_add(pair=False)
+        if self.content_tokens < 1:
+            raise ValueError(f"max_tokens={self.max_tokens} leaves no room for content tokens")
+        self.overlap_tokens = min(overlap_tokens, self.content_tokens // 2)
+
+    def split(self, texts: Sequence[str]) -> List[List[TokenChunk]]:
+        """
+        Chunk texts on token boundaries
+
+        Args:
+            texts: Texts to chunk
+
+        Returns:
+            One list of (char_start, char_end, input_ids) per text. Spans cover
+            the whole text: a chunk runs up to where the next chunk's new
+            tokens begin, and the last one to the end of the text.
+        """
+        all_chunks = []
+        for batch_start in range(0, len(texts), TOKENIZE_BATCH_TEXTS):
+            batch = list(texts[batch_start:batch_start + TOKENIZE_BATCH_TEXTS])
+            # Long texts are not truncated here: they are what gets chunked
+            encoded = self.tokenizer(
+                batch,
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+                verbose=False
+            )
+            for text, ids, offsets in zip(batch, encoded['input_ids'], encoded['offset_mapping']):
+                all_chunks.append(self._chunk(text, ids, np.asarray(offsets, dtype=np.int64).reshape(-1, 2)))
+        return all_chunks
+
+    def _chunk(self, text: str, ids: List[int], offsets: np.ndarray) -> List[TokenChunk]:
+        """Chunks of one tokenized text"""
+        ranges = token_chunk_ranges(text, offsets, self.content_tokens, self.overlap_tokens)
+        chunks = []
+        for number, (start, end) in enumerate(ranges):
+            char_start = 0 if number == 0 else int(offsets[start][0])
+            char_end = len(text) if end >= len(ids) else int(offsets[end][0])
+            input_ids = np.asarray(
+                self.tokenizer.build_inputs_with_special_tokens(ids[start:end]), dtype=np.int32
+            )
+            chunks.append((char_start, char_end, input_ids))
+        return chunks
@@ -0,0 +1,178 @@
+"""
+Non-blocking LLM generation for the async API
+The Gemini call goes through the SDK's async client with a timeout, so a
+single event loop can keep many conversations in flight; answers can also be
+streamed piece by piece. A local stub backend with a fixed latency stands in
+for Gemini in benchmarks.
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+from src.llm.conversation import GENERATION_CONFIG, finish_turn, gemini_chunk_text, start_turn
+from src.utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = ("gemini", "stub")
+
+
+class GeminiLLM:
+    """Gemini through the async client of google.generativeai"""
+
+    def __init__(self, model_name: str = "gemini-2.5-flash", timeout: float = 30.0):
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout
+
+    async def generate(self, messages: List[Dict]) -> str:
+        response = await self.model.generate_content_async(
+            messages,
+            generation_config=GENERATION_CONFIG,
+            request_options={"timeout": self.timeout}
+        )
+        return response.text.strip() if hasattr(response, "text") else "[Empty response]"
+
+    async def stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(
+            messages,
+            generation_config=GENERATION_CONFIG,
+            stream=True,
+            request_options={"timeout": self.timeout}
+        )
+        async for chunk in response:
+            text = gemini_chunk_text(chunk)
+            if text:
+                yield text
+
+
+class StubLLM:
+    """
+    Local stand-in for the LLM: no network call, the answer takes latency_s
+    to generate and is streamed word by word over that time
+    """
+
+    def __init__(self, latency_s: float = 0.5):
+        self.latency_s = latency_s
+
+    @staticmethod
+    def _answer_words(messages: List[Dict]) -> List[str]:
+        prompt = messages[-1]["parts"][0]
+        answer = f"This is a stub answer to a {len(prompt)}-character prompt, generated locally for benchmarks."
+        return [f"{word} " for word in answer.split()]
+
+    async def generate(self, messages: List[Dict]) -> str:
+        await asyncio.sleep(self.latency_s)
+        return "".join(self._answer_words(messages)).strip()
+
+    async def stream(self, messages: List[Dict]) -> AsyncIterator[str]:
+        words = self._answer_words(messages)
+        for word in words:
+            await asyncio.sleep(self.latency_s / len(words))
+            yield word
+
+
+_llm = None
+
+
+def get_llm():
+    """Process-wide LLM client of the configured backend (Config.LLM_BACKEND)"""
+    global _llm
+    if _llm is None:
+        if Config.LLM_BACKEND == "gemini":
+            _llm = GeminiLLM(timeout=Config.LLM_TIMEOUT_S)
+        elif Config.LLM_BACKEND == "stub":
+            _llm = StubLLM(latency_s=Config.LLM_STUB_LATENCY_MS / 1000)
+        else:
+            raise ValueError(f"Unknown LLM_BACKEND {Config.LLM_BACKEND!r}; expected one of {LLM_BACKENDS}")
+        logger.info(f"✓ LLM backend: {Config.LLM_BACKEND}")
+    return _llm
+
+
+async def agenerate_llm_response(
+    query: str,
+    retrieved_docs,
+    session_id: str = "default_session",
+    max_docs: int = 4,
+    timeout: Optional[float] = None
+) -> str:
+    """
+    Async counterpart of generator.generate_llm_response
+
+    Args:
+        query: User question
+        retrieved_docs: Retrieved documents for the augmented prompt
+        session_id: Conversation id
+        max_docs: Documents put in the prompt
+        timeout: Seconds to wait for the LLM (None = Config.LLM_TIMEOUT_S)
+
+    Returns:
+        Assistant reply, or an error message when the call fails or times out
+    """
+    timeout = Config.LLM_TIMEOUT_S if timeout is None else timeout
+    messages, user_message = start_turn(query, retrieved_docs, session_id, max_docs)
+
+    try:
+        assistant_response = await asyncio.wait_for(get_llm().generate(messages), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"LLM call timed out after {timeout:.1f}s (session {session_id})")
+        return "Sorry, the language model did not answer in time. Please try again."
+    except Exception as e:
+        logger.error(f"LLM error: {e}")
+        return f"Sorry, I encountered an error: {str(e)}"
+
+    finish_turn(session_id, user_message, assistant_response)
+    return assistant_response
+
+
+async def agenerate_llm_response_stream(
+    query: str,
+    retrieved_docs,
+    session_id: str = "default_session",
+    max_docs: int = 4,
+    timeout: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of agenerate_llm_response
+
+    Args:
+        query: User question
+        retrieved_docs: Retrieved documents for the augmented prompt
+        session_id: Conversation id
+        max_docs: Documents put in the prompt
+        timeout: Seconds to wait for each piece of the answer (None = Config.LLM_TIMEOUT_S)
+
+    Yields:
+        Pieces of the answer as the LLM produces them (an error message when
+        the call fails or stalls). The question and the answer are saved to the
+        session history once the stream is complete.
+    """
+    timeout = Config.LLM_TIMEOUT_S if timeout is None else timeout
+    messages, user_message = start_turn(query, retrieved_docs, session_id, max_docs)
+    stream = get_llm().stream(messages)
+    parts = []
+
+    try:
+        while True:
+            try:
+                text = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            parts.append(text)
+            yield text
+    except asyncio.TimeoutError:
+        logger.warning(f"LLM stream stalled for {timeout:.1f}s (session {session_id})")
+        yield "Sorry, the language model did not answer in time. Please try again."
+        return
+    except Exception as e:
+        logger.error(f"LLM error: {e}")
+        yield f"Sorry, I encountered an error: {str(e)}"
+        return
+    finally:
+        await stream.aclose()
+
+    finish_turn(session_id, user_message, "".join(parts).strip() or "[Empty response]")
@@ -29,8 +29,8 @@ def augmented_prompt(query, retrieved_docs, max_docs=4):
             if metadata.get('price'):
                 product_text += f"Price: ${metadata['price']}\n"
 
-           
-            product_text += f"\n{doc.get('text', '')}\n"
+            # Long documents contribute only their best-matching chunk
+            product_text += f"\n{doc.get('snippet') or doc.get('text', '')}\n"
             context_parts.append(product_text)
 
         context = "\n" + "=" * 70 + "\n".join(context_parts)
@@ -0,0 +1,109 @@
+"""
+Conversation state shared by the blocking and async LLM generators
+Holds the in-memory session histories and builds the Gemini-format messages
+of a turn, without configuring any LLM client. A turn is recorded in two
+steps (start_turn / finish_turn): the history only gets the user's message
+and the answer together, once the answer is complete, so a failed or
+abandoned stream leaves no unanswered message behind.
+"""
+
+from typing import Dict, List, Tuple
+
+from src.llm.augmented_prompt import augmented_prompt
+
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (
+        "You are a helpful assistant that analyzes documents and answers questions "
+        "based on retrieved information and conversation context. Provide accurate, "
+        "concise responses. If the user query is not related to the documents, "
+        "respond using general knowledge. Always ask the user which type of information "
+        "they are looking for before giving the final answer."
+    )
+}
+
+# Messages of a session sent with each turn
+MAX_HISTORY_LENGTH = 10
+
+GENERATION_CONFIG = {
+    "temperature": 0.3,
+    "max_output_tokens": 1024,
+}
+
+# In-memory conversation store
+store = {}
+
+
+def get_session_history(session_id: str) -> List[Dict]:
+    if session_id not in store:
+        store[session_id] = []
+    return store[session_id]
+
+
+def _convert_to_gemini_messages(system_prompt: Dict, history: List[Dict]) -> List[Dict]:
+    gemini_messages = []
+    gemini_messages.append({
+        "role": "user",  # Gemini does not have 'system' role
+        "parts": [system_prompt["content"]]
+    })
+
+    for msg in history:
+        role = "user" if msg["role"] == "user" else "model"
+        gemini_messages.append({
+            "role": role,
+            "parts": [msg["content"]]
+        })
+
+    return gemini_messages
+
+
+def start_turn(
+    query: str,
+    retrieved_docs,
+    session_id: str = "default_session",
+    max_docs: int = 4
+) -> Tuple[List[Dict], Dict]:
+    """
+    Build the messages to send, without touching the session history
+
+    Args:
+        query: User question
+        retrieved_docs: Retrieved documents for the augmented prompt
+        session_id: Conversation id
+        max_docs: Documents put in the prompt
+
+    Returns:
+        (Gemini-format messages (system prompt + trimmed history + user
+        message), the user message to pass to finish_turn)
+    """
+    user_message = {"role": "user", "content": augmented_prompt(query, retrieved_docs, max_docs)}
+    history = get_session_history(session_id) + [user_message]
+    return _convert_to_gemini_messages(SYSTEM_PROMPT, history[-MAX_HISTORY_LENGTH:]), user_message
+
+
+def finish_turn(session_id: str, user_message: Dict, assistant_response: str):
+    """Save the user's message and the assistant's complete reply in the session history"""
+    get_session_history(session_id).extend([
+        user_message,
+        {"role": "assistant", "content": assistant_response}
+    ])
+
+
+def gemini_chunk_text(chunk) -> str:
+    """Text of a streamed Gemini chunk ('' for chunks without text, e.g. the final finish-reason chunk)"""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+def clear_session_history(session_id: str):
+    """Clear only the requested session's history."""
+    if session_id in store:
+        store[session_id] = []
+        print(f"Session {session_id} history cleared.")
+
+
+def get_all_sessions():
+    """List all active sessions."""
+    return list(store.keys())
@@ -47,7 +47,8 @@ based on general knowledge, or suggest that the user contact the practice direct
         # Extract metadata
         collection = doc.get('metadata', {}).get('collection', 'unknown')
         score = doc.get('similarity_score', 0.0)
-        text = doc.get('text', '')
+        # Long documents contribute only their best-matching chunk
+        text = doc.get('snippet') or doc.get('text', '')
         
         # Build document header
         header_parts = [f"Document {i}"]
@@ -110,7 +111,7 @@ def augmented_prompt_medical(
             else:
                 prompt_parts.append(f"[{collection.title()} Information - Relevance: {score:.3f}]")
             
-            prompt_parts.append(doc['text'])
+            prompt_parts.append(doc.get('snippet') or doc['text'])
             prompt_parts.append("")
     
     # User question
@@ -172,7 +173,7 @@ def augmented_prompt_with_intent(
         score = doc.get('similarity_score', 0.0)
         
         prompt_parts.append(f"[Source {i}: {collection} - Relevance: {score:.3f}]")
-        prompt_parts.append(doc['text'])
+        prompt_parts.append(doc.get('snippet') or doc['text'])
         prompt_parts.append("")
     
     # User query
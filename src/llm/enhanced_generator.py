@@ -14,7 +14,9 @@ from dotenv import load_dotenv
 load_dotenv(dotenv_path=str(project_root / ".env"))
 
 import google.generativeai as genai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
+
+from src.llm.conversation import GENERATION_CONFIG, gemini_chunk_text
 
 # Configure Gemini
 genai.configure(api_key=os.environ["GEMINI_API_KEY"])
@@ -52,23 +54,17 @@ def _convert_to_gemini_messages(system_prompt: Dict, history: List[Dict]) -> Lis
     return gemini_messages
 
 
-def generate_llm_response(
-    query: str, 
-    retrieved_docs: List[Dict], 
-    session_id: str = "default_session", 
-    max_docs: int = 4
-) -> str:
+def _start_turn(
+    query: str,
+    retrieved_docs: List[Dict],
+    session_id: str,
+    max_docs: int
+) -> Tuple[List[Dict], Dict]:
     """
-    Generate LLM response using Gemini with retrieved context
-    
-    Args:
-        query: User's question
-        retrieved_docs: Documents retrieved from vector search
-        session_id: Session identifier for conversation history
-        max_docs: Maximum documents to include in context
-        
+    Build the Gemini messages, without touching the session history
+
     Returns:
-        Generated response text
+        (Gemini-format messages, the user message to pass to _finish_turn)
     """
     # Build context from retrieved documents
     context_parts = []
@@ -79,7 +75,7 @@ def generate_llm_response(
         score = doc.get('similarity_score', 0.0)
         
         context_parts.append(f"[Source {i}: {collection} - Relevance: {score:.3f}]")
-        context_parts.append(doc['text'])
+        context_parts.append(doc.get('snippet') or doc['text'])
         context_parts.append("")
     
     context_parts.append("=== USER QUESTION ===")
@@ -101,31 +97,54 @@ def generate_llm_response(
         )
     }
     
-    # Add user message to history
-    history.append({"role": "user", "content": user_input_text})
+    # The user message joins the history only with its answer (see _finish_turn)
+    user_message = {"role": "user", "content": user_input_text}
     
     # Keep only last 10 messages
-    if len(history) > 10:
-        history = history[-10:]
+    history = (history + [user_message])[-10:]
     
     # Convert to Gemini format
-    gemini_messages = _convert_to_gemini_messages(system_prompt, history)
+    return _convert_to_gemini_messages(system_prompt, history), user_message
+
+
+def _finish_turn(session_id: str, user_message: Dict, assistant_response: str):
+    """Save the user's message and the assistant's complete answer to the session history"""
+    history = get_session_history(session_id) + [
+        user_message,
+        {"role": "assistant", "content": assistant_response}
+    ]
+    # Keep only last 10 messages
+    store[session_id] = history[-10:]
+
+
+def generate_llm_response(
+    query: str, 
+    retrieved_docs: List[Dict], 
+    session_id: str = "default_session", 
+    max_docs: int = 4
+) -> str:
+    """
+    Generate LLM response using Gemini with retrieved context
+    
+    Args:
+        query: User's question
+        retrieved_docs: Documents retrieved from vector search
+        session_id: Session identifier for conversation history
+        max_docs: Maximum documents to include in context
+        
+    Returns:
+        Generated response text
+    """
+    gemini_messages, user_message = _start_turn(query, retrieved_docs, session_id, max_docs)
     
     try:
         # Generate response
-        response = model.generate_content(
-            gemini_messages,
-            generation_config={
-                "temperature": 0.3,
-                "max_output_tokens": 1024,
-            }
-        )
+        response = model.generate_content(gemini_messages, generation_config=GENERATION_CONFIG)
         
         assistant_response = response.text.strip() if hasattr(response, "text") else "[Empty response]"
         
         # Save to history
-        history.append({"role": "assistant", "content": assistant_response})
-        store[session_id] = history
+        _finish_turn(session_id, user_message, assistant_response)
         
         return assistant_response
     
@@ -134,6 +153,44 @@ def generate_llm_response(
         return f"Sorry, I encountered an error: {str(e)}"
 
 
+def generate_llm_response_stream(
+    query: str,
+    retrieved_docs: List[Dict],
+    session_id: str = "default_session",
+    max_docs: int = 4
+) -> Iterator[str]:
+    """
+    Streaming variant of generate_llm_response
+    
+    Args:
+        query: User's question
+        retrieved_docs: Documents retrieved from vector search
+        session_id: Session identifier for conversation history
+        max_docs: Maximum documents to include in context
+        
+    Yields:
+        Pieces of the answer as Gemini produces them; the question and the
+        answer are saved to the session history once the stream is complete
+    """
+    gemini_messages, user_message = _start_turn(query, retrieved_docs, session_id, max_docs)
+    parts = []
+    
+    try:
+        response = model.generate_content(gemini_messages, generation_config=GENERATION_CONFIG, stream=True)
+        for chunk in response:
+            text = gemini_chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
+    
+    except Exception as e:
+        print(f"Gemini error: {e}")
+        yield f"Sorry, I encountered an error: {str(e)}"
+        return
+    
+    _finish_turn(session_id, user_message, "".join(parts).strip() or "[Empty response]")
+
+
 def clear_session_history(session_id: str):
     """Clear conversation history for a session"""
     if session_id in store:
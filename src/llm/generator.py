@@ -110,81 +110,31 @@ sys.path.insert(0, str(project_root))
 from dotenv import load_dotenv
 load_dotenv(dotenv_path=str(project_root / ".env"))
 import google.generativeai as genai
-from src.llm.augmented_prompt import augmented_prompt
+from src.llm.conversation import (
+    GENERATION_CONFIG,
+    clear_session_history,
+    finish_turn,
+    gemini_chunk_text,
+    get_all_sessions,
+    get_session_history,
+    start_turn,
+    store,
+)
 genai.configure(api_key=os.environ["GEMINI_API_KEY"])
 model = genai.GenerativeModel("gemini-2.5-flash")
 
-# In-memory conversation store
-store = {}
-
-
-def get_session_history(session_id: str):
-    if session_id not in store:
-        store[session_id] = []
-    return store[session_id]
-
-
-def _convert_to_gemini_messages(system_prompt, history):
-    gemini_messages = []
-    gemini_messages.append({
-        "role": "user",  # Gemini does not have 'system' role
-        "parts": [system_prompt["content"]]
-    })
-
-    for msg in history:
-        role = "user" if msg["role"] == "user" else "model"
-        gemini_messages.append({
-            "role": role,
-            "parts": [msg["content"]]
-        })
-
-    return gemini_messages
-
 
 def generate_llm_response(query, retrieved_docs, session_id="default_session", max_docs=4):
-    user_input_text = augmented_prompt(query, retrieved_docs, max_docs)
-    history = get_session_history(session_id)
-
-    system_prompt = {
-        "role": "system",
-        "content": (
-            "You are a helpful assistant that analyzes documents and answers questions "
-            "based on retrieved information and conversation context. Provide accurate, "
-            "concise responses. If the user query is not related to the documents, "
-            "respond using general knowledge. Always ask the user which type of information "
-            "they are looking for before giving the final answer."
-        )
-    }
-
-    history.append({"role": "user", "content": user_input_text})
-    max_history_length = 10
-    if len(history) > max_history_length:
-        trimmed_history = history[-max_history_length:]
-    else:
-        trimmed_history = history
-
-    # Convert to Gemini format
-    gemini_messages = _convert_to_gemini_messages(system_prompt, trimmed_history)
+    gemini_messages, user_message = start_turn(query, retrieved_docs, session_id, max_docs)
 
     try:
         # Generate response using Gemini
-        response = model.generate_content(
-            gemini_messages,
-            generation_config={
-                "temperature": 0.3,
-                "max_output_tokens": 1024,
-            }
-        )
+        response = model.generate_content(gemini_messages, generation_config=GENERATION_CONFIG)
 
         assistant_response = response.text.strip() if hasattr(response, "text") else "[Empty response]"
 
         # Save assistant response in session history
-        history.append({
-            "role": "assistant",
-            "content": assistant_response
-        })
-
-        store[session_id] = history
+        finish_turn(session_id, user_message, assistant_response)
         return assistant_response
 
     except Exception as e:
@@ -192,13 +142,27 @@ def generate_llm_response(query, retrieved_docs, session_id="default_session", m
         return f"Sorry, I encountered an error: {str(e)}"
 
 
-def clear_session_history(session_id: str):
-    """Clear only the requested session's history."""
-    if session_id in store:
-        store[session_id] = []
-        print(f"Session {session_id} history cleared.")
+def generate_llm_response_stream(query, retrieved_docs, session_id="default_session", max_docs=4):
+    """
+    Streaming variant of generate_llm_response: yields the answer's text pieces as Gemini produces them
+
+    The session history gets the question and the answer once the stream is
+    complete (a stream that fails or is closed early by the client is not recorded).
+    """
+    gemini_messages, user_message = start_turn(query, retrieved_docs, session_id, max_docs)
+    parts = []
+
+    try:
+        response = model.generate_content(gemini_messages, generation_config=GENERATION_CONFIG, stream=True)
+        for chunk in response:
+            text = gemini_chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
 
+    except Exception as e:
+        print(f"Gemini error: {e}")
+        yield f"Sorry, I encountered an error: {str(e)}"
+        return
 
-def get_all_sessions():
-    """List all active sessions."""
-    return list(store.keys())
+    finish_turn(session_id, user_message, "".join(parts).strip() or "[Empty response]")
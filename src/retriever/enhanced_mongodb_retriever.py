@@ -5,7 +5,10 @@ Supports collection-specific filtering and better context formatting
 
 from typing import List, Dict, Any, Optional
 import logging
+from src.ingestion.embedding_cache import query_embedding_fn
 from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
+from src.retriever.query_batcher import create_query_batcher
+from src.retriever.query_cache import QueryEmbeddingCache
 
 logger = logging.getLogger(__name__)
 
@@ -15,16 +18,40 @@ class MongoDBRetriever:
     Retrieves relevant documents from multi-collection vector index
     """
     
-    def __init__(self, embedder, vector_store_path: str = "data/embeddings/medical_practice_vectors"):
+    def __init__(
+        self,
+        embedder,
+        vector_store_path: str = "data/embeddings/medical_practice_vectors",
+        mmap_index: bool = False,
+        warmup: bool = False,
+        query_cache_size: int = 1024,
+        warm_queries_path: Optional[str] = None,
+        query_batch_size: Optional[int] = None,
+        query_batch_wait_ms: Optional[float] = None
+    ):
         """
         Initialize retriever with pre-built FAISS index
         
         Args:
             embedder: Embedding model instance
             vector_store_path: Path to FAISS index directory
+            mmap_index: Memory-map the index and documents (fast start-up, shared across workers)
+            warmup: Page the mapped files into the OS cache in the background
+            query_cache_size: Query embeddings kept in the LRU cache (0 = no caching)
+            warm_queries_path: File of frequent queries (one per line) embedded at start-up
+            query_batch_size: Concurrent queries embedded per batch (None = Config.QUERY_BATCH_SIZE, 1 = no batching)
+            query_batch_wait_ms: How long a query waits for others to batch with
+                                 (None = Config.QUERY_BATCH_MAX_WAIT_MS)
         """
-        self.indexer = MongoDBVectorIndexer(embedder, vector_store_path)
-        self.indexer.load_index()
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size) if query_cache_size > 0 else None
+        self.query_batcher = create_query_batcher(query_embedding_fn(embedder), query_batch_size, query_batch_wait_ms)
+        self.indexer = MongoDBVectorIndexer(
+            embedder, vector_store_path, query_cache=self.query_cache, query_batcher=self.query_batcher
+        )
+        self.indexer.load_index(mmap=mmap_index, warmup=warmup)
+        if self.query_cache is not None and warm_queries_path:
+            model_name = getattr(embedder, 'model_name', type(embedder).__name__)
+            self.query_cache.load_warm_set(warm_queries_path, model_name, query_embedding_fn(embedder))
         logger.info(f"MongoDB retriever initialized with {len(self.indexer.documents)} documents")
     
     def retrieve(
@@ -47,27 +74,42 @@ class MongoDBRetriever:
         Returns:
             List of relevant documents with similarity scores
         """
-        # Retrieve more results initially for filtering
-        results = self.indexer.search(query, top_k=top_k * 3)
+        filters = dict(filter_metadata or {})
+        if collection_filter:
+            filters['collection'] = collection_filter
+        
+        # Filters are applied inside the vector search, so no over-fetching is needed
+        results = self.indexer.search(query, top_k=top_k, filters=filters or None)
         
-        # Apply collection-specific filter
+        if filters:
+            logger.info(f"Filtered search returned {len(results)} results for {filters}")
+        
+        return results
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        collection_filter: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve relevant documents for many queries in one embedding pass and one index search
+        
+        Args:
+            queries: Search queries
+            top_k: Number of results per query
+            filter_metadata: Generic metadata filters applied to every query
+            collection_filter: Specific collection name to search in
+        
+        Returns:
+            One list of relevant documents per query, in query order
+        """
+        filters = dict(filter_metadata or {})
         if collection_filter:
-            results = [
-                r for r in results
-                if r['metadata'].get('collection') == collection_filter
-            ]
-            logger.info(f"Filtered to {len(results)} results from '{collection_filter}' collection")
-        
-        # Apply generic metadata filters
-        if filter_metadata:
-            results = [
-                r for r in results
-                if all(r['metadata'].get(k) == v for k, v in filter_metadata.items())
-            ]
-            logger.info(f"Applied metadata filters, {len(results)} results remaining")
-        
-        # Return top_k after filtering
-        return results[:top_k]
+            filters['collection'] = collection_filter
+        
+        return self.indexer.search_batch(queries, top_k=top_k, filters=filters or None)
     
     def retrieve_by_collection(self, query: str, collection: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -116,8 +158,8 @@ class MongoDBRetriever:
             else:
                 context_parts.append(f"[Document {i}]")
             
-            # Document text
-            context_parts.append(result['text'])
+            # Document text (best-matching chunk for long documents)
+            context_parts.append(result.get('snippet') or result['text'])
             
             # Relevance score
             context_parts.append(f"(Relevance: {result['similarity_score']:.3f})")
@@ -152,13 +194,13 @@ class MongoDBRetriever:
             
             # Add to context
             context_parts.append(f"[Document {i} from {collection_name}]")
-            context_parts.append(result['text'])
+            context_parts.append(result.get('snippet') or result['text'])
             context_parts.append("")
             
             # Add to sources list
             sources.append({
                 'collection': collection_name,
-                'text_preview': result['text'][:200] + "...",
+                'text_preview': (result.get('snippet') or result['text'])[:200] + "...",
                 'score': result['similarity_score'],
                 'metadata': result['metadata']
             })
@@ -176,29 +218,34 @@ class MongoDBRetriever:
         Returns:
             Dictionary with index statistics
         """
-        # Count documents by collection
-        collection_counts = {}
-        for doc in self.indexer.documents:
-            collection = doc['metadata'].get('collection', 'unknown')
-            collection_counts[collection] = collection_counts.get(collection, 0) + 1
+        # Per-collection counts are kept by the document store, no scan needed
+        collection_counts = self.indexer.collection_counts()
         
         return {
             'total_documents': len(self.indexer.documents),
             'collections': collection_counts,
-            'available_collections': list(collection_counts.keys())
+            'available_collections': list(collection_counts.keys()),
+            'index': self.indexer.get_index_stats(),
+            'query_cache': self.query_cache.stats() if self.query_cache is not None else None,
+            'query_batching': self.query_batcher.stats() if self.query_batcher is not None else None
         }
 
 
 # Factory function for easy initialization
-def get_retriever(embedder, vector_store_path: str = "data/embeddings/medical_practice_vectors") -> MongoDBRetriever:
+def get_retriever(
+    embedder,
+    vector_store_path: str = "data/embeddings/medical_practice_vectors",
+    **kwargs
+) -> MongoDBRetriever:
     """
     Create and initialize a MongoDB retriever
     
     Args:
         embedder: Embedding model instance
         vector_store_path: Path to vector store
+        **kwargs: Additional arguments for MongoDBRetriever (e.g. mmap_index, warmup, query_cache_size)
         
     Returns:
         Initialized MongoDBRetriever
     """
-    return MongoDBRetriever(embedder, vector_store_path)
\ No newline at end of file
+    return MongoDBRetriever(embedder, vector_store_path, **kwargs)
\ No newline at end of file
@@ -1,7 +1,10 @@
 
 from typing import List, Dict, Any
 import logging
+from src.ingestion.embedding_cache import query_embedding_fn
 from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
+from src.retriever.query_batcher import create_query_batcher
+from src.retriever.query_cache import QueryEmbeddingCache
 # import os
 from pathlib import Path
 
@@ -9,9 +12,17 @@ logger = logging.getLogger(__name__)
 
 
 class MongoDBRetriever:
-    def __init__(self, embedder, vector_store_path: str = "data/embeddings/mongodb_vectors"):
-        self.indexer = MongoDBVectorIndexer(embedder, vector_store_path)
-        self.indexer.load_index()
+    def __init__(self, embedder, vector_store_path: str = "data/embeddings/mongodb_vectors", mmap_index: bool = False, warmup: bool = False, query_cache_size: int = 1024, warm_queries_path: str = None, query_batch_size: int = None, query_batch_wait_ms: float = None):
+        # mmap_index shares the index pages between worker processes, warmup pages them in at start-up
+        # repeated queries are answered from an LRU cache of their embeddings (query_cache_size=0 disables it)
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size) if query_cache_size > 0 else None
+        # queries of concurrent requests are embedded in one batch (defaults: Config.QUERY_BATCH_*; size 1 disables it)
+        self.query_batcher = create_query_batcher(query_embedding_fn(embedder), query_batch_size, query_batch_wait_ms)
+        self.indexer = MongoDBVectorIndexer(embedder, vector_store_path, query_cache=self.query_cache, query_batcher=self.query_batcher)
+        self.indexer.load_index(mmap=mmap_index, warmup=warmup)
+        if self.query_cache is not None and warm_queries_path:
+            model_name = getattr(embedder, 'model_name', type(embedder).__name__)
+            self.query_cache.load_warm_set(warm_queries_path, model_name, query_embedding_fn(embedder))
         logger.info("MongoDB retriever initialized")
     
     def retrieve(
@@ -22,14 +33,25 @@ class MongoDBRetriever:
     ) -> List[Dict[str, Any]]:
         # takes the parameters and returns  List of relevant documents with similarity scores from the MongoDBVectorIndexer
 
-        results = self.indexer.search(query, top_k=top_k * 2)         
-        if filter_metadata:
-            results = [
-                r for r in results
-                if all(r['metadata'].get(k) == v for k, v in filter_metadata.items())
-            ]
-        
-        return results[:top_k]
+        # filters are applied inside the index search, so exactly top_k matches come back when available
+        return self.indexer.search(query, top_k=top_k, filters=filter_metadata)
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter_metadata: Dict[str, Any] = None
+    ) -> List[List[Dict[str, Any]]]:
+        # one embedding pass and one index search for all queries, results come back in query order
+        return self.indexer.search_batch(queries, top_k=top_k, filters=filter_metadata)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        # hit ratio of the query embedding cache
+        return self.query_cache.stats() if self.query_cache is not None else {}
+    
+    def get_batching_stats(self) -> Dict[str, Any]:
+        # mean size of the cross-request query embedding batches
+        return self.query_batcher.stats() if self.query_batcher is not None else {}
     
     def retrieve_context(self, query: str, top_k: int = 3) -> str:
       
@@ -39,7 +61,7 @@ class MongoDBRetriever:
         context_parts = []
         for i, result in enumerate(results, 1):
             context_parts.append(f"[Document {i}]")
-            context_parts.append(result['text'])
+            context_parts.append(result.get('snippet') or result['text'])
             context_parts.append(f"(Relevance Score: {result['similarity_score']:.3f})")
             context_parts.append("")  
         
@@ -0,0 +1,157 @@
+"""
+Cross-request micro-batching of query embeddings
+Concurrent requests each embedding one query would run one-row forward
+passes one after another on the shared model. The batcher queues them for a
+few milliseconds (or until a batch is full), embeds them in one call and
+hands each caller its own vector.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    """
+    Thread-safe dynamic batcher in front of a batch embedding function
+
+    Callers block on (or await) a future; one background thread collects the
+    pending queries and runs `embed_fn` once per batch.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Any],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Initialize batcher
+
+        Args:
+            embed_fn: Batch embedding function (e.g. embedder.embed_queries)
+            max_batch_size: Queries embedded per call at most
+            max_wait_ms: How long the first query of a batch waits for others
+                         (0 = only batch the queries already waiting)
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_worker(self):
+        # Started on first use so that idle processes (and forked workers) hold no thread
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Queue queries for the next batch
+
+        Args:
+            texts: Query texts (embedded in the same batch)
+
+        Returns:
+            Future resolving to a float32 array (len(texts), dimension)
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((list(texts), future))
+        return future
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Blocking batch embedding (drop-in for embed_documents)"""
+        return self.submit(texts).result()
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Blocking embedding of one query"""
+        return self.embed([text])[0]
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Embedding of one query, awaited without holding a thread"""
+        return (await asyncio.wrap_future(self.submit([text])))[0]
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        """Block for a first request, then gather others until the batch is full or the wait is over"""
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait_s
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.append(request)
+            size += len(request[0])
+        return pending
+
+    def _run(self):
+        while True:
+            # Requests cancelled while queued (e.g. a client that went away) are dropped
+            pending = [(texts, future) for texts, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            # Identical queries within a batch are embedded once
+            unique_texts = list(dict.fromkeys(text for texts, _ in pending for text in texts))
+            try:
+                vectors = np.asarray(self.embed_fn(unique_texts), dtype='float32').reshape(len(unique_texts), -1)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            positions = {text: i for i, text in enumerate(unique_texts)}
+            for texts, future in pending:
+                future.set_result(vectors[[positions[text] for text in texts]])
+            self.batches += 1
+            self.queries += sum(len(texts) for texts, _ in pending)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch count and mean batch size"""
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'mean_batch_size': self.queries / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_s * 1000,
+        }
+
+
+def create_query_batcher(
+    embed_fn: Callable[[List[str]], Any],
+    max_batch_size: Optional[int] = None,
+    max_wait_ms: Optional[float] = None
+) -> Optional[QueryBatcher]:
+    """
+    QueryBatcher with the configured settings
+
+    Args:
+        embed_fn: Batch embedding function
+        max_batch_size: Queries per batch (None = Config.QUERY_BATCH_SIZE)
+        max_wait_ms: Collection window (None = Config.QUERY_BATCH_MAX_WAIT_MS)
+
+    Returns:
+        The batcher, or None when batching is disabled (batch size of 1 or less)
+    """
+    max_batch_size = Config.QUERY_BATCH_SIZE if max_batch_size is None else max_batch_size
+    max_wait_ms = Config.QUERY_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+    if max_batch_size <= 1:
+        return None
+    return QueryBatcher(embed_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
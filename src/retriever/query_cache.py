@@ -0,0 +1,164 @@
+"""
+Query embedding cache for the retrieval path
+Repeated chatbot questions ("what are your opening hours") skip the
+transformer forward pass entirely.
+"""
+
+import re
+import threading
+import unicodedata
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str, casefold: bool = False) -> str:
+    """Canonical form of a query used as cache key (unicode + whitespace normalized)"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.casefold() if casefold else text
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of query embeddings
+
+    Keys are (model name, normalized query text). Cached vectors are read-only
+    float32 arrays holding the raw embedder output.
+    """
+
+    def __init__(self, max_size: int = 1024, casefold: bool = False):
+        """
+        Initialize cache
+
+        Args:
+            max_size: Maximum number of cached queries (least recently used are evicted)
+            casefold: Treat queries differing only in case as equal
+                      (only safe for uncased models such as bert-base-uncased)
+        """
+        self.max_size = max_size
+        self.casefold = casefold
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, model_name: str, text: str) -> Tuple[str, str]:
+        return model_name, normalize_query(text, self.casefold)
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Cached embedding of a query, or None"""
+        key = self._key(model_name, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model_name: str, text: str, vector):
+        """Store a query embedding, evicting the least recently used entries if full"""
+        if self.max_size <= 0:
+            return
+        vector = np.array(vector, dtype='float32')
+        vector.setflags(write=False)
+        key = self._key(model_name, text)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_embed(
+        self,
+        model_name: str,
+        texts: List[str],
+        embed_fn: Callable[[List[str]], Any]
+    ) -> np.ndarray:
+        """
+        Embeddings of many queries, running `embed_fn` once on the cache misses only
+
+        Args:
+            model_name: Name of the embedding model (part of the cache key)
+            texts: Query texts
+            embed_fn: Batch embedding function (e.g. embedder.embed_queries)
+
+        Returns:
+            float32 array (len(texts), dimension), in input order
+        """
+        vectors: List[Optional[np.ndarray]] = [self.get(model_name, text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        if missing:
+            # Identical queries within one batch are embedded once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            embedded = np.asarray(embed_fn(unique_texts), dtype='float32').reshape(len(unique_texts), -1)
+            fresh = dict(zip(unique_texts, embedded))
+            for text, vector in fresh.items():
+                self.put(model_name, text, vector)
+            for i in missing:
+                vectors[i] = fresh[texts[i]]
+
+        return np.vstack(vectors).astype('float32')
+
+    def load_warm_set(
+        self,
+        path: Path,
+        model_name: str,
+        embed_fn: Callable[[List[str]], Any]
+    ) -> int:
+        """
+        Pre-embed frequent queries from a text file (one query per line)
+
+        Args:
+            path: Warm set file; blank lines and lines starting with '#' are skipped
+            model_name: Name of the embedding model
+            embed_fn: Batch embedding function
+
+        Returns:
+            Number of queries loaded
+        """
+        path = Path(path)
+        if not path.exists():
+            logger.warning(f"Query warm set not found: {path}")
+            return 0
+
+        with open(path, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        queries = list(dict.fromkeys(queries))[:self.max_size]
+        if not queries:
+            return 0
+
+        for text, vector in zip(queries, np.asarray(embed_fn(queries), dtype='float32')):
+            self.put(model_name, text, vector)
+        logger.info(f"✓ Warmed query cache with {len(queries)} queries from {path}")
+        return len(queries)
+
+    def clear(self):
+        """Drop all cached embeddings and reset statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size and hit ratio"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
@@ -9,3 +9,41 @@ class Config:
     DATABASE_NAME = os.getenv("MONGODB_DATABASE", "ecommerce")
     COLLECTION_NAME = os.getenv("MONGODB_COLLECTION", "products")
     VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "data/embeddings/mongodb_vectors")
+
+    # Persistent embedding cache shared by all embedders (empty path disables it)
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/cache/embeddings.sqlite")
+    EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "2048"))
+
+    # Embedder backend ("torch", "onnx" or "onnx-int8") and where ONNX exports are kept
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "data/onnx")
+
+    # Embedding settings calibrated per host by src/ingestion/embedding_tuner.py
+    # (read by the embedders at start-up; empty path disables tuning)
+    EMBEDDING_TUNING_PATH = os.getenv("EMBEDDING_TUNING_PATH", "data/cache/embedding_tuning.json")
+    # Embedding worker processes of the ingestion script (0 = tuned split, else in-process)
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "0"))
+
+    # Vector stores built for /ask_AI uploads, cached by file content (empty spill dir keeps them in memory only)
+    UPLOAD_CACHE_MAX_MB = int(os.getenv("UPLOAD_CACHE_MAX_MB", "512"))
+    UPLOAD_CACHE_SPILL_DIR = os.getenv("UPLOAD_CACHE_SPILL_DIR", "data/cache/uploads")
+    UPLOAD_CACHE_SPILL_MAX_MB = int(os.getenv("UPLOAD_CACHE_SPILL_MAX_MB", "4096"))
+    UPLOAD_EMBEDDING_MODEL = os.getenv("UPLOAD_EMBEDDING_MODEL", "bert-base-uncased")
+
+    # Document sets (POST /documents, then POST /ask by id): where finished sets are saved,
+    # memory kept for loaded sets and background ingestion threads
+    DOCUMENT_SET_DIR = os.getenv("DOCUMENT_SET_DIR", "data/document_sets")
+    DOCUMENT_SET_CACHE_MB = int(os.getenv("DOCUMENT_SET_CACHE_MB", "1024"))
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+
+    # Async API (src/api/async_app.py): threads for parsing/embedding and the LLM call
+    # ("gemini", or "stub" = local fixed-latency answers for benchmarks)
+    API_CPU_WORKERS = int(os.getenv("API_CPU_WORKERS", str(os.cpu_count() or 4)))
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+    LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+    LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "500"))
+
+    # Query embeddings of concurrent requests are batched: a query waits up to
+    # QUERY_BATCH_MAX_WAIT_MS for others, at most QUERY_BATCH_SIZE per batch (1 = no batching)
+    QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+    QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "2"))
@@ -0,0 +1,29 @@
+# src/utils/helpers.py
+import os
+import hashlib
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def atomic_write_path(path):
+    """
+    Yield a temporary path next to `path` and move it into place on success.
+
+    Readers that memory-mapped the old file keep a valid mapping, because the
+    old inode is replaced rather than truncated.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def stable_hash64(value) -> int:
+    """Process-independent, non-negative 63-bit hash (usable as a FAISS id)"""
+    digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFF_FFFF_FFFF_FFFF
@@ -0,0 +1,119 @@
+"""
+Benchmark: concurrent /ask_AI requests against the async API with a local LLM stub
+
+Serves the ASGI app with uvicorn on localhost and sends many simultaneous
+questions about the same uploaded file (no Gemini). The stub answers after a fixed delay,
+so the wall time shows how many conversations one worker keeps in flight:
+ideally close to one LLM latency rather than requests x latency. With
+--stream the SSE endpoint is used and time to first token is reported.
+
+Usage:
+    python tests/benchmark_async_api.py --requests 200 --latency-ms 500 --model sentence-transformers/all-MiniLM-L6-v2
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+
+async def ask(client, query, session_id, document):
+    """Total request time (first token time = total for the JSON endpoint)"""
+    start = time.perf_counter()
+    response = await client.post(
+        "/ask_AI",
+        data={"query": query, "session_id": session_id},
+        files={"file": ("document.txt", document, "text/plain")},
+    )
+    response.raise_for_status()
+    assert "response" in response.json(), response.json()
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+async def ask_stream(client, query, session_id, document):
+    """Time to the first token event and to the end of the SSE stream"""
+    start = time.perf_counter()
+    first_token = None
+    async with client.stream(
+        "POST",
+        "/ask_AI/stream",
+        data={"query": query, "session_id": session_id},
+        files={"file": ("document.txt", document, "text/plain")},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first_token is None and line == "event: token":
+                first_token = time.perf_counter() - start
+            if line == "event: done":
+                break
+    return first_token, time.perf_counter() - start
+
+
+async def run(args):
+    import httpx
+    import uvicorn
+    from src.api.async_app import app
+    from tests.benchmark_embedding_batching import build_skewed_corpus
+
+    document = "\n\n".join(build_skewed_corpus(args.paragraphs, 0.1)).encode("utf-8")
+
+    # A real server: httpx's in-process ASGI transport buffers whole responses, hiding streaming
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    # One fresh connection per request: reusing pooled keep-alive connections races with the server closing them
+    limits = httpx.Limits(max_connections=args.requests + 1, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+        # First request parses and embeds the file; the others hit the upload cache
+        request = ask_stream if args.stream else ask
+        _, cold = await request(client, "What is this document about?", "warmup", document)
+        print(f"cold request (parse + embed + LLM): {cold * 1000:8.1f} ms")
+
+        start = time.perf_counter()
+        timings = await asyncio.gather(*(
+            request(client, f"Question {i}: what does the document say?", f"session{i}", document)
+            for i in range(args.requests)
+        ))
+        elapsed = time.perf_counter() - start
+
+    server.should_exit = True
+    await server_task
+
+    first_tokens, latencies = (np.array(t) * 1000 for t in zip(*timings))
+    serial = args.requests * args.latency_ms / 1000
+    print(f"{args.requests} concurrent requests in {elapsed:.2f}s "
+          f"({args.requests / elapsed:.1f} req/s; serial LLM calls alone would take {serial:.1f}s)")
+    print(f"latency p50 {np.percentile(latencies, 50):8.1f} ms | p95 {np.percentile(latencies, 95):8.1f} ms | "
+          f"max {latencies.max():8.1f} ms")
+    print(f"first token p50 {np.percentile(first_tokens, 50):8.1f} ms | p95 {np.percentile(first_tokens, 95):8.1f} ms"
+          f"{'' if args.stream else ' (whole answer; use --stream for /ask_AI/stream)'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="bert-base-uncased")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--paragraphs", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--stream", action="store_true", help="Use the SSE endpoint and report time to first token")
+    args = parser.parse_args()
+
+    # Read by Config, so set before the app (or anything importing Config) is imported
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["LLM_STUB_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["UPLOAD_EMBEDDING_MODEL"] = args.model
+    os.environ["UPLOAD_CACHE_SPILL_DIR"] = ""
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
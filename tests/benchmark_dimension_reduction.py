@@ -0,0 +1,96 @@
+"""
+Benchmark: PCA / prefix-truncation dimensionality reduction vs the full-dimension flat index
+
+Embeds a skewed corpus and a held-out query set once, then builds a flat index
+per (reduction, dimension) and reports recall@k against the full-dimension
+flat index, index size and search latency.
+
+Usage:
+    python tests/benchmark_dimension_reduction.py --model BAAI/bge-base-en-v1.5 --docs 20000 --dims 384 256 128
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
+from src.ingestion.multi_collection_embedder import MultiCollectionEmbedder
+from tests.benchmark_embedding_batching import build_skewed_corpus
+
+
+class PrecomputedEmbedder:
+    """Serves embeddings computed once, so every index sees identical vectors"""
+
+    def __init__(self, texts, embeddings):
+        self.model_name = "precomputed"
+        self.vectors = dict(zip(texts, embeddings))
+
+    def embed_documents(self, texts):
+        return np.stack([self.vectors[text] for text in texts])
+
+
+def search_ids(indexer, queries, top_k):
+    """Result ids of every query and the mean search time per query (ms)"""
+    start = time.perf_counter()
+    results = indexer.search_batch(queries, top_k=top_k)
+    elapsed = time.perf_counter() - start
+    return [[result['id'] for result in hits] for hits in results], 1000 * elapsed / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="BAAI/bge-base-en-v1.5")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--long-share", type=float, default=0.05)
+    parser.add_argument("--dims", type=int, nargs="+", default=[384, 256, 128])
+    parser.add_argument("--reductions", nargs="+", default=["pca", "truncate"])
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    corpus = build_skewed_corpus(args.docs, args.long_share)
+    queries = build_skewed_corpus(args.queries, args.long_share, seed=11)
+    documents = [
+        {'id': f'doc{i}', 'text': text, 'metadata': {'collection': 'benchmark'}}
+        for i, text in enumerate(corpus)
+    ]
+
+    embedder = MultiCollectionEmbedder(model_name=args.model, use_cache=False)
+    texts = corpus + queries
+    embedder = PrecomputedEmbedder(texts, embedder.embed_documents(texts))
+
+    print(f"\nCorpus: {len(corpus)} documents, {len(queries)} held-out queries")
+    print("=" * 70)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        full = MongoDBVectorIndexer(embedder, os.path.join(workdir, "full"))
+        full.build_index(documents)
+        reference, full_ms = search_ids(full, queries, args.top_k)
+        full_bytes = full.get_index_stats()['raw_vector_bytes']
+        print(f"full {full.index.d:4d}-d      : recall@{args.top_k} 1.000 | "
+              f"{full_bytes / 1e6:8.1f} MB | {full_ms:6.3f} ms/query")
+
+        for reduction in args.reductions:
+            for dim in args.dims:
+                indexer = MongoDBVectorIndexer(
+                    embedder, os.path.join(workdir, f"{reduction}{dim}"),
+                    reduction=reduction, reduced_dim=dim
+                )
+                indexer.build_index(documents)
+                found, ms = search_ids(indexer, queries, args.top_k)
+                hits = sum(len(set(f) & set(r)) for f, r in zip(found, reference))
+                recall = hits / sum(len(r) for r in reference)
+                stats = indexer.get_index_stats()
+                build_recall = next(v for k, v in stats.items() if k.startswith('reduction_recall_at_'))
+                print(f"{reduction:8s} {dim:4d}-d : recall@{args.top_k} {recall:.3f} | "
+                      f"{stats['raw_vector_bytes'] / 1e6:8.1f} MB | {ms:6.3f} ms/query | "
+                      f"build-time recall (stored vectors as queries) {build_recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: in-process vs multi-process embedding (EmbeddingPool)
+
+Embeds the same skewed corpus with 1, 2, 4, ... worker processes (up to
+--max-workers) and reports docs/s, scaling vs one process and parity.
+Worker start-up (one model load per worker) is excluded with a warm-up call.
+
+Usage:
+    python tests/benchmark_embedding_pool.py --model BAAI/bge-base-en-v1.5 --docs 20000 --max-workers 8
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+
+import numpy as np
+
+from src.ingestion.multi_collection_embedder import MultiCollectionEmbedder
+from tests.benchmark_embedding_batching import build_skewed_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="BAAI/bge-base-en-v1.5")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--long-share", type=float, default=0.05)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    corpus = build_skewed_corpus(args.docs, args.long_share)
+    warmup = build_skewed_corpus(1024, args.long_share, seed=7)
+    print(f"\nCorpus: {len(corpus)} documents, {os.cpu_count()} cores")
+    print("=" * 70)
+
+    reference = None
+    baseline = None
+    workers = 1
+    while workers <= args.max_workers:
+        # Cache disabled so every run actually embeds
+        embedder = MultiCollectionEmbedder(model_name=args.model, use_cache=False, num_workers=workers)
+        embedder.embed_documents(warmup)
+        start = time.perf_counter()
+        embeddings = embedder.embed_documents(corpus)
+        elapsed = time.perf_counter() - start
+        embedder.close()
+
+        if reference is None:
+            reference, baseline = embeddings, elapsed
+        cosine = np.sum(reference * embeddings, axis=1).min()
+        print(f"{workers:3d} workers: {len(corpus) / elapsed:8.1f} docs/s | "
+              f"scaling {baseline / elapsed:5.2f}x | min cosine vs 1 worker {cosine:.6f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
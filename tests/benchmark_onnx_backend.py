@@ -0,0 +1,63 @@
+"""
+Benchmark: torch vs ONNX Runtime (fp32 / dynamic int8) embedding backends
+
+Encodes the same skewed corpus with MultiCollectionEmbedder on every backend,
+reports docs/s and checks cosine parity of the ONNX vectors against torch.
+
+Usage:
+    python tests/benchmark_onnx_backend.py --model BAAI/bge-base-en-v1.5 --docs 1000
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+
+from src.ingestion.multi_collection_embedder import MultiCollectionEmbedder
+from src.ingestion.onnx_backend import check_parity
+from tests.benchmark_embedding_batching import build_skewed_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="BAAI/bge-base-en-v1.5")
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--long-share", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    corpus = build_skewed_corpus(args.docs, args.long_share)
+    print(f"\nCorpus: {len(corpus)} documents, {args.long_share:.0%} long")
+    print("=" * 70)
+
+    results = {}
+    for backend in ("torch", "onnx", "onnx-int8"):
+        # Cache disabled so every backend actually runs the model
+        embedder = MultiCollectionEmbedder(
+            model_name=args.model, use_cache=False, backend=backend, num_threads=args.threads
+        )
+        embedder.embed_documents(corpus[:8])  # warm-up
+        start = time.perf_counter()
+        embeddings = embedder.embed_documents(corpus)
+        elapsed = time.perf_counter() - start
+        results[backend] = (elapsed, embeddings)
+        print(f"{backend:10s} {len(corpus) / elapsed:8.1f} docs/s")
+
+    print("=" * 70)
+    torch_time, torch_embeddings = results["torch"]
+    failed = False
+    for backend in ("onnx", "onnx-int8"):
+        elapsed, embeddings = results[backend]
+        parity = check_parity(torch_embeddings, embeddings, args.min_cosine)
+        failed |= not parity['passed']
+        print(f"{backend:10s} speed-up {torch_time / elapsed:.2f}x | "
+              f"cosine vs torch: min {parity['min_cosine']:.6f}, mean {parity['mean_cosine']:.6f} "
+              f"{'✓' if parity['passed'] else '✗ below ' + str(args.min_cosine)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: cross-request micro-batching of query embeddings
+
+Concurrent client threads each embed their own stream of distinct queries,
+once with one-row embedder calls per query and once through QueryBatcher
+for every collection window. Reports throughput, latency percentiles and the
+mean batch size.
+
+Usage:
+    python tests/benchmark_query_batching.py --model BAAI/bge-base-en-v1.5 --clients 32 --waits 0 2 5 10
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.ingestion.multi_collection_embedder import MultiCollectionEmbedder
+from src.retriever.query_batcher import QueryBatcher
+from tests.benchmark_embedding_batching import build_skewed_corpus
+
+
+def run_clients(embed_query, queries, clients):
+    """Embed every query from `clients` threads; wall time and per-query latencies (ms)"""
+    def client(client_queries):
+        latencies = []
+        for query in client_queries:
+            start = time.perf_counter()
+            embed_query(query)
+            latencies.append(1000 * (time.perf_counter() - start))
+        return latencies
+
+    shards = [queries[i::clients] for i in range(clients)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = [latency for shard in pool.map(client, shards) for latency in shard]
+    return time.perf_counter() - start, np.array(latencies)
+
+
+def report(label, elapsed, latencies, extra=""):
+    print(f"{label:18s}: {len(latencies) / elapsed:8.1f} queries/s | p50 {np.percentile(latencies, 50):7.1f} ms | "
+          f"p95 {np.percentile(latencies, 95):7.1f} ms{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="BAAI/bge-base-en-v1.5")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--waits", type=float, nargs="+", default=[0, 2, 5, 10])
+    args = parser.parse_args()
+
+    # Short, distinct queries (no cache hits)
+    queries = [f"{text[:120]} #{i}" for i, text in enumerate(build_skewed_corpus(args.queries, 0.0, seed=5))]
+    embedder = MultiCollectionEmbedder(model_name=args.model, use_cache=False)
+    embedder.embed_documents(queries[:64])
+
+    print(f"\n{len(queries)} queries from {args.clients} concurrent clients")
+    print("=" * 70)
+
+    # The shared fast tokenizer cannot be called from several threads at once,
+    # so per-request calls take turns on the model
+    model_lock = threading.Lock()
+
+    def embed_one(query):
+        with model_lock:
+            return embedder.embed_documents([query])
+
+    elapsed, latencies = run_clients(embed_one, queries, args.clients)
+    report("one-row calls", elapsed, latencies)
+
+    for wait in args.waits:
+        batcher = QueryBatcher(embedder.embed_documents, max_batch_size=args.batch_size, max_wait_ms=wait)
+        elapsed, latencies = run_clients(batcher.embed_query, queries, args.clients)
+        report(f"batched, {wait:g} ms", elapsed, latencies,
+               f" | mean batch {batcher.stats()['mean_batch_size']:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
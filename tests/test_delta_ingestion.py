@@ -0,0 +1,153 @@
+"""
+Test: delta ingestion (--delta) against an in-memory MongoDB (mongomock)
+
+Runs a full ingestion of two collections, then inserts, updates and deletes
+documents and applies them with run_delta_ingestion, the step behind
+`ingest_multi_collection_mongodb.py --delta`. `faqs` carries updatedAt
+(timestamp watermark); `doctors` has none (ObjectId watermark: inserts and
+deletes only). The reported counts are checked against the reloaded index,
+which the first delta run compacts (3 of its 12 rows are tombstones).
+
+Usage:
+    python tests/test_delta_ingestion.py --model bert-base-uncased
+"""
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import mongomock
+import numpy as np
+
+DATABASE_NAME = "medical_practice_test"
+COLLECTIONS = ["faqs", "doctors"]
+
+
+def seed(db, start: datetime):
+    """Five FAQs with increasing updatedAt, four doctors without it"""
+    faqs = [
+        {"question": f"Question {i} about opening hours?", "answer": f"Answer {i}: we open at {8 + i} am.",
+         "updatedAt": start + timedelta(minutes=i)}
+        for i in range(5)
+    ]
+    doctors = [
+        {"name": f"Dr. Smith {i}", "title": "Dentist", "description": f"Specialist number {i} in implants."}
+        for i in range(4)
+    ]
+    return db.faqs.insert_many(faqs).inserted_ids, db.doctors.insert_many(doctors).inserted_ids
+
+
+def full_ingestion(loader, vector_store_path: Path, model: str):
+    """Same steps as the full mode of the ingestion script"""
+    from src.ingestion.ingest_multi_collection_mongodb import DELTA_STATE_FILE, save_delta_state
+    from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
+    from src.ingestion.multi_collection_embedder import get_embedder
+
+    delta_state = loader.get_watermarks(collections=COLLECTIONS)
+    documents = loader.load_all_formatted_flat(collections=COLLECTIONS)
+    embedder = get_embedder(model_name=model)
+    indexer = MongoDBVectorIndexer(embedder=embedder, vector_store_path=str(vector_store_path))
+    indexer.build_index(documents)
+    indexer.save_index()
+    save_delta_state(indexer.vector_store_path / DELTA_STATE_FILE, delta_state)
+    return len(documents)
+
+
+def delta_ingestion(loader, vector_store_path: Path, model: str):
+    from src.ingestion.ingest_multi_collection_mongodb import run_delta_ingestion
+    from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
+
+    indexer = MongoDBVectorIndexer(embedder=None, vector_store_path=str(vector_store_path))
+    return run_delta_ingestion(loader, indexer, collections=COLLECTIONS, embedding_model=model)
+
+
+def reload_index(vector_store_path: Path):
+    from src.ingestion.mongodb_indexer import MongoDBVectorIndexer
+
+    indexer = MongoDBVectorIndexer(embedder=None, vector_store_path=str(vector_store_path))
+    indexer.load_index()
+    return indexer
+
+
+def indexed_text(indexer, doc_id) -> Optional[str]:
+    """Text indexed for a Mongo _id (None = not indexed)"""
+    from src.ingestion.mongodb_indexer import document_key
+
+    row = int(indexer.documents.find_rows(np.array([document_key(str(doc_id))], dtype='int64'))[0])
+    return indexer.get_document(row)['text'] if row >= 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="bert-base-uncased")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="delta_ingestion_"))
+    vector_store_path = work_dir / "vectors"
+    # Read by Config, so set before anything importing Config is imported
+    os.environ["EMBEDDING_CACHE_PATH"] = str(work_dir / "embeddings.sqlite")
+
+    from src.ingestion.multi_collection_mongodb_loader import MultiCollectionMongoDBLoader
+
+    client = mongomock.MongoClient()
+    db = client[DATABASE_NAME]
+    start = datetime(2025, 1, 1)
+    faq_ids, doctor_ids = seed(db, start)
+    loader = MultiCollectionMongoDBLoader(connection_string=None, database_name=DATABASE_NAME, client=client)
+
+    indexed = full_ingestion(loader, vector_store_path, args.model)
+    assert indexed == 9, indexed
+    print(f"✓ Full ingestion: {indexed} documents")
+
+    # faqs: update the newest, insert one, delete one
+    changed_at = start + timedelta(hours=1)
+    db.faqs.update_one({"_id": faq_ids[4]}, {"$set": {"answer": "Updated: we now open at 7 am.",
+                                                     "updatedAt": changed_at}})
+    new_faq = db.faqs.insert_one({"question": "Do you accept insurance?", "answer": "Yes, most public plans.",
+                                  "updatedAt": changed_at}).inserted_id
+    db.faqs.delete_one({"_id": faq_ids[0]})
+    # doctors (no updatedAt): insert one, delete one
+    new_doctor = db.doctors.insert_one({"name": "Dr. Jones", "title": "Orthodontist",
+                                        "description": "Braces and aligners."}).inserted_id
+    db.doctors.delete_one({"_id": doctor_ids[0]})
+
+    summary = delta_ingestion(loader, vector_store_path, args.model)
+    assert summary == {"upserted": 3, "deleted": 2, "live": 9, "reclaimed": 3}, summary
+
+    indexer = reload_index(vector_store_path)
+    assert indexer.documents.num_live == 9, indexer.documents.num_live
+    assert len(indexer.documents) == 9, len(indexer.documents)
+    assert indexer.collection_counts() == {"faqs": 5, "doctors": 4}, indexer.collection_counts()
+    assert "Updated: we now open at 7 am." in indexed_text(indexer, faq_ids[4])
+    assert indexed_text(indexer, new_faq) is not None
+    assert indexed_text(indexer, new_doctor) is not None
+    assert indexed_text(indexer, faq_ids[0]) is None
+    assert indexed_text(indexer, doctor_ids[0]) is None
+    print(f"✓ Delta: {summary['upserted']} upserted, {summary['deleted']} deleted, "
+          f"{summary['live']} live (timestamp and ObjectId watermarks)")
+
+    # Nothing changed: the documents on the timestamp boundary were already seen
+    summary = delta_ingestion(loader, vector_store_path, args.model)
+    assert summary == {"upserted": 0, "deleted": 0, "live": 9, "reclaimed": 0}, summary
+    assert len(reload_index(vector_store_path).documents) == 9
+    print("✓ Idle delta: nothing upserted, deleted or tombstoned")
+
+    # A document written at the watermark timestamp after the last run is still picked up
+    late_faq = db.faqs.insert_one({"question": "Is there parking?", "answer": "Yes, behind the practice.",
+                                   "updatedAt": changed_at}).inserted_id
+    summary = delta_ingestion(loader, vector_store_path, args.model)
+    assert summary == {"upserted": 1, "deleted": 0, "live": 10, "reclaimed": 0}, summary
+    assert indexed_text(reload_index(vector_store_path), late_faq) is not None
+    print("✓ Late delta: 1 document at the watermark timestamp upserted")
+
+    loader.close()
+    print("\n✅ Delta ingestion test passed")
+
+
+if __name__ == "__main__":
+    main()